@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Executa um comando Python e grava, na saída, o pico de RSS do próprio processo (VmHWM)
+- O ru_maxrss de wait4 no processo pai inclui o RSS do harness herdado pelo fork/exec;
+  o VmHWM de /proc/self/status só conta a memória do processo depois do exec
+- Grava em <saida> o pico em MB (nada se o processo morrer sem passar pelo atexit)
+
+Uso (pelo run_benchmarks.py):
+  python benchmarks/peak_rss.py <saida> script.py [args...]
+  python benchmarks/peak_rss.py <saida> -m modulo [args...]
+  python benchmarks/peak_rss.py <saida> -c 'codigo' [args...]
+"""
+import os
+import sys
+import atexit
+import runpy
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024.0 / (1024.0 if sys.platform == 'darwin' else 1.0)  # macOS: bytes; Linux: KB
+    except ImportError:
+        return None
+
+
+def _report(path):
+    rss = peak_rss_mb()
+    if rss is not None:
+        with open(path, 'w') as f:
+            f.write(f'{rss:.3f}\n')
+
+
+def main():
+    out, args = sys.argv[1], sys.argv[2:]
+    atexit.register(_report, out)
+    if args[0] == '-c':
+        sys.argv = ['-c'] + args[2:]
+        sys.path[0] = ''  # sys.path[0] como o interpretador montaria para o comando original
+        exec(compile(args[1], '<string>', 'exec'), {'__name__': '__main__'})
+    elif args[0] == '-m':
+        sys.argv = [args[1]] + args[2:]
+        sys.path[0] = os.getcwd()
+        runpy.run_module(args[1], run_name='__main__', alter_sys=True)
+    else:
+        sys.argv = args
+        sys.path[0] = os.path.dirname(os.path.abspath(args[0]))
+        runpy.run_path(args[0], run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Benchmark do pipeline: ingest -> features -> treino -> inferência -> API
+- Gera pcaps e tabelas UNSW-NB15 sintéticas em várias escalas (benchmarks/synthetic.py)
+- Cada estágio roda no seu próprio processo: tempo de parede + pico de RSS (VmHWM do próprio
+  processo, gravado por benchmarks/peak_rss.py)
+- A API é medida com uvicorn real sob requisições concorrentes (latência p50/p95/p99)
+- startup: tempo de `cyberai.py <comando> --help` de cada entry point vs orçamento (--import_budget)
+- Resultado em JSON (benchmarks/results/), comparável com --baseline
+
+Uso:
+  python benchmarks/run_benchmarks.py --scales 1000,10000 --stages all
+  python benchmarks/run_benchmarks.py --baseline benchmarks/results/bench-anterior.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import synthetic
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+SRC_DIR = PROJECT_DIR / 'src'
+PEAK_RSS = Path(__file__).resolve().parent / 'peak_rss.py'
+STAGES = ['startup', 'pcap_ingest', 'gerar_features', 'train_detection', 'infer_and_act', 'api']
+STARTUP_COMMANDS = ['', 'ingest', 'features', 'load', 'train', 'infer', 'run-inference']
+API_ENDPOINTS = ['/summary', '/results', '/alerts', '/host/{ip}', '/dashboard/real-data', '/api/alerts']
+
+
+def git_commit():
+    try:
+        res = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return res.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_process(cmd, cwd, log_path, env=None):
+    """
+    Executa cmd e devolve (returncode, segundos, pico de RSS em MB ou None).
+    Comandos Python rodam sob benchmarks/peak_rss.py: o próprio processo grava seu VmHWM na saída
+    (o ru_maxrss de wait4 somaria o RSS do harness herdado pelo fork/exec).
+    """
+    rss_file = Path(log_path).with_suffix('.rss')
+    if cmd[0] == sys.executable:
+        cmd = [cmd[0], str(PEAK_RSS), str(rss_file)] + list(cmd[1:])
+    if rss_file.exists():
+        rss_file.unlink()
+    with open(log_path, 'w') as log:
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        elapsed = time.perf_counter() - t0
+    rss_mb = float(rss_file.read_text()) if rss_file.exists() else None
+    return proc.returncode, elapsed, rss_mb
+
+
+def stage_record(stage, scale, returncode, seconds, rss_mb, log_path, items=None):
+    rec = {
+        'stage': stage,
+        'scale': scale,
+        'status': 'ok' if returncode == 0 else 'error',
+        'returncode': returncode,
+        'seconds': round(seconds, 4),
+        'peak_rss_mb': round(rss_mb, 1) if rss_mb is not None else None,
+        'log': str(log_path),
+    }
+    if items is not None and seconds > 0:
+        rec['items_per_second'] = round(items / seconds, 1)
+    return rec
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def http_get(url, timeout=30):
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            resp.read()
+            ok = 200 <= resp.status < 300
+    except Exception:
+        ok = False
+    return ok, time.perf_counter() - t0
+
+
+def peak_rss_of(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def bench_api(ws, scale, n_requests, concurrency, log_path):
+    """Sobe a API sobre os relatórios do workspace e mede cada endpoint sob carga concorrente."""
+    port = free_port()
+    env = dict(os.environ, CYBERAI_REPORTS_DIR=str(ws / 'reports'))
+    log = open(log_path, 'w')
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'api.server:app', '--port', str(port),
+                             '--log-level', 'warning'], cwd=SRC_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f'http://127.0.0.1:{port}'
+    records = []
+    try:
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if proc.poll() is not None:
+                break
+            if http_get(base + '/', timeout=2)[0]:
+                break
+            time.sleep(0.2)
+        else:
+            proc.poll()
+        if proc.returncode is not None:
+            return [stage_record('api', scale, proc.returncode, 0.0, None, log_path)]
+
+        sample_ip = synthetic.host_ips(1)[0]
+        for endpoint in API_ENDPOINTS:
+            url = base + endpoint.format(ip=sample_ip)
+            http_get(url)  # aquecimento (primeira leitura do relatório)
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(lambda _: http_get(url), range(n_requests)))
+            elapsed = time.perf_counter() - t0
+            lat = np.array([r[1] for r in results]) * 1000.0
+            errors = sum(1 for r in results if not r[0])
+            records.append({
+                'stage': 'api',
+                'endpoint': endpoint,
+                'scale': scale,
+                'status': 'ok' if errors == 0 else 'error',
+                'requests': n_requests,
+                'concurrency': concurrency,
+                'errors': errors,
+                'seconds': round(elapsed, 4),
+                'requests_per_second': round(n_requests / elapsed, 1) if elapsed > 0 else None,
+                'latency_ms': {p: round(float(np.percentile(lat, q)), 2)
+                               for p, q in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))},
+                'peak_rss_mb': None,
+                'log': str(log_path),
+            })
+        rss = peak_rss_of(proc.pid)
+        for rec in records:
+            rec['peak_rss_mb'] = round(rss, 1) if rss is not None else None
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+    return records
+
+
+def bench_startup(workdir, budget, repeat=3):
+    """Tempo de inicialização (imports) de cada comando; acima do orçamento = erro."""
+    logs = Path(workdir) / 'startup'
+    logs.mkdir(parents=True, exist_ok=True)
+    records = []
+    for command in STARTUP_COMMANDS:
+        cmd = [sys.executable, str(PROJECT_DIR / 'cyberai.py')] + ([command] if command else []) + ['--help']
+        name = command or 'cyberai'
+        log_path = logs / f'{name}.log'
+        runs = [run_process(cmd, PROJECT_DIR, log_path) for _ in range(repeat)]
+        rc = max(r[0] for r in runs)
+        seconds = min(r[1] for r in runs)  # melhor de N: reduz ruído de disco/cache
+        rss = min(r[2] for r in runs) if runs[0][2] is not None else None
+        rec = stage_record('startup', 0, rc, seconds, rss, log_path)
+        rec['command'] = name
+        rec['budget_seconds'] = budget
+        if rec['status'] == 'ok' and seconds > budget:
+            rec['status'] = 'over_budget'
+        print(f"[{'ok' if rec['status'] == 'ok' else rec['status']}] startup {name:<24} "
+              f"{seconds:>9.3f}s  (orçamento {budget:.2f}s)  rss={rec['peak_rss_mb']}MB")
+        records.append(rec)
+    return records
+
+
+def bench_scale(scale, stages, workdir, args):
+    ws = Path(workdir) / f'scale_{scale}'
+    (ws / 'Data' / 'Raw').mkdir(parents=True, exist_ok=True)
+    (ws / 'models').mkdir(exist_ok=True)
+    (ws / 'reports').mkdir(exist_ok=True)
+    logs = ws / 'logs'
+    logs.mkdir(exist_ok=True)
+    n_hosts = max(16, scale // 20)
+    py = sys.executable
+    records = []
+
+    print(f"[info] escala {scale}: gerando dados sintéticos em {ws}")
+    pcap = synthetic.write_pcap(ws / 'Data' / 'Raw' / 'bench.pcap', scale, n_hosts=n_hosts, seed=args.seed)
+    synthetic.write_packet_csv(ws / 'Data' / 'Raw' / 'exemplo.csv', scale, n_hosts=n_hosts, seed=args.seed)
+    features = synthetic.write_unsw_features(ws / 'features.csv', scale, seed=args.seed)
+
+    commands = {
+        'pcap_ingest': ([py, str(SRC_DIR / 'ingest' / 'pcap_ingest.py'), '--pcap', str(pcap),
+                         '--out', str(ws / 'packets.csv'), '--max', str(scale)], scale),
+        'gerar_features': ([py, '-c', 'import sys; sys.path.insert(0, sys.argv[1]); '
+                            'from features.feature_engineer import gerar_features; gerar_features()',
+                            str(SRC_DIR)], scale),
+        'train_detection': ([py, str(SRC_DIR / 'models' / 'train_detection.py'), '--features', str(features),
+                             '--out_isof', str(ws / 'models' / 'isof.joblib'),
+                             '--out_auto', str(ws / 'models' / 'auto_model'),
+                             '--out_prep', str(ws / 'models' / 'preprocessor.json'),
+                             '--epochs', str(args.epochs)], scale),
+        'infer_and_act': ([py, str(SRC_DIR / 'models' / 'infer_and_act.py'), '--features', str(features),
+                           '--isof', str(ws / 'models' / 'isof.joblib'),
+                           '--auto', str(ws / 'models' / 'auto_model'),
+                           '--prep', str(ws / 'models' / 'preprocessor.json'),
+                           '--out', str(ws / 'reports' / 'infer.json'),
+                           '--outcsv', str(ws / 'reports' / 'infer.csv')], scale),
+    }
+    for stage in stages:
+        if stage == 'startup':
+            continue  # medido uma vez, fora das escalas
+        log_path = logs / f'{stage}.log'
+        if stage == 'api':
+            recs = bench_api(ws, scale, args.requests, args.concurrency, log_path)
+        else:
+            cmd, items = commands[stage]
+            rc, seconds, rss = run_process(cmd, ws, log_path)
+            recs = [stage_record(stage, scale, rc, seconds, rss, log_path, items=items)]
+        for rec in recs:
+            label = rec['stage'] + (' ' + rec['endpoint'] if 'endpoint' in rec else '')
+            print(f"[{'ok' if rec['status'] == 'ok' else 'erro'}] {label:<32} escala={scale:<8} "
+                  f"{rec['seconds']:>9.3f}s  rss={rec['peak_rss_mb']}MB")
+        records.extend(recs)
+    return records
+
+
+def record_key(rec):
+    return (rec['stage'], rec.get('endpoint') or rec.get('command'), rec['scale'])
+
+
+def compare(results, baseline_path, tolerance):
+    """Compara tempos com um JSON anterior; devolve a lista de regressões acima da tolerância."""
+    with open(baseline_path, 'r') as f:
+        baseline = {record_key(r): r for r in json.load(f)['results']}
+    regressions = []
+    for rec in results:
+        old = baseline.get(record_key(rec))
+        if not old or rec['status'] != 'ok' or old.get('status') != 'ok' or not old.get('seconds'):
+            continue
+        ratio = rec['seconds'] / old['seconds']
+        rec['baseline_seconds'] = old['seconds']
+        rec['ratio_vs_baseline'] = round(ratio, 3)
+        if ratio > 1.0 + tolerance:
+            regressions.append(rec)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark reprodutível do pipeline Cyber IA')
+    ap.add_argument('--scales', default='1000,10000,100000', help='escalas (pacotes / linhas), separadas por vírgula')
+    ap.add_argument('--stages', default='all', help=f"estágios separados por vírgula ou 'all' ({','.join(STAGES)})")
+    ap.add_argument('--out', default=None, help='JSON de resultados (padrão: benchmarks/results/bench-<timestamp>.json)')
+    ap.add_argument('--workdir', default=None, help='pasta de trabalho (padrão: temporária)')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--epochs', type=int, default=1, help='épocas do autoencoder no estágio de treino')
+    ap.add_argument('--requests', type=int, default=200, help='requisições por endpoint da API')
+    ap.add_argument('--concurrency', type=int, default=8, help='clientes concorrentes na API')
+    ap.add_argument('--import_budget', type=float, default=1.5, help='orçamento de inicialização por comando (s)')
+    ap.add_argument('--baseline', default=None, help='JSON de um benchmark anterior para comparação')
+    ap.add_argument('--tolerance', type=float, default=0.2, help='regressão tolerada vs baseline (0.2 = +20%%)')
+    ap.add_argument('--fail_on_regression', action='store_true', help='sai com código 1 se houver regressão')
+    args = ap.parse_args()
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    stages = STAGES if args.stages == 'all' else [s.strip() for s in args.stages.split(',')]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        ap.error(f"estágios desconhecidos: {unknown}")
+
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    out_path = Path(args.out or PROJECT_DIR / 'benchmarks' / 'results' / f'bench-{stamp}.json')
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='cyberai-bench-')
+    results = []
+    if 'startup' in stages:
+        results.extend(bench_startup(workdir, args.import_budget))
+    for scale in (scales if set(stages) - {'startup'} else []):
+        results.extend(bench_scale(scale, stages, workdir, args))
+
+    regressions = compare(results, args.baseline, args.tolerance) if args.baseline else []
+    over_budget = [r for r in results if r['status'] == 'over_budget']
+    doc = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {k: v for k, v in vars(args).items()},
+        'workdir': str(workdir),
+        'results': results,
+        'regressions': [record_key(r) for r in regressions],
+        'over_budget': [record_key(r) for r in over_budget],
+    }
+    with open(out_path, 'w') as f:
+        json.dump(doc, f, indent=2)
+    print(f"[ok] Resultados salvos em: {out_path}")
+
+    if regressions:
+        for rec in regressions:
+            print(f"[warn] regressão: {record_key(rec)} {rec['baseline_seconds']}s -> {rec['seconds']}s "
+                  f"(x{rec['ratio_vs_baseline']})")
+    if (regressions or over_budget) and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Geradores de dados sintéticos para os benchmarks (reprodutíveis via seed)
+- write_pcap: captura libpcap (Ethernet/IPv4/TCP|UDP) escrita direto com struct, sem scapy
+- write_packet_csv: CSV por pacote no formato produzido por pcap_ingest.py
+- write_unsw_features: tabela no formato UNSW-NB15 (+ src_ip) para treino/inferência
+"""
+import struct
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# colunas numéricas do UNSW-NB15 (training/testing-set), na ordem original
+UNSW_NUMERIC = [
+    'dur', 'spkts', 'dpkts', 'sbytes', 'dbytes', 'rate', 'sttl', 'dttl', 'sload', 'dload',
+    'sloss', 'dloss', 'sinpkt', 'dinpkt', 'sjit', 'djit', 'swin', 'stcpb', 'dtcpb', 'dwin',
+    'tcprtt', 'synack', 'ackdat', 'smean', 'dmean', 'trans_depth', 'response_body_len',
+    'ct_srv_src', 'ct_state_ttl', 'ct_dst_ltm', 'ct_src_dport_ltm', 'ct_dst_sport_ltm',
+    'ct_dst_src_ltm', 'is_ftp_login', 'ct_ftp_cmd', 'ct_flw_http_mthd', 'ct_src_ltm',
+    'ct_srv_dst', 'is_sm_ips_ports',
+]
+ATTACK_CATS = ['Normal', 'Generic', 'Exploits', 'Fuzzers', 'DoS', 'Reconnaissance',
+               'Analysis', 'Backdoor', 'Shellcode', 'Worms']
+
+
+def host_ips(n_hosts, prefix=(10, 0)):
+    return [f"{prefix[0]}.{prefix[1]}.{(i >> 8) & 255}.{i & 255}" for i in range(1, n_hosts + 1)]
+
+
+def _ip_bytes(ip):
+    return bytes(int(p) for p in ip.split('.'))
+
+
+def _checksum(header):
+    total = sum(struct.unpack('!10H', header))
+    total = (total & 0xFFFF) + (total >> 16)
+    total = (total & 0xFFFF) + (total >> 16)
+    return (~total) & 0xFFFF
+
+
+def write_pcap(path, n_packets, n_hosts=256, seed=0):
+    """Escreve n_packets pacotes TCP/UDP entre n_hosts hosts internos e alguns servidores."""
+    rng = np.random.default_rng(seed)
+    hosts = [_ip_bytes(ip) for ip in host_ips(n_hosts)]
+    servers = [_ip_bytes(ip) for ip in host_ips(16, prefix=(192, 168))]
+    src_idx = rng.integers(0, len(hosts), n_packets)
+    dst_idx = rng.integers(0, len(servers), n_packets)
+    is_udp = rng.random(n_packets) < 0.3
+    payload_len = rng.integers(0, 1200, n_packets)
+    dports = rng.choice([22, 53, 80, 443, 445, 3306], n_packets)
+    sports = rng.integers(1024, 65535, n_packets)
+    t0 = 1_700_000_000.0
+    times = t0 + np.cumsum(rng.exponential(0.001, n_packets))
+    eth = b'\x00\x11\x22\x33\x44\x55' + b'\x66\x77\x88\x99\xaa\xbb' + b'\x08\x00'
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for i in range(n_packets):
+            if is_udp[i]:
+                l4 = struct.pack('!HHHH', int(sports[i]), int(dports[i]), 8 + int(payload_len[i]), 0)
+                proto = 17
+            else:
+                l4 = struct.pack('!HHIIBBHHH', int(sports[i]), int(dports[i]), i, 0, 5 << 4, 0x18, 65535, 0, 0)
+                proto = 6
+            total_len = 20 + len(l4) + int(payload_len[i])
+            ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, total_len, i & 0xFFFF, 0, 64, proto, 0,
+                             hosts[src_idx[i]], servers[dst_idx[i]])
+            ip = ip[:10] + struct.pack('!H', _checksum(ip)) + ip[12:]
+            frame = eth + ip + l4 + bytes(int(payload_len[i]))
+            ts_sec = int(times[i])
+            ts_usec = int((times[i] - ts_sec) * 1e6)
+            f.write(struct.pack('<IIII', ts_sec, ts_usec, len(frame), len(frame)))
+            f.write(frame)
+    return path
+
+
+def write_packet_csv(path, n_packets, n_hosts=256, seed=0):
+    """CSV por pacote (time, src, dst, proto, length, info), como o gerado por pcap_ingest.py."""
+    rng = np.random.default_rng(seed)
+    hosts = np.array(host_ips(n_hosts))
+    servers = np.array(host_ips(16, prefix=(192, 168)))
+    df = pd.DataFrame({
+        'time': 1_700_000_000.0 + np.cumsum(rng.exponential(0.001, n_packets)),
+        'src': hosts[rng.integers(0, n_hosts, n_packets)],
+        'dst': servers[rng.integers(0, len(servers), n_packets)],
+        'proto': rng.choice(['TCP', 'UDP', 'ICMP'], n_packets, p=[0.7, 0.25, 0.05]),
+        'length': rng.integers(60, 1514, n_packets),
+    })
+    df['info'] = ''
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+def unsw_frame(n_rows, n_hosts=None, attack_rate=0.3, seed=0):
+    """DataFrame com as colunas numéricas do UNSW-NB15, src_ip, attack_cat e label."""
+    rng = np.random.default_rng(seed)
+    n_hosts = n_hosts or max(1, n_rows // 4)
+    label = (rng.random(n_rows) < attack_rate).astype(np.int64)
+    data = {}
+    for j, col in enumerate(UNSW_NUMERIC):
+        base = rng.lognormal(mean=1.0 + (j % 5), sigma=1.0, size=n_rows)
+        # ataques deslocados em parte das colunas, para que os detectores tenham sinal
+        shift = 1.0 + 2.0 * label * (j % 3 == 0)
+        data[col] = (base * shift).astype(np.float64)
+    for col in ('sttl', 'dttl', 'swin', 'dwin', 'trans_depth', 'is_ftp_login', 'ct_ftp_cmd', 'is_sm_ips_ports'):
+        data[col] = np.round(data[col]).astype(np.int64)
+    df = pd.DataFrame(data)
+    df.insert(0, 'src_ip', np.array(host_ips(n_hosts))[rng.integers(0, n_hosts, n_rows)])
+    cats = rng.choice(ATTACK_CATS[1:], n_rows)
+    df['attack_cat'] = np.where(label == 1, cats, 'Normal')
+    df['label'] = label
+    return df
+
+
+def write_unsw_features(path, n_rows, n_hosts=None, attack_rate=0.3, seed=0):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    unsw_frame(n_rows, n_hosts=n_hosts, attack_rate=attack_rate, seed=seed).to_csv(path, index=False)
+    return path
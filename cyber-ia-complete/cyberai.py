@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+CLI unificado do Cyber IA
+Uso: python cyberai.py <comando> [argumentos do comando]
+     python cyberai.py <comando> --help
+
+Cada comando executa o script correspondente no mesmo processo (como `python script.py`),
+então só as dependências daquele caminho são importadas: `cyberai.py --help` não carrega
+pandas, scikit-learn, TensorFlow nem scapy.
+"""
+import os
+import sys
+import runpy
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(PROJECT_DIR, "src")
+
+# comando -> (script relativo ao projeto, descrição)
+COMMANDS = {
+    "ingest": ("src/ingest/pcap_ingest.py", "PCAP -> CSV por pacote (--flows: fluxos no formato UNSW-NB15)"),
+    "watch": ("src/ingest/capture_watch.py", "pasta de capturas rotacionadas -> fluxos (incremental, com checkpoint)"),
+    "nmap": ("src/ingest/nmap_ingest.py", "XML do Nmap -> features de portas por host (streaming)"),
+    "nmap-csv": ("nmap_to_csv.py", "XML do Nmap -> CSV porta-a-porta (formato antigo)"),
+    "features": ("src/features/feature_engineer.py", "CSV de pacotes + Nmap -> features por IP"),
+    "load": ("src/data/load.py", "processa o UNSW-NB15 em Data/Processed (dataset particionado + features.csv)"),
+    "prepare-normal": ("src/data/preparar_treino_normal.py", "gera o conjunto de treino só com tráfego normal"),
+    "train": ("src/models/train_detection.py", "treina IsolationForest + Autoencoder"),
+    "search": ("src/models/search_detectors.py", "busca paralela de hiperparâmetros (frente de Pareto qualidade x custo)"),
+    "quantize": ("src/models/quantized_autoencoder.py", "exporta o Autoencoder em int8/float16 (validado contra o modelo float)"),
+    "models": ("src/models/registry.py", "registro de modelos: list / activate <versão> / rollback"),
+    "infer": ("src/models/infer_and_act.py", "inferência + relatório + ação (dry-run)"),
+    "run-inference": ("src/models/run_inference.py", "inferência sobre Data/Processed/features.csv"),
+    "evaluate": ("src/models/avaliar_deteccao_ataques.py", "avalia reports/infer.csv contra os rótulos (--sweep: varredura de thresholds)"),
+    "bench": ("benchmarks/run_benchmarks.py", "benchmark do pipeline"),
+    "serve": (None, "sobe a API (uvicorn api.server:app; --workers N compartilha o relatório mapeado)"),
+}
+
+
+def usage():
+    lines = [__doc__.strip(), "", "Comandos:"]
+    for name, (_, desc) in COMMANDS.items():
+        lines.append(f"  {name:<16} {desc}")
+    return "\n".join(lines)
+
+
+def run_script(rel_path, argv):
+    path = os.path.join(PROJECT_DIR, rel_path)
+    sys.argv = [path] + argv
+    sys.path.insert(0, os.path.dirname(path))  # igual a `python script.py`
+    runpy.run_path(path, run_name="__main__")
+
+
+def serve(argv):
+    import uvicorn  # só o comando serve importa o uvicorn/FastAPI
+    sys.argv = ["uvicorn", "api.server:app", "--app-dir", SRC_DIR] + (argv or ["--host", "0.0.0.0", "--port", "8000"])
+    for i, arg in enumerate(argv):  # os workers herdam: /metrics soma as métricas de todos
+        if arg.startswith("--workers"):
+            os.environ["CYBERAI_API_WORKERS"] = arg.partition("=")[2] or (argv[i + 1] if i + 1 < len(argv) else "1")
+    sys.exit(uvicorn.main())
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help", "help"):
+        print(usage())
+        return 0
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"[erro] comando desconhecido: {command}\n")
+        print(usage())
+        return 2
+    if command == "serve":
+        serve(rest)
+    else:
+        run_script(COMMANDS[command][0], rest)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
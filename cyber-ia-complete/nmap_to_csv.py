@@ -1,32 +1,29 @@
+import sys
 import pandas as pd
-import xml.etree.ElementTree as ET
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from features.ip_codec import FAMILY_V4, encode_ips
+from ingest.nmap_ingest import iter_nmap_hosts
+
 # Caminhos
 raw_path = Path("Data/Raw")
 xml_file = raw_path / "scan.xml"
 csv_file = raw_path / "scan.csv"
 
-# Ler o XML do Nmap
-tree = ET.parse(xml_file)
-root = tree.getroot()
-
-data = []
-for host in root.findall('host'):
-    ip_elem = host.find('address')
-    if ip_elem is not None:
-        ip = ip_elem.attrib.get('addr')
-    else:
-        continue
-
-    for port in host.findall('.//port'):
-        port_id = port.attrib.get('portid')
-        state = port.find('state').attrib.get('state')
-        service = port.find('service').attrib.get('name', 'unknown')
-        data.append({'host': ip, 'port': port_id, 'state': state, 'service': service})
+# Ler o XML do Nmap em streaming (um <host> por vez; veja src/ingest/nmap_ingest.py,
+# que grava direto a tabela de features por host sem passar por este CSV)
+data = [{'host': ip, 'port': port_id, 'state': state, 'service': service}
+        for ip, ports in iter_nmap_hosts(xml_file)
+        for port_id, state, service in ports]
 
 # Converter para DataFrame
-df = pd.DataFrame(data)
+df = pd.DataFrame(data, columns=['host', 'port', 'state', 'service'])
+
+# IP convertido uma vez aqui (uint32, vazio se não for IPv4): chave inteira do merge no feature_engineer
+_, lo, family = encode_ips(df['host'])
+df['host_int'] = pd.array(lo.astype('uint32'), dtype='UInt32')
+df.loc[family != FAMILY_V4, 'host_int'] = pd.NA
 df.to_csv(csv_file, index=False)
 
 print(f"✅ Arquivo Nmap salvo em: {csv_file}")
@@ -2,21 +2,58 @@
 """
 API de integração da IA de Cibersegurança
 -----------------------------------------
-Lê o relatório gerado pela IA (reports/infer.json)
-e disponibiliza endpoints REST para o front-end.
+Lê o relatório gerado pela IA (tabela colunar publicada por geração em reports/infer.generations/,
+ou reports/infer.npy / infer.json de versões anteriores) e disponibiliza endpoints REST para o front-end.
+Vários workers (CYBERAI_API_WORKERS ou `uvicorn --workers N`) mapeiam a mesma geração somente leitura:
+cada processo só reabre a tabela quando o contador reports/infer.generation muda.
+Histórico por host (reports/history, acrescentado a cada inferência): /history/host/{ip} e /history/top-movers.
+Incidentes (hosts sinalizados agrupados por sub-rede + assinatura, só novos/escalados): /incidents e /api/alerts.
+Versão ativa do registro de modelos (CYBERAI_REGISTRY_DIR, relida quando ACTIVE muda): /model.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pathlib import Path
+from typing import Optional
 import json
+import time
+import threading
+import numpy as np
 import pandas as pd
 import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from instrumentation.metrics import REGISTRY, stage, load_snapshots, merge_snapshots
+from instrumentation.profiling import RequestProfiler
+from reporting.results_table import ResultsTable
+from reporting.report_segments import SegmentReader, MANIFEST as SEGMENTS_MANIFEST
+from reporting.report_generations import GenerationReader, generation_file, publish_once, source_key
+from reporting.alert_engine import INCIDENTS_FILE
+from reporting.score_history import ScoreHistory, METRICS, MANIFEST as HISTORY_MANIFEST, trajectory_records
+from models.registry import ActiveModel
 
 # Caminhos
 BASE_DIR = Path(__file__).parent.parent.parent
-REPORT_PATH = BASE_DIR / "reports" / "infer.json"
-CSV_PATH = BASE_DIR / "reports" / "infer.csv"
+REPORTS_DIR = Path(os.environ.get("CYBERAI_REPORTS_DIR", BASE_DIR / "reports"))
+REPORT_PATH = REPORTS_DIR / "infer.json"
+TABLE_BASE = REPORTS_DIR / "infer"  # infer.generation + infer.generations/ (gerados por infer_and_act)
+SEGMENTS_DIR = Path(f"{TABLE_BASE}.segments")  # segmentos publicados durante a inferência (manifest.json)
+PAGE_SIZE = 5000
+CSV_PATH = REPORTS_DIR / "infer.csv"
+ALERTS_DIR = Path(os.environ.get("CYBERAI_ALERTS_DIR", REPORTS_DIR / "alerts"))
+HISTORY_DIR = Path(os.environ.get("CYBERAI_HISTORY_DIR", REPORTS_DIR / "history"))
+METRICS_DIR = Path(os.environ.get("CYBERAI_METRICS_DIR", REPORTS_DIR / "metrics"))
+API_WORKERS = int(os.environ.get("CYBERAI_API_WORKERS", "1"))
+WORKER_METRICS_DIR = METRICS_DIR / "api-workers"  # snapshot de cada worker (somados em /metrics)
+WORKER_SNAPSHOT_SECONDS = 1.0
+MODEL_REGISTRY_DIR = Path(os.environ.get("CYBERAI_REGISTRY_DIR", BASE_DIR / "models" / "registry"))
+ACTIVE_MODEL = ActiveModel(MODEL_REGISTRY_DIR)  # GET /model segue activate/rollback sem reiniciar a API
+
+# Profiling por requisição (?profile=1): desligado a menos que CYBERAI_ENABLE_PROFILING=1
+PROFILER = RequestProfiler(os.environ.get("CYBERAI_ENABLE_PROFILING") == "1",
+                           os.environ.get("CYBERAI_PROFILE_DIR", REPORTS_DIR / "profiles" / "api"))
 
 app = FastAPI(
     title="Cyber IA Security API",
@@ -33,31 +70,199 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+HTTP_SECONDS = REGISTRY.histogram("cyberai_http_request_seconds", "Latência dos endpoints da API (s)", ("method", "route", "status"))
+HTTP_IN_FLIGHT = REGISTRY.gauge("cyberai_http_requests_in_flight", "Requisições em andamento")
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """Mede a latência de cada endpoint (rota com template, ex.: /host/{ip})"""
+    HTTP_IN_FLIGHT.inc(1)
+    t0 = time.perf_counter()
+    status = 500
+    profile = PROFILER.begin() if PROFILER.enabled and request.query_params.get("profile") == "1" else None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if profile and profile.get("report"):
+            response.headers["X-Profile-Report"] = profile["report"]
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - t0, method=request.method, route=path, status=str(status))
+        HTTP_IN_FLIGHT.inc(-1)
+        write_worker_snapshot()
+
+_worker_snapshot = {"t": 0.0}
+
+def write_worker_snapshot(force=False):
+    """Com vários workers, grava as métricas deste processo em api-workers/api-<pid>.json (no máximo 1x/s)."""
+    now = time.monotonic()
+    if API_WORKERS > 1 and (force or now - _worker_snapshot["t"] >= WORKER_SNAPSHOT_SECONDS):
+        _worker_snapshot["t"] = now
+        REGISTRY.write_snapshot(f"api-{os.getpid()}", WORKER_METRICS_DIR)
+
+def worker_snapshots():
+    """Snapshots dos workers vivos (os de processos que já saíram são apagados)."""
+    live = []
+    for snap in load_snapshots(WORKER_METRICS_DIR):
+        pid = int(str(snap.get("job", "")).rpartition("-")[2] or 0)
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            (WORKER_METRICS_DIR / f"{snap['job']}.json").unlink(missing_ok=True)
+            continue
+        except (PermissionError, OverflowError, ValueError):
+            pass
+        live.append(snap)
+    return live
+
+_table_cache = {"key": None, "table": None}
+_table_lock = threading.Lock()
+_segments = SegmentReader(SEGMENTS_DIR)
+_generations = GenerationReader(TABLE_BASE)
+
+def _file_key(path):
+    st = path.stat()
+    return (str(path), st.st_mtime_ns, st.st_size)
+
 def load_report():
-    """Lê o arquivo infer.json"""
-    if not REPORT_PATH.exists():
+    """
+    Tabela de resultados (colunar, mapeada em memória), reaberta só quando a geração publicada muda.
+    Durante uma inferência, os segmentos já publicados (infer.segments/) são servidos à medida que
+    chegam (só os novos são mapeados, somente leitura), como resultado parcial explícito: summary.complete=false e
+    n_hosts_total; antes do primeiro segmento continua valendo a última geração completa.
+    Relatórios antigos (só infer.json) são convertidos uma única vez, por um dos workers, numa geração
+    que todos mapeiam.
+    """
+    meta_path = Path(f"{TABLE_BASE}.meta.json")  # tabela de versões anteriores (sem gerações)
+    segments_path = SEGMENTS_DIR / SEGMENTS_MANIFEST
+    gen_path = generation_file(TABLE_BASE)
+    existing = [p for p in (segments_path, gen_path, meta_path, REPORT_PATH) if p.exists()]
+    if not existing:
         raise HTTPException(status_code=404, detail="Relatório não encontrado. Execute a inferência primeiro.")
+    path = max(existing, key=lambda p: p.stat().st_mtime_ns)  # o mais recente (run_inference só grava o JSON)
+    key = _file_key(path)
+    with _table_lock:
+        if _table_cache["key"] == key:
+            return _table_cache["table"]
+        with stage("api_load_report") as st:
+            if path == segments_path:
+                table = _segments.refresh()
+            elif path == gen_path:
+                table = _generations.get()
+            elif path == meta_path:
+                table = ResultsTable.load(TABLE_BASE)
+            else:
+                # infer.json do infer_and_act: a geração dele já tem este JSON como origem (espera o lock)
+                publish_once(TABLE_BASE, source_key(REPORT_PATH), _convert_json_report)
+                table = _generations.get()
+                key = _file_key(gen_path)
+            if path != segments_path:
+                _segments.release()  # uma geração completa substituiu a execução em andamento: solta seus segmentos
+            st.add_items(len(table))
+        _table_cache.update(key=key, table=table)
+        return table
+
+def _convert_json_report():
     with open(REPORT_PATH, "r") as f:
-        return json.load(f)
+        report = json.load(f)
+    # run_inference grava só o resumo, sem "results"
+    summary = report.get("summary", {}) if "results" in report else report
+    return ResultsTable.from_records(report.get("results", []), summary, report.get("explain_columns"))
+
+_incidents_cache = {"key": None, "report": None}
+
+def load_incidents():
+    """incidents.json do motor de alertas (pequeno: só incidentes emitidos), relido quando muda."""
+    path = ALERTS_DIR / INCIDENTS_FILE
+    if not path.exists():
+        return None
+    key = _file_key(path)
+    with _table_lock:
+        if _incidents_cache["key"] != key:
+            with open(path, "r") as f:
+                _incidents_cache.update(key=key, report=json.load(f))
+        return _incidents_cache["report"]
+
+_history_cache = {"key": None, "history": None}
+
+def load_history():
+    """Histórico de scores (manifesto relido só quando muda; blocos abertos sob demanda, via mmap; parte já compactada -> ScoreHistory relê o manifesto)."""
+    path = HISTORY_DIR / HISTORY_MANIFEST
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Histórico não encontrado. Execute a inferência primeiro.")
+    key = _file_key(path)
+    with _table_lock:
+        if _history_cache["key"] != key:
+            _history_cache.update(key=key, history=ScoreHistory(HISTORY_DIR))
+        return _history_cache["history"]
+
+def history_window(history, since, until, window):
+    """[since, until] explícitos, ou os últimos `window` segundos até o ponto mais recente do histórico."""
+    if since is None and window is not None:
+        end = until if until is not None else history.span[1]
+        since = None if end is None else end - window
+    return since, until
+
+def network_filter(table, rows, cidr):
+    """Restringe `rows` à sub-rede `cidr` (índice ordenado da tabela, busca binária)."""
+    if not cidr:
+        return rows
+    try:
+        in_net = table.in_network(cidr)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Sub-rede inválida: {cidr}")
+    return np.intersect1d(rows, in_net, assume_unique=True)
+
+def page_rows(rows, offset, limit):
+    return rows[offset:] if limit is None else rows[offset:offset + limit]
+
+def stream_json(prefix, table, rows, suffix=""):
+    """JSON montado página a página: nunca há uma lista com todos os hosts em memória."""
+    def body():
+        yield prefix
+        yield from table.iter_json(rows, PAGE_SIZE)
+        yield suffix
+    return StreamingResponse(body(), media_type="application/json")
 
 def load_csv_data():
     """Lê o arquivo infer.csv"""
     if not CSV_PATH.exists():
         raise HTTPException(status_code=404, detail="Dados CSV não encontrados. Execute a inferência primeiro.")
-    return pd.read_csv(CSV_PATH)
+    with stage("api_load_csv") as st:
+        df = pd.read_csv(CSV_PATH)
+        st.add_items(len(df))
+    return df
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Métricas no formato Prometheus (API + snapshots dos scripts do pipeline).
+    Com CYBERAI_API_WORKERS > 1, as métricas da API são a soma dos workers vivos (cada um grava seu
+    snapshot no máximo 1x/s; o que responde grava o seu na hora), não só as do worker que atendeu.
+    """
+    own = None
+    if API_WORKERS > 1:
+        write_worker_snapshot(force=True)
+        own = merge_snapshots(worker_snapshots())
+    return PlainTextResponse(REGISTRY.render(load_snapshots(METRICS_DIR), own=own),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Endpoints originais
 @app.get("/")
+@PROFILER.wrap
 def root():
     return {"message": "API da Cyber IA funcionando!", "endpoints": ["/api/dashboard/status", "/api/monitoring/hosts", "/api/alerts"]}
 
 @app.get("/summary")
+@PROFILER.wrap
 def get_summary():
     """Resumo geral da análise"""
-    report = load_report()
-    return report.get("summary", {})
+    return load_report().summary
 
 @app.get("/dashboard/real-data")
+@PROFILER.wrap
 def get_dashboard_real_data():
     """Dados reais calculados do CSV para o Dashboard"""
     try:
@@ -104,36 +309,110 @@ def get_dashboard_real_data():
         }
 
 @app.get("/results")
-def get_results():
-    """Lista completa de hosts analisados"""
-    report = load_report()
-    return report.get("results", [])
+@PROFILER.wrap
+def get_results(offset: int = 0, limit: Optional[int] = None, cidr: Optional[str] = None):
+    """Lista de hosts analisados (completa, uma página com ?offset=&limit=, ou só uma sub-rede com ?cidr=)"""
+    table = load_report()
+    rows = network_filter(table, np.arange(len(table)), cidr)
+    return stream_json("", table, page_rows(rows, offset, limit))
 
 @app.get("/host/{ip}")
+@PROFILER.wrap
 def get_host(ip: str):
     """Busca informações detalhadas de um IP específico"""
-    report = load_report()
-    for r in report.get("results", []):
-        if r["src_ip"] == ip:
-            return r
+    table = load_report()
+    rows = table.find(ip)
+    if len(rows):
+        return table.records(rows[:1], expand=True)[0]
     raise HTTPException(status_code=404, detail=f"Host {ip} não encontrado no relatório")
 
-@app.get("/alerts")
-def get_alerts():
-    """Retorna apenas os hosts sinalizados como suspeitos"""
-    report = load_report()
-    alerts = [r for r in report.get("results", []) if r.get("combined_flag") == 1]
+@app.get("/explain/columns")
+@PROFILER.wrap
+def get_explain_columns():
+    """Dicionário de colunas das explicações compactas (auto_top_idx em /results e /alerts)"""
+    return load_report().columns
+
+@app.get("/model")
+@PROFILER.wrap
+def get_model():
+    """Versão ativa do registro de modelos (relida quando ACTIVE muda) e a versão que gerou o relatório"""
+    try:
+        bundle = ACTIVE_MODEL.get()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Nenhuma versão ativa no registro de modelos.")
+    manifest = bundle.manifest
+    try:
+        report_version = load_report().summary.get("model_version")
+    except HTTPException:
+        report_version = None  # sem relatório ainda
     return {
-        "total_alerts": len(alerts),
-        "alerts": alerts
+        "version": bundle.version,
+        "created": manifest.get("created"),
+        "thresholds": bundle.thresholds,
+        "components": sorted(manifest.get("components", {})),
+        "metadata": manifest.get("metadata", {}),
+        "report_version": report_version,
+        "report_stale": report_version is not None and report_version != bundle.version,
     }
 
+@app.get("/alerts")
+@PROFILER.wrap
+def get_alerts(offset: int = 0, limit: Optional[int] = None, cidr: Optional[str] = None):
+    """
+    Retorna todos os hosts sinalizados na última inferência (?cidr=10.0.0.0/8 filtra por sub-rede).
+    Lista completa, sem agrupamento nem supressão (contrato usado pelo frontend); incidentes
+    agrupados/suprimidos ficam em /incidents e /api/alerts.
+    """
+    table = load_report()
+    flagged = network_filter(table, table.flagged(), cidr)
+    return stream_json(f'{{"total_alerts": {len(flagged)}, "alerts": ', table,
+                       page_rows(flagged, offset, limit), "}")
+
+@app.get("/incidents")
+@PROFILER.wrap
+def get_incidents(min_level: int = 1, limit: Optional[int] = None):
+    """Incidentes novos/escalados da última inferência (hosts agrupados por sub-rede e assinatura)"""
+    report = load_incidents()
+    if report is None:
+        raise HTTPException(status_code=404, detail="Incidentes não encontrados. Execute a inferência primeiro.")
+    incidents = [i for i in report["incidents"] if i["level"] >= min_level]
+    return {"summary": report["summary"], "incidents": incidents if limit is None else incidents[:limit]}
+
+@app.get("/history/host/{ip}")
+@PROFILER.wrap
+def get_host_history(ip: str, since: Optional[int] = None, until: Optional[int] = None, window: Optional[int] = None):
+    """Trajetória de scores de um host (ts epoch s; ?window=86400 = último dia do histórico)"""
+    history = load_history()
+    since, until = history_window(history, since, until, window)
+    with stage("api_history_host") as st:
+        points = history.trajectory(ip, since, until)
+        st.add_items(len(points))
+    if len(points) == 0:
+        raise HTTPException(status_code=404, detail=f"Host {ip} sem histórico na janela pedida")
+    return {"src_ip": ip, "since": since, "until": until, "points": trajectory_records(points)}
+
+@app.get("/history/top-movers")
+@PROFILER.wrap
+def get_top_movers(metric: str = "isof_score", window: Optional[int] = 86400, since: Optional[int] = None,
+                   until: Optional[int] = None, limit: int = 20, direction: str = "up"):
+    """Hosts cujo score mais variou na janela (direction=up|down|abs; metric=isof_score|auto_mse)"""
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Métrica inválida: {metric} (use {', '.join(METRICS)})")
+    if direction not in ("up", "down", "abs"):
+        raise HTTPException(status_code=400, detail=f"direction inválido: {direction} (use up, down ou abs)")
+    history = load_history()
+    since, until = history_window(history, since, until, window)
+    with stage("api_history_top_movers"):
+        movers = history.top_movers(metric, since, until, limit, direction)
+    return {"metric": metric, "since": since, "until": until, "direction": direction, "movers": movers}
+
 # Novos endpoints para o frontend
 @app.get("/api/dashboard/status")
+@PROFILER.wrap
 def get_network_status():
     """Status geral da rede para o dashboard"""
     try:
-        report = load_report()
+        report = load_report().summary
         df = load_csv_data()
         
         # Contar hosts únicos
@@ -170,6 +449,7 @@ def get_network_status():
         }
 
 @app.get("/api/monitoring/hosts")
+@PROFILER.wrap
 def get_hosts():
     """Lista de hosts monitorados"""
     try:
@@ -217,8 +497,23 @@ def get_hosts():
         ]
 
 @app.get("/api/alerts")
+@PROFILER.wrap
 def get_alerts_frontend():
-    """Alertas para o frontend"""
+    """Alertas para o frontend (um por incidente novo/escalado quando o motor de alertas rodou)"""
+    report = load_incidents()
+    if report is not None:
+        severity = {1: "low", 2: "medium", 3: "high"}
+        return [{
+            "id": f"incident_{i['id']}",
+            "ip": i["hosts"][0] if i["host_count"] == 1 else i["subnet"] or i["hosts"][0],
+            "severity": severity.get(i["level"], "high"),
+            "anomalyType": "Tráfego anômalo detectado" if i["reason"] == "new" else "Incidente escalado",
+            "isoScore": i["max_isof_score"],
+            "aeMse": i["max_auto_mse"],
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(i["last_seen"])),
+            "description": f"{i['host_count']} host(s) em {i['subnet'] or i['hosts'][0]}; features: {', '.join(i['signature'])}",
+            "hosts": i["hosts"],
+        } for i in report["incidents"]]
     try:
         df = load_csv_data()
         
@@ -269,4 +564,6 @@ def get_alerts_frontend():
 # Iniciar o servidor
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # workers > 1 exigem o app como texto de import; todos mapeiam a mesma geração do relatório
+    uvicorn.run("api.server:app", host="0.0.0.0", port=8000, app_dir=str(Path(__file__).resolve().parent.parent),
+                workers=int(os.environ.get("CYBERAI_API_WORKERS", "1")))
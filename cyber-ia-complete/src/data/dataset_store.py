@@ -0,0 +1,137 @@
+# src/data/dataset_store.py
+"""
+Dataset processado particionado (sem dependências além de NumPy/pandas)
+- Layout estilo Hive: <raiz>/label=0/attack_cat=Normal/source=UNSW_NB15_training-set/<coluna>.npy
+- Uma coluna por .npy: ler só as colunas pedidas (mmap) = column pushdown
+- Filtros sobre as chaves de partição só abrem as pastas que casam = predicate pushdown
+- <raiz>/_dataset.json: colunas, dtypes, chaves de partição e as partições (valores + nº de linhas)
+- Montar "só normal" ou "só ataque X" é uma leitura filtrada, sem regravar o dataset
+"""
+import os
+import json
+import shutil
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+META_FILE = '_dataset.json'
+DEFAULT_PARTITION_COLS = ('label', 'attack_cat', 'source')
+
+
+def parse_filters(specs):
+    """['label=0', 'attack_cat=DoS,Exploits'] -> {'label': ['0'], 'attack_cat': ['DoS', 'Exploits']}."""
+    filters = {}
+    for spec in specs or []:
+        key, sep, values = str(spec).partition('=')
+        if not sep:
+            raise ValueError(f"filtro inválido (use coluna=valor[,valor]): {spec}")
+        filters.setdefault(key.strip(), []).extend(v.strip() for v in values.split(','))
+    return filters
+
+
+def _partition_value(value):
+    # valores viram texto no caminho (label=0, attack_cat=Normal); NaN vira string vazia
+    if pd.isna(value):
+        return ''
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class DatasetStore:
+    def __init__(self, root):
+        self.root = Path(root)
+        with open(self.root / META_FILE) as f:
+            self.meta = json.load(f)
+
+    @staticmethod
+    def exists(root):
+        return (Path(root) / META_FILE).exists()
+
+    @classmethod
+    def write(cls, frames, root, partition_cols=DEFAULT_PARTITION_COLS):
+        """
+        Grava (source, DataFrame) em partições. Colunas numéricas viram .npy; as chaves de partição
+        ficam só no caminho. A raiz é substituída de uma vez (pasta temporária + rename).
+        """
+        root = Path(root)
+        tmp = root.with_name(root.name + '.tmp')
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        partitions, dtypes, key_dtypes = [], {}, {}
+        for source, df in frames:
+            df = df.assign(source=source) if 'source' in partition_cols else df
+            keys = [c for c in partition_cols if c in df.columns]
+            data_cols = [c for c in df.select_dtypes(include=[np.number]).columns if c not in keys]
+            for c in data_cols:
+                dtypes.setdefault(c, str(df[c].dtype))
+            for k in keys:
+                key_dtypes.setdefault(k, 'int64' if pd.api.types.is_numeric_dtype(df[k]) else 'object')
+            for values, part in df.groupby([df[k].map(_partition_value) for k in keys], sort=True, dropna=False):
+                values = dict(zip(keys, values if isinstance(values, tuple) else (values,)))
+                rel = Path(*(f"{k}={quote(v, safe='')}" for k, v in values.items()))
+                (tmp / rel).mkdir(parents=True, exist_ok=True)
+                for c in data_cols:
+                    np.save(tmp / rel / f'{c}.npy', part[c].to_numpy())
+                partitions.append({'path': rel.as_posix(), 'values': values, 'rows': int(len(part))})
+        tmp.mkdir(parents=True, exist_ok=True)
+        with open(tmp / META_FILE, 'w') as f:
+            json.dump({'columns': list(dtypes), 'dtypes': dtypes, 'partition_cols': list(partition_cols),
+                       'partition_dtypes': key_dtypes, 'partitions': partitions}, f, indent=2)
+        if root.exists():
+            old = root.with_name(root.name + '.old')
+            os.replace(root, old)
+            os.replace(tmp, root)
+            shutil.rmtree(old)
+        else:
+            os.replace(tmp, root)
+        return cls(root)
+
+    @property
+    def columns(self):
+        return list(self.meta['columns'])
+
+    @property
+    def partition_cols(self):
+        return list(self.meta['partition_cols'])
+
+    def partitions(self, filters=None):
+        """Partições cujos valores casam com todos os filtros ({coluna: [valores]} ou {coluna: valor})."""
+        filters = {k: [_partition_value(v) for v in (vs if isinstance(vs, (list, tuple, set)) else [vs])]
+                   for k, vs in (filters or {}).items()}
+        unknown = [k for k in filters if k not in self.partition_cols]
+        if unknown:
+            raise ValueError(f"filtros só sobre as chaves de partição {self.partition_cols}: {unknown}")
+        return [p for p in self.meta['partitions']
+                if all(p['values'].get(k, '') in vs for k, vs in filters.items())]
+
+    def count(self, filters=None):
+        return sum(p['rows'] for p in self.partitions(filters))
+
+    def read(self, filters=None, columns=None, exclude=(), with_partition_cols=False):
+        """
+        DataFrame só com as partições e colunas pedidas. Colunas de partição (ex.: label) podem
+        voltar como colunas constantes com with_partition_cols=True.
+        """
+        cols = [c for c in (columns or self.columns) if c not in exclude]
+        missing = [c for c in cols if c not in self.meta['dtypes'] and c not in self.partition_cols]
+        if missing:
+            raise KeyError(f"colunas inexistentes no dataset: {missing}")
+        data_cols = [c for c in cols if c in self.meta['dtypes']]
+        parts = self.partitions(filters)
+        frames = []
+        for p in parts:
+            d = {c: np.load(self.root / p['path'] / f'{c}.npy', mmap_mode='r') for c in data_cols}
+            frame = pd.DataFrame({c: np.asarray(v) for c, v in d.items()}, columns=data_cols)
+            if with_partition_cols or any(c in self.partition_cols for c in cols):
+                for k, v in p['values'].items():
+                    if with_partition_cols or k in cols:
+                        # chaves numéricas (label) voltam como número; vazio = NaN na origem
+                        numeric = self.meta.get('partition_dtypes', {}).get(k) == 'int64' and v != ''
+                        frame[k] = int(v) if numeric else v
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame({c: pd.Series(dtype=self.meta['dtypes'].get(c, 'object')) for c in data_cols})
+        return pd.concat(frames, ignore_index=True)
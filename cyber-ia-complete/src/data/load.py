@@ -1,10 +1,23 @@
 import pandas as pd
 import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation.profiling import Profiler, add_profile_args
+from data.dataset_store import DatasetStore, DEFAULT_PARTITION_COLS
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) 
 
 RAW_PATH = os.path.join(BASE_DIR, "data", "datasets", "unsw_nb15", "csv")
 PROCESSED_PATH = os.path.join(BASE_DIR, "data", "processed")
+STORE_PATH = os.path.join(PROCESSED_PATH, "store")
+
+parser = argparse.ArgumentParser(description="Carrega e processa o UNSW-NB15")
+parser.add_argument("--no_csv", action="store_true", help="grava só o dataset particionado (sem features.csv)")
+add_profile_args(parser)
+args = parser.parse_args()
+prof = Profiler.from_args(args, "load", os.path.join(BASE_DIR, "reports", "profiles"))
 
 os.makedirs(PROCESSED_PATH, exist_ok=True)
 
@@ -13,19 +26,34 @@ test_file = os.path.join(RAW_PATH, "UNSW_NB15_testing-set.csv")
 
 print("Carregando datasets...")
 
-df_train = pd.read_csv(train_file)
-df_test = pd.read_csv(test_file)
-
-df = pd.concat([df_train, df_test], ignore_index=True)
+with prof.stage("read_csv"):
+    df_train = pd.read_csv(train_file)
+    df_test = pd.read_csv(test_file)
 
 print("Pré-processando dados...")
 
-df = df.dropna()
-df = df.select_dtypes(include=["number"])
+with prof.stage("preprocess"):
+    # por arquivo de origem: sem linhas incompletas, colunas numéricas + attack_cat (chave de partição)
+    frames = []
+    for path, part in ((train_file, df_train), (test_file, df_test)):
+        part = part.dropna()
+        keep = part.select_dtypes(include=["number"]).columns.tolist()
+        keep += [c for c in DEFAULT_PARTITION_COLS if c in part.columns and c not in keep]
+        frames.append((os.path.splitext(os.path.basename(path))[0], part[keep]))
+
+# Dataset particionado por label / attack_cat / arquivo de origem: lido por partição e por coluna
+with prof.stage("write_store"):
+    store = DatasetStore.write(frames, STORE_PATH)
 
 output_file = os.path.join(PROCESSED_PATH, "features.csv")
-df.to_csv(output_file, index=False)
+if not args.no_csv:
+    with prof.stage("write_csv"):
+        df = pd.concat([part.select_dtypes(include=["number"]) for _, part in frames], ignore_index=True)
+        df.to_csv(output_file, index=False)
+prof.close()
 
 print("Dataset UNSW-NB15 processado com sucesso!")
-print(f"Total de registros: {df.shape[0]}")
-print(f"Arquivo salvo em: {output_file}")
+print(f"Total de registros: {store.count()}")
+print(f"Dataset particionado em: {STORE_PATH} ({len(store.partitions())} partições)")
+if not args.no_csv:
+    print(f"Arquivo salvo em: {output_file}")
@@ -1,18 +1,30 @@
+import os
+import sys
 import pandas as pd
 from pathlib import Path
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.dataset_store import DatasetStore
+
 # Caminhos
 entrada = Path("Data/Processed/features.csv")
+store = Path("Data/Processed/store")  # dataset particionado gerado pelo load.py
 saida = Path("Data/Processed/unsw_nb15_treino_normal.csv")
 
-# Ler dataset
-df = pd.read_csv(entrada)
+if DatasetStore.exists(store):
+    # Só as partições label=0 são abertas; a coluna label é chave de partição (nem chega a ser lida)
+    df_normal = DatasetStore(store).read({"label": 0})
+    print(f"[info] Lido de {store} (partições label=0). Para treinar sem este CSV: "
+          f"train_detection.py --features {store} --where label=0")
+else:
+    # Ler dataset
+    df = pd.read_csv(entrada)
 
-# Manter apenas tráfego normal
-df_normal = df[df["label"] == 0]
+    # Manter apenas tráfego normal
+    df_normal = df[df["label"] == 0]
 
-# Remover coluna label (modelo não deve ver isso)
-df_normal = df_normal.drop(columns=["label"])
+    # Remover coluna label (modelo não deve ver isso)
+    df_normal = df_normal.drop(columns=["label"])
 
 df_normal.to_csv(saida, index=False)
 
@@ -1,8 +1,15 @@
 # src/features/feature_engineer.py
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from instrumentation.metrics import REGISTRY, stage
+from instrumentation.profiling import Profiler, add_profile_args
+from features.ip_codec import ip_keys
+from ingest.nmap_ingest import IMPORTANT_PORTS, parse_ports
+
 def find_raw_path():
     # tenta vários padrões de pasta (minúsculas/maiúsculas)
     candidates = [Path("data/raw"), Path("Data/Raw"), Path("data/Raw"), Path("Data/raw")]
@@ -13,17 +20,48 @@ def find_raw_path():
     p.mkdir(parents=True, exist_ok=True)
     return p
 
-def gerar_features(pcap_filename="exemplo.csv", nmap_filename="scan.csv", out_filename="features.csv"):
+def port_bitmap(host_keys, ports, port_set=IMPORTANT_PORTS):
+    """
+    Bitmap host x porta numa única passada (sem groupby por porta):
+    linhas = hosts distintos (np.unique das chaves), colunas = port_set, 1 se a porta aparece aberta.
+    Devolve DataFrame com _src_key, open_ports_count e port_<n> (uint8).
+    """
+    keys, host_idx = np.unique(np.asarray(host_keys), return_inverse=True)
+    port_pos = pd.Index([str(p) for p in port_set]).get_indexer(pd.Series(ports).astype(str).str.strip())
+    bitmap = np.zeros((len(keys), len(port_set)), dtype=np.uint8)
+    hit = port_pos >= 0
+    bitmap[host_idx[hit], port_pos[hit]] = 1
+    out = pd.DataFrame(bitmap, columns=[f'port_{p}' for p in port_set])
+    out.insert(0, 'open_ports_count', np.bincount(host_idx, minlength=len(keys)))
+    out.insert(0, '_src_key', keys)
+    return out
+
+def load_port_features(path, port_set=IMPORTANT_PORTS):
+    """Tabela por host gerada por ingest/nmap_ingest.py, indexada pela chave inteira do IP."""
+    ports = pd.read_csv(path)
+    ports['_src_key'] = ip_keys(ports['src_ip'], ports.get('host_int')).view('int64')
+    # mesmo conjunto de colunas port_<n> da configuração, qualquer que tenha sido o --ports do ingest
+    port_cols = [f'port_{p}' for p in port_set]
+    ports = ports.reindex(columns=['_src_key', 'open_ports_count'] + port_cols, fill_value=0)
+    # o mesmo host pode aparecer em mais de um <host> do XML: soma contagens, OR das flags
+    agg = {'open_ports_count': 'sum', **{c: 'max' for c in port_cols}}
+    return ports.groupby('_src_key', sort=False).agg(agg).reset_index()
+
+def gerar_features(pcap_filename="exemplo.csv", nmap_filename="scan.csv", out_filename="features.csv", prof=None,
+                   ports_filename="scan_ports.csv", port_set=IMPORTANT_PORTS):
+    prof = prof or Profiler(False, "feature_engineer")
     raw = find_raw_path()
     processed = Path("Data/Processed")
     processed.mkdir(parents=True, exist_ok=True)
 
     pcap_path = raw / pcap_filename
     nmap_path = raw / nmap_filename
+    ports_path = raw / ports_filename
 
     # Lê o CSV do Wireshark
     try:
-        pcap = pd.read_csv(pcap_path)
+        with prof.stage("read_pcap_csv"):
+            pcap = pd.read_csv(pcap_path)
         print(f"[ok] PCAP carregado: {pcap_path} ({len(pcap)} linhas)")
     except FileNotFoundError:
         print(f"[erro] Arquivo PCAP não encontrado: {pcap_path}")
@@ -37,41 +75,55 @@ def gerar_features(pcap_filename="exemplo.csv", nmap_filename="scan.csv", out_fi
                 pcap = pcap.rename(columns={c: "length"})
                 break
 
-    # Agrega métricas por IP de origem
-    grp = pcap.groupby("src").agg(
-        pkt_count=("length", "count"),
-        pkt_bytes=("length", "sum"),
-        pkt_mean_len=("length", "mean"),
-        unique_dsts=("dst", "nunique"),
-        proto_nunique=("proto", lambda s: s.nunique() if "proto" in pcap.columns else 0)
-    ).reset_index().rename(columns={"src": "src_ip"})
+    # Agrega métricas por IP de origem (chaves inteiras: src_int/dst_int do ingest, ou IPs convertidos aqui)
+    with stage("groupby_aggregation", items=len(pcap)), prof.stage("groupby_aggregation"):
+        pcap = pcap[pcap["src"].notna()]  # como no groupby por string (dropna)
+        pcap["_src_key"] = ip_keys(pcap["src"], pcap.get("src_int")).view("int64")
+        pcap["_dst_key"] = ip_keys(pcap["dst"], pcap.get("dst_int")).view("int64")
+        grp = pcap.groupby("_src_key", sort=False).agg(
+            src_ip=("src", "first"),
+            pkt_count=("length", "count"),
+            pkt_bytes=("length", "sum"),
+            pkt_mean_len=("length", "mean"),
+            unique_dsts=("_dst_key", "nunique"),
+            proto_nunique=("proto", lambda s: s.nunique() if "proto" in pcap.columns else 0)
+        ).reset_index()
 
     grp.fillna(0, inplace=True)
 
-    # Lê o CSV do Nmap
-    if nmap_path.exists():
-        nmap = pd.read_csv(nmap_path, dtype={'port': str})
-        nmap.columns = [c.strip().lower() for c in nmap.columns]
-        open_ports = nmap[nmap['state'].str.lower() == 'open']
-        ports_count = open_ports.groupby('host').size().reset_index(name='open_ports_count')
-        important_ports = ['21','22','23','53','80','139','445','3306']
-        for port in important_ports:
-            ports_count[f'port_{port}'] = open_ports['port'].eq(port).groupby(open_ports['host']).sum().values
-        ports_count = ports_count.rename(columns={'host': 'src_ip'})
-    else:
-        print(f"[warn] Nmap CSV não encontrado em {nmap_path}")
-        ports_count = pd.DataFrame(columns=['src_ip','open_ports_count'])
+    # Features de portas: tabela por host (nmap_ingest, streaming) ou o CSV porta-a-porta do nmap_to_csv
+    with prof.stage("nmap_ports"):
+        if ports_path.exists():
+            ports_count = load_port_features(ports_path, port_set)
+        elif nmap_path.exists():
+            nmap = pd.read_csv(nmap_path, dtype={'port': str})
+            nmap.columns = [c.strip().lower() for c in nmap.columns]
+            open_ports = nmap[nmap['state'].str.lower() == 'open']
+            ports_count = port_bitmap(ip_keys(open_ports['host'], open_ports.get('host_int')).view('int64'),
+                                      open_ports['port'], port_set)
+        else:
+            print(f"[warn] Nmap não encontrado em {ports_path} nem em {nmap_path}")
+            ports_count = pd.DataFrame({'_src_key': pd.Series(dtype='int64'), 'open_ports_count': pd.Series(dtype='float64')})
 
-    # Junta as features
-    features = pd.merge(grp, ports_count, on='src_ip', how='left').fillna(0)
+    # Junta as features (merge pela chave inteira do IP, não pela string)
+    features = pd.merge(grp, ports_count, on='_src_key', how='left').drop(columns=['_src_key']).fillna(0)
     for c in features.columns:
         if c != 'src_ip':
             features[c] = pd.to_numeric(features[c], errors='coerce').fillna(0)
 
     out_path = processed / out_filename
     features.to_csv(out_path, index=False)
+    REGISTRY.write_snapshot("feature_engineer")
     print(f"[ok] Features salvas em: {out_path}")
     print(features.head())
 
 if __name__ == "__main__":
-    gerar_features()
+    import argparse
+    parser = argparse.ArgumentParser(description="Gera features por IP de origem (PCAP CSV + Nmap)")
+    parser.add_argument("--ports", default=",".join(IMPORTANT_PORTS),
+                        help="portas que viram colunas port_<n> (lista e/ou faixas, ex.: 21,22,80,1-1024)")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    prof = Profiler.from_args(args, "feature_engineer")
+    gerar_features(prof=prof, port_set=parse_ports(args.ports))
+    prof.close()
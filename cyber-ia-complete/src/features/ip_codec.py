@@ -0,0 +1,180 @@
+# src/features/ip_codec.py
+"""
+Codificação binária de endereços IP (vetorizada)
+- IPv4 -> uint32; IPv6 -> uint128 guardado como dois uint64 (hi, lo)
+- family: 4, 6 ou 0 (texto que não é IP, ex.: hostname); o texto original fica com quem chamou
+- IPv4 em notação decimal é convertido sem ipaddress (split vetorizado do pandas);
+  só o que sobra (IPv6, texto) passa pelo módulo ipaddress
+- ip_keys(): uma chave uint64 por endereço para groupby/merge sem hash de strings
+- CidrIndex: índice ordenado (família, hi, lo) para consultas por IP e sub-rede (searchsorted);
+  to_array()/from_array(): o índice pronto vai para disco e é aberto via mmap (sem reordenar por processo)
+"""
+import ipaddress
+
+import numpy as np
+import pandas as pd
+
+FAMILY_INVALID = 0
+FAMILY_V4 = 4
+FAMILY_V6 = 6
+_LOW64 = 0xFFFFFFFFFFFFFFFF
+_HASHED = np.uint64(1 << 63)  # chaves de IPv6/texto têm o bit 63 ligado: nunca colidem com IPv4 (< 2**32)
+
+
+def encode_ips(values):
+    """Lista/Series de strings -> (hi uint64, lo uint64, family uint8)."""
+    s = pd.Series(values, dtype=object).astype(str).str.strip()
+    n = len(s)
+    hi = np.zeros(n, dtype=np.uint64)
+    lo = np.zeros(n, dtype=np.uint64)
+    family = np.zeros(n, dtype=np.uint8)
+    if n == 0:
+        return hi, lo, family
+
+    parts = s.str.split('.', n=3, expand=True)
+    if parts.shape[1] == 4:
+        octets = parts.apply(pd.to_numeric, errors='coerce')
+        ok = octets.notna().all(axis=1) & ((octets >= 0) & (octets <= 255)).all(axis=1)
+        # "010.0.0.1", "+1.0.0.1" etc. não são IPv4 válidos para o ipaddress: ficam no caminho lento
+        ok &= s.str.fullmatch(r'(?:0|[1-9]\d{0,2})(?:\.(?:0|[1-9]\d{0,2})){3}').fillna(False)
+        ok = ok.to_numpy()
+        if ok.any():
+            o = octets.to_numpy()[ok].astype(np.uint64)
+            lo[ok] = (o[:, 0] << 24) | (o[:, 1] << 16) | (o[:, 2] << 8) | o[:, 3]
+            family[ok] = FAMILY_V4
+    else:
+        ok = np.zeros(n, dtype=bool)
+
+    for i in np.flatnonzero(~ok):
+        try:
+            addr = ipaddress.ip_address(s.iat[i])
+        except ValueError:
+            continue
+        value = int(addr)
+        hi[i] = value >> 64
+        lo[i] = value & _LOW64
+        family[i] = addr.version
+    return hi, lo, family
+
+
+def encode_ipv4(values):
+    """Como encode_ips, mas devolve uint32 se todos os valores forem IPv4 (None caso contrário)."""
+    hi, lo, family = encode_ips(values)
+    if not np.all(family == FAMILY_V4):
+        return None
+    return lo.astype(np.uint32)
+
+
+def encode_ip(value):
+    """Um único endereço -> (hi, lo, family); family 0 se não for IP."""
+    try:
+        addr = ipaddress.ip_address(str(value).strip())
+    except ValueError:
+        return 0, 0, FAMILY_INVALID
+    v = int(addr)
+    return v >> 64, v & _LOW64, addr.version
+
+
+def decode_ipv4(ints):
+    """uint32 -> strings 'a.b.c.d' (vetorizado)."""
+    ints = np.asarray(ints, dtype=np.uint32)
+    out = ((ints >> 24) & 255).astype(str)
+    for shift in (16, 8, 0):
+        out = np.char.add(np.char.add(out, '.'), ((ints >> shift) & 255).astype(str))
+    return out.astype(object)
+
+
+def decode_ips(hi, lo, family):
+    """(hi, lo, family) -> strings; family 0 vira None (o chamador guarda o texto original)."""
+    hi = np.asarray(hi, dtype=np.uint64)
+    lo = np.asarray(lo, dtype=np.uint64)
+    family = np.asarray(family, dtype=np.uint8)
+    out = np.full(len(lo), None, dtype=object)
+    v4 = family == FAMILY_V4
+    if v4.any():
+        out[v4] = decode_ipv4(lo[v4].astype(np.uint32))
+    for i in np.flatnonzero(family == FAMILY_V6):
+        out[i] = str(ipaddress.IPv6Address((int(hi[i]) << 64) | int(lo[i])))
+    return out
+
+
+def ip_keys(values, ints=None):
+    """
+    Chave uint64 por endereço, para groupby/merge/nunique com chave inteira:
+    IPv4 -> o próprio uint32; IPv6 -> hash do valor de 128 bits; texto -> hash da string.
+    ints: coluna já codificada no ingest (src_int, NaN onde não é IPv4) — evita reparsear as strings.
+    """
+    s = pd.Series(values).reset_index(drop=True)
+    keys = np.zeros(len(s), dtype=np.uint64)
+    todo = np.ones(len(s), dtype=bool)
+    if ints is not None:
+        ints = pd.to_numeric(pd.Series(ints).reset_index(drop=True), errors='coerce')
+        have = ints.notna().to_numpy()
+        keys[have] = ints[have].to_numpy().astype(np.uint64)
+        todo = ~have
+    if todo.any():
+        text = s[todo].astype(str).to_numpy(dtype=object)
+        hi, lo, family = encode_ips(text)
+        k = lo.copy()
+        v6 = family == FAMILY_V6
+        if v6.any():
+            k[v6] = (pd.util.hash_array(hi[v6]) * np.uint64(0x9E3779B97F4A7C15) + pd.util.hash_array(lo[v6])) | _HASHED
+        bad = family == FAMILY_INVALID
+        if bad.any():
+            k[bad] = pd.util.hash_array(text[bad]) | _HASHED
+        keys[todo] = k
+    return keys
+
+
+INDEX_DTYPE = np.dtype([('order', '<i8'), ('family', 'u1'), ('hi', '<u8'), ('lo', '<u8')])
+
+
+class CidrIndex:
+    """
+    Linhas ordenadas por (família, hi, lo): IP exato e sub-rede viram intervalos contíguos,
+    encontrados com searchsorted (O(log n)) em vez de varrer/decodificar a coluna inteira.
+    """
+
+    def __init__(self, hi, lo, family):
+        hi = np.asarray(hi, dtype=np.uint64)
+        lo = np.asarray(lo, dtype=np.uint64)
+        family = np.asarray(family, dtype=np.uint8)
+        self.order = np.lexsort((lo, hi, family))
+        self.family = family[self.order]
+        self.hi = hi[self.order]
+        self.lo = lo[self.order]
+
+    def to_array(self):
+        out = np.empty(len(self.order), dtype=INDEX_DTYPE)
+        out['order'], out['family'], out['hi'], out['lo'] = self.order, self.family, self.hi, self.lo
+        return out
+
+    @classmethod
+    def from_array(cls, arr):
+        """Índice já ordenado (to_array, possivelmente mmap): as colunas são views, nada é copiado."""
+        index = cls.__new__(cls)
+        index.order, index.family, index.hi, index.lo = arr['order'], arr['family'], arr['hi'], arr['lo']
+        return index
+
+    def _bound(self, a, b, value, side):
+        """Posição de `value` (128 bits) no bloco [a, b) de uma família."""
+        h, l = np.uint64(value >> 64), np.uint64(value & _LOW64)
+        start = a + int(np.searchsorted(self.hi[a:b], h, 'left'))
+        end = a + int(np.searchsorted(self.hi[a:b], h, 'right'))
+        return start + int(np.searchsorted(self.lo[start:end], l, side))
+
+    def network_rows(self, network):
+        """Linhas (na ordem original) dentro de `network` ('10.0.0.0/8', '2001:db8::/32', ou um IP)."""
+        net = ipaddress.ip_network(str(network).strip(), strict=False)
+        a = int(np.searchsorted(self.family, net.version, 'left'))
+        b = int(np.searchsorted(self.family, net.version, 'right'))
+        start = self._bound(a, b, int(net.network_address), 'left')
+        end = self._bound(a, b, int(net.broadcast_address), 'right')
+        return np.sort(self.order[start:end])
+
+    def lookup(self, ip):
+        """Linhas de um endereço exato (vazio se não for IP)."""
+        try:
+            return self.network_rows(ipaddress.ip_address(str(ip).strip()))
+        except ValueError:
+            return np.array([], dtype=np.int64)
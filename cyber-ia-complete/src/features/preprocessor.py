@@ -0,0 +1,80 @@
+# src/features/preprocessor.py
+"""
+Artefato único de pré-processamento (gerado no treino, reutilizado na inferência)
+- Ordem das colunas e dtypes de entrada dos modelos
+- Parâmetros do StandardScaler (média / desvio)
+- transform(): seleção + preenchimento + escala numa única passada vetorizada,
+  sem refit e sem select_dtypes por execução
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class FeaturePreprocessor:
+    def __init__(self, columns=None, dtypes=None, mean=None, scale=None):
+        self.columns = list(columns or [])
+        self.dtypes = dict(dtypes or {})
+        self.mean = np.asarray(mean if mean is not None else [], dtype=np.float32)
+        self.scale = np.asarray(scale if scale is not None else [], dtype=np.float32)
+
+    @classmethod
+    def fit(cls, df, exclude=('label',)):
+        """Descobre as colunas numéricas (uma vez) e ajusta média/desvio como o StandardScaler."""
+        cols = [c for c in df.select_dtypes(include=[np.number]).columns if c not in exclude]
+        X = df[cols].to_numpy(dtype=np.float64, na_value=0.0)
+        X = np.nan_to_num(X, copy=False)
+        mean = X.mean(axis=0)
+        std = X.std(axis=0)
+        std[std == 0] = 1.0  # mesmo tratamento do StandardScaler para colunas constantes
+        return cls(cols, {c: str(df[c].dtype) for c in cols}, mean, std)
+
+    @property
+    def n_features(self):
+        return len(self.columns)
+
+    def raw_matrix(self, df):
+        """Matriz float32 nas colunas/ordem do treino (faltantes e NaN -> 0), sem escala."""
+        missing = [c for c in self.columns if c not in df.columns]
+        if missing:
+            df = df.assign(**{c: 0.0 for c in missing})
+        sub = df[self.columns]
+        bad = [c for c in self.columns if not pd.api.types.is_numeric_dtype(sub[c].dtype)]
+        if bad:  # só converte colunas que chegaram com tipo diferente do treino
+            sub = sub.assign(**{c: pd.to_numeric(sub[c], errors='coerce') for c in bad})
+        X = sub.to_numpy(dtype=np.float32, na_value=0.0)
+        return np.nan_to_num(X, copy=False)
+
+    def transform(self, df):
+        X = self.raw_matrix(df)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+    def inverse_transform(self, X):
+        return X * self.scale + self.mean
+
+    def to_dict(self):
+        return {
+            'columns': self.columns,
+            'dtypes': self.dtypes,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['columns'], d.get('dtypes'), d['mean'], d['scale'])
+
+    def save(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
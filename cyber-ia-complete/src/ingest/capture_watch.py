@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# src/ingest/capture_watch.py
+"""
+Ingestão contínua de uma pasta de capturas rotacionadas (tcpdump -G / -C / -W)
+- A cada ciclo, lê só os bytes novos de cada .pcap (arquivos novos ou que cresceram), a partir do
+  offset salvo no checkpoint; um registro incompleto no fim do arquivo fica para o próximo ciclo
+- Leitor pcap próprio (struct): Ethernet/VLAN, Linux SLL e IP cru -> IPv4/IPv6 -> TCP/UDP,
+  direto nos lotes de arrays da tabela de fluxos (ingest/flow_table.py), sem scapy
+- Fluxos fechados vão para segmentos <out_dir>/flows-<geração>.csv; os fluxos ainda abertos
+  vão para o snapshot da tabela (table-<geração>.npy)
+- Checkpoint atômico (<out_dir>/checkpoint.json: geração, offset/inode por arquivo, snapshot):
+  segmentos de uma geração sem checkpoint são descartados no restart, então nada é gravado duas
+  vezes e nenhum byte já ingerido é reprocessado
+- Arquivo truncado ou substituído (inode diferente / tamanho < offset / impressão digital do início
+  diferente) é lido de novo desde o início. A impressão digital (hash do cabeçalho global + primeiro
+  registro) pega o anel do tcpdump -W, que reabre o mesmo inode com "w" e pode passar do offset antigo
+- Arquivos que saíram da pasta (rotação -G/-W) saem do checkpoint
+- Registro com comprimento capturado (incl) acima do snaplen do cabeçalho global (ou de
+  MAX_RECORD_LEN) é tratado como corrupção: aviso e o resto do arquivo é ignorado, em vez de
+  bufferizar o arquivo inteiro esperando um "registro incompleto" que nunca fecha
+
+Uso:
+  python src/ingest/capture_watch.py --dir /var/capture --out_dir Data/Processed/flows
+  python src/ingest/capture_watch.py --dir /var/capture --out_dir Data/Processed/flows --once --flush
+"""
+import os
+import sys
+import json
+import time
+import struct
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from ingest.flow_table import FlowTable, PACKET_FIELDS, packet_batch, flow_records
+from instrumentation.metrics import REGISTRY, stage
+from instrumentation.profiling import Profiler, add_profile_args
+
+PCAP_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+READ_CHUNK = 64 * 1024 * 1024
+MAX_RECORD_LEN = 262144  # snaplen máximo do tcpdump/libpcap
+_MAGIC = {  # magic -> (ordem dos bytes, divisor da fração do timestamp)
+    b'\xd4\xc3\xb2\xa1': ('<', 1e6), b'\xa1\xb2\xc3\xd4': ('>', 1e6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e9), b'\xa1\xb2\x3c\x4d': ('>', 1e9),
+}
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 101, 228, 229)
+LINKTYPE_LINUX_SLL = 113
+ETH_IPV4, ETH_IPV6, ETH_VLAN = 0x0800, 0x86DD, (0x8100, 0x88A8)
+_LOW64 = 0xFFFFFFFFFFFFFFFF
+
+
+class CorruptCapture(ValueError):
+    """Cabeçalho de registro inválido; `consumed` = bytes de registros válidos antes dele."""
+
+    def __init__(self, consumed, incl, max_incl):
+        super().__init__(f"registro com incl={incl} > {max_incl}")
+        self.consumed = consumed
+
+
+def read_pcap_header(f):
+    """
+    Cabeçalho global: (ordem dos bytes, divisor da fração, linktype, maior incl aceito);
+    None se não for pcap clássico. O maior incl é o snaplen (limitado a MAX_RECORD_LEN).
+    """
+    head = f.read(PCAP_HEADER_LEN)
+    if len(head) < PCAP_HEADER_LEN or head[:4] not in _MAGIC:
+        return None
+    endian, frac = _MAGIC[head[:4]]
+    snaplen, linktype = struct.unpack_from(endian + 'II', head, 16)
+    max_incl = snaplen if 0 < snaplen <= MAX_RECORD_LEN else MAX_RECORD_LEN
+    return endian, frac, linktype & 0x0FFFFFFF, max_incl
+
+
+def head_fingerprint(f, size):
+    """
+    (hash, nº de bytes) do início do arquivo: cabeçalho global + primeiro registro completo
+    (só o cabeçalho enquanto o primeiro registro ainda está sendo escrito).
+    """
+    f.seek(0)
+    head = f.read(PCAP_HEADER_LEN + RECORD_HEADER_LEN)
+    n = min(len(head), PCAP_HEADER_LEN)
+    if len(head) == PCAP_HEADER_LEN + RECORD_HEADER_LEN and head[:4] in _MAGIC:
+        incl = struct.unpack_from(_MAGIC[head[:4]][0] + 'I', head, PCAP_HEADER_LEN + 8)[0]
+        if size >= PCAP_HEADER_LEN + RECORD_HEADER_LEN + incl:
+            n = PCAP_HEADER_LEN + RECORD_HEADER_LEN + incl
+    return _digest(f, n), n
+
+
+def _digest(f, n):
+    f.seek(0)
+    return hashlib.blake2b(f.read(n), digest_size=8).hexdigest()
+
+
+def _l3_offset(data, linktype):
+    """(offset do cabeçalho IP, versão) ou None."""
+    if linktype == LINKTYPE_ETHERNET:
+        off, ethertype = 14, int.from_bytes(data[12:14], 'big') if len(data) >= 14 else 0
+        while ethertype in ETH_VLAN and len(data) >= off + 4:
+            ethertype = int.from_bytes(data[off + 2:off + 4], 'big')
+            off += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        off, ethertype = 16, int.from_bytes(data[14:16], 'big') if len(data) >= 16 else 0
+    elif linktype in LINKTYPE_RAW:
+        off = 0
+        ethertype = {4: ETH_IPV4, 6: ETH_IPV6}.get(data[0] >> 4 if data else 0, 0)
+    else:
+        return None
+    if ethertype == ETH_IPV4:
+        return off, 4
+    if ethertype == ETH_IPV6:
+        return off, 6
+    return None
+
+
+def parse_records(buf, endian, frac, linktype, max_incl, cols):
+    """
+    Disseca os registros completos de `buf` nas colunas de PACKET_FIELDS (listas em `cols`).
+    Devolve quantos bytes foram consumidos (o resto é um registro ainda incompleto).
+    - incl > max_incl: cabeçalho corrompido -> CorruptCapture (os registros anteriores já estão em `cols`)
+    """
+    rec = struct.Struct(endian + 'IIII')
+    pos, n = 0, len(buf)
+    while pos + RECORD_HEADER_LEN <= n:
+        sec, sub, incl, orig = rec.unpack_from(buf, pos)
+        if incl > max_incl:
+            raise CorruptCapture(pos, incl, max_incl)
+        end = pos + RECORD_HEADER_LEN + incl
+        if end > n:
+            break
+        data = buf[pos + RECORD_HEADER_LEN:end]
+        pos = end
+        l3 = _l3_offset(data, linktype)
+        if l3 is None:
+            continue
+        off, version = l3
+        if version == 4:
+            if len(data) < off + 20:
+                continue
+            ihl = (data[off] & 0x0F) * 4
+            ttl, proto = data[off + 8], data[off + 9]
+            src = int.from_bytes(data[off + 12:off + 16], 'big')
+            dst = int.from_bytes(data[off + 16:off + 20], 'big')
+            l4 = off + ihl if (int.from_bytes(data[off + 6:off + 8], 'big') & 0x1FFF) == 0 else None
+        else:
+            if len(data) < off + 40:
+                continue
+            proto, ttl = data[off + 6], data[off + 7]
+            src = int.from_bytes(data[off + 8:off + 24], 'big')
+            dst = int.from_bytes(data[off + 24:off + 40], 'big')
+            l4 = off + 40
+        sport = dport = flags = win = seq = 0
+        if l4 is not None and proto in (6, 17) and len(data) >= l4 + 4:
+            sport, dport = struct.unpack_from('>HH', data, l4)
+            if proto == 6 and len(data) >= l4 + 16:
+                seq = struct.unpack_from('>I', data, l4 + 4)[0]
+                flags = data[l4 + 13]
+                win = struct.unpack_from('>H', data, l4 + 14)[0]
+        cols['ts'].append(sec + sub / frac)
+        cols['src_hi'].append(src >> 64)
+        cols['src_lo'].append(src & _LOW64)
+        cols['dst_hi'].append(dst >> 64)
+        cols['dst_lo'].append(dst & _LOW64)
+        cols['family'].append(version)
+        cols['sport'].append(sport)
+        cols['dport'].append(dport)
+        cols['proto'].append(proto)
+        cols['length'].append(orig)
+        cols['ttl'].append(ttl)
+        cols['flags'].append(flags)
+        cols['win'].append(win)
+        cols['seq'].append(seq)
+    return pos
+
+
+class Checkpoint:
+    """checkpoint.json: geração, estado por arquivo ({offset, inode, head, head_len}) e snapshot da tabela de fluxos."""
+
+    def __init__(self, out_dir):
+        self.out_dir = Path(out_dir)
+        self.path = self.out_dir / 'checkpoint.json'
+        self.generation = 0
+        self.files = {}
+        self.table = None
+        if self.path.exists():
+            with open(self.path) as f:
+                d = json.load(f)
+            self.generation = d['generation']
+            self.files = d['files']
+            self.table = d.get('table')
+
+    def discard_uncommitted(self):
+        """Remove segmentos/snapshots de gerações posteriores ao checkpoint (ciclo interrompido)."""
+        for p in list(self.out_dir.glob('flows-*.csv')) + list(self.out_dir.glob('table-*.npy')):
+            if int(p.stem.split('-')[1]) > self.generation:
+                p.unlink()
+        for p in self.out_dir.glob('*.tmp'):
+            p.unlink()
+
+    def commit(self, generation, files, table):
+        tmp = self.path.with_suffix('.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'generation': generation, 'files': files, 'table': table}, f, indent=2)
+        os.replace(tmp, self.path)  # atômico: ou o checkpoint antigo, ou o novo
+        old = self.table
+        self.generation, self.files, self.table = generation, files, table
+        if old and old != table and (self.out_dir / old).exists():
+            (self.out_dir / old).unlink()
+
+
+class CaptureWatcher:
+    def __init__(self, capture_dir, out_dir, pattern='*.pcap*', idle_timeout=60.0, active_timeout=1800.0,
+                 max_flows=1_000_000, batch_size=65536):
+        self.capture_dir = Path(capture_dir)
+        self.pattern = pattern
+        self.batch_size = batch_size
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+        self.checkpoint = Checkpoint(out_dir)
+        self.checkpoint.discard_uncommitted()
+        self.table = FlowTable(idle_timeout, active_timeout, max_flows)
+        if self.checkpoint.table:
+            self.table.restore(np.load(self.checkpoint.out_dir / self.checkpoint.table))
+
+    def _files(self):
+        found = [p for p in self.capture_dir.glob(self.pattern) if p.is_file()]
+        return sorted(found, key=lambda p: (p.stat().st_mtime, p.name))  # ordem de rotação
+
+    def _ingest_file(self, path, entry, cols, push):
+        """Lê os registros novos de um arquivo; devolve a entrada do checkpoint atualizada."""
+        st = path.stat()
+        with open(path, 'rb') as f:
+            # checkpoints antigos não têm 'head': valem só inode e tamanho
+            rewritten = entry and entry.get('head') and _digest(f, entry['head_len']) != entry['head']
+            if entry and (entry['inode'] != st.st_ino or st.st_size < entry['offset'] or rewritten):
+                print(f"[warn] {path.name} foi truncado ou substituído; relendo desde o início")
+                entry = None
+            if entry and (st.st_size == entry['offset'] or entry.get('skipped')):
+                return entry  # sem bytes novos, ou ignorado (pcapng/corrompido) até ser reescrito
+            f.seek(0)
+            header = read_pcap_header(f)
+            if header is None:
+                if st.st_size >= PCAP_HEADER_LEN:
+                    print(f"[warn] {path.name} não é pcap clássico (pcapng?); ignorado")
+                    head, head_len = head_fingerprint(f, st.st_size)
+                    return {'inode': st.st_ino, 'offset': st.st_size, 'skipped': True, 'head': head, 'head_len': head_len}
+                return entry  # cabeçalho ainda não foi todo escrito
+            offset = entry['offset'] if entry else PCAP_HEADER_LEN
+            f.seek(offset)
+            pending = b''  # no máximo um registro (incl <= max_incl): não cresce com o arquivo
+            while True:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    break
+                buf = pending + chunk
+                try:
+                    used = parse_records(buf, *header, cols)
+                except CorruptCapture as e:
+                    push()
+                    print(f"[warn] {path.name}: {e} no offset {offset + e.consumed}; resto do arquivo ignorado")
+                    head, head_len = head_fingerprint(f, st.st_size)
+                    return {'inode': st.st_ino, 'offset': st.st_size, 'skipped': True, 'head': head, 'head_len': head_len}
+                offset += used
+                pending = buf[used:]  # registro incompleto: completa com o próximo bloco (ou no próximo ciclo)
+                push()
+            head, head_len = head_fingerprint(f, offset)
+        return {'inode': st.st_ino, 'offset': offset, 'head': head, 'head_len': head_len}
+
+    def cycle(self, flush=False):
+        """Um ciclo: bytes novos de todos os arquivos -> segmento de fluxos + checkpoint. Devolve nº de fluxos."""
+        cols = {k: [] for k in PACKET_FIELDS}
+
+        def push(force=False):
+            if cols['ts'] and (force or len(cols['ts']) >= self.batch_size):
+                self.table.add(packet_batch(cols))
+                for v in cols.values():
+                    v.clear()
+
+        present = self._files()
+        names = {p.name for p in present}
+        files = {name: e for name, e in self.checkpoint.files.items() if name in names}  # rotacionados para fora
+        before = self.table.packets
+        with stage('capture_watch_read') as st:
+            for path in present:
+                entry = self._ingest_file(path, files.get(path.name), cols, push)
+                if entry is not None:
+                    files[path.name] = entry
+                push(force=True)
+            st.add_items(self.table.packets - before)
+        if flush:
+            self.table.flush()
+        closed = self.table.pop_closed()
+        if files == self.checkpoint.files and not len(closed):
+            return 0
+
+        generation = self.checkpoint.generation + 1
+        out_dir = self.checkpoint.out_dir
+        with stage('capture_watch_write', items=len(closed)):
+            if len(closed):
+                tmp = out_dir / f'flows-{generation:08d}.csv.tmp'
+                flow_records(closed).to_csv(tmp, index=False)
+                os.replace(tmp, out_dir / f'flows-{generation:08d}.csv')
+            table_name = f'table-{generation:08d}.npy'
+            np.save(out_dir / table_name, self.table.snapshot())
+            self.checkpoint.commit(generation, files, table_name)
+        return len(closed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingestão contínua de capturas rotacionadas com checkpoint")
+    ap.add_argument('--dir', required=True, help='pasta onde o tcpdump grava as capturas')
+    ap.add_argument('--pattern', default='*.pcap*', help='glob dos arquivos de captura')
+    ap.add_argument('--out_dir', default='Data/Processed/flows', help='segmentos de fluxos + checkpoint')
+    ap.add_argument('--interval', type=float, default=10.0, help='segundos entre varreduras da pasta')
+    ap.add_argument('--once', action='store_true', help='um único ciclo (ex.: cron)')
+    ap.add_argument('--flush', action='store_true', help='com --once: fecha também os fluxos ainda abertos')
+    ap.add_argument('--idle_timeout', type=float, default=60.0)
+    ap.add_argument('--active_timeout', type=float, default=1800.0)
+    ap.add_argument('--max_flows', type=int, default=1_000_000)
+    ap.add_argument('--batch_size', type=int, default=65536)
+    add_profile_args(ap)
+    args = ap.parse_args()
+    prof = Profiler.from_args(args, 'capture_watch', Path(args.out_dir) / 'profiles')
+
+    watcher = CaptureWatcher(args.dir, args.out_dir, args.pattern, args.idle_timeout, args.active_timeout,
+                             args.max_flows, args.batch_size)
+    print(f"[ok] Observando {args.dir} ({args.pattern}); checkpoint na geração {watcher.checkpoint.generation}, "
+          f"{len(watcher.table)} fluxos abertos restaurados")
+    try:
+        while True:
+            with prof.stage('cycle'):
+                n = watcher.cycle(flush=args.once and args.flush)
+            if n:
+                print(f"[ok] Geração {watcher.checkpoint.generation}: {n} fluxos gravados, {len(watcher.table)} abertos")
+            REGISTRY.write_snapshot('capture_watch')
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("[info] Interrompido; o último checkpoint continua válido")
+    prof.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,432 @@
+# src/ingest/flow_table.py
+"""
+Tabela de fluxos bidirecionais (5-tupla) para transformar pacotes em registros no estilo UNSW-NB15
+- Pacotes entram em lotes de arrays (packet_batch); nada é feito pacote a pacote em Python
+- Chave canônica: (menor ponta, maior ponta, protocolo) -> os dois sentidos caem no mesmo fluxo;
+  o iniciador (src do registro) é quem mandou o primeiro pacote
+- Tabela hash de endereçamento aberto em arrays NumPy (hash uint64 + índice), sondagem linear
+  vetorizada e verificação da tupla completa; o estado dos fluxos é um array estruturado FLOW_DTYPE
+- Timeouts: ociosidade (--idle_timeout) e ativo (--active_timeout, registro parcial a cada N segundos,
+  como os status records do Argus); memória limitada: acima de max_flows os mais antigos são fechados
+- flow_records(): estados fechados -> DataFrame com src_ip/dst_ip/sport/dsport e as colunas numéricas
+  do UNSW-NB15 que dá para medir no pacote (dur, spkts, dpkts, sbytes, rate, sttl, sload, sinpkt,
+  sjit, swin, stcpb, tcprtt, synack, ackdat, smean, ct_*_ltm, ...); as demais ficam a cargo do
+  FeaturePreprocessor (colunas ausentes viram 0)
+"""
+import numpy as np
+import pandas as pd
+
+from features.ip_codec import decode_ips
+
+DEFAULT_IDLE_TIMEOUT = 60.0
+DEFAULT_ACTIVE_TIMEOUT = 1800.0
+DEFAULT_MAX_FLOWS = 1_000_000
+CT_WINDOW = 100  # ct_*_ltm: conexões iguais entre as últimas 100 (definição do UNSW-NB15)
+
+TCP = 6
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+PACKET_FIELDS = {
+    'ts': np.float64, 'src_hi': np.uint64, 'src_lo': np.uint64, 'dst_hi': np.uint64, 'dst_lo': np.uint64,
+    'family': np.uint8, 'sport': np.uint16, 'dport': np.uint16, 'proto': np.uint8, 'length': np.uint32,
+    'ttl': np.uint8, 'flags': np.uint8, 'win': np.uint16, 'seq': np.uint32,
+}
+
+FLOW_DTYPE = np.dtype([
+    ('key', '<u8'), ('a_init', 'u1'),
+    ('src_hi', '<u8'), ('src_lo', '<u8'), ('dst_hi', '<u8'), ('dst_lo', '<u8'), ('family', 'u1'),
+    ('sport', '<u2'), ('dport', '<u2'), ('proto', 'u1'),
+    ('stime', '<f8'), ('ltime', '<f8'), ('s_last', '<f8'), ('d_first', '<f8'), ('d_last', '<f8'),
+    ('spkts', '<u4'), ('dpkts', '<u4'), ('sbytes', '<u8'), ('dbytes', '<u8'),
+    ('sttl', 'u1'), ('dttl', 'u1'), ('swin', '<u2'), ('dwin', '<u2'), ('stcpb', '<u4'), ('dtcpb', '<u4'),
+    ('s_ia_sum', '<f8'), ('s_ia_sq', '<f8'), ('d_ia_sum', '<f8'), ('d_ia_sq', '<f8'),
+    ('syn_t', '<f8'), ('synack_t', '<f8'), ('ack_t', '<f8'),  # inf = não visto
+])
+
+_EMPTY = -1
+_TOMB = -2
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def packet_batch(columns):
+    """dict de listas/arrays (chaves de PACKET_FIELDS) -> dict de arrays com os dtypes da tabela."""
+    return {k: np.asarray(columns[k], dtype=dt) for k, dt in PACKET_FIELDS.items()}
+
+
+def _canonical(p):
+    """Pontas ordenadas (e1 <= e2) e se a ponta e1 é o remetente do pacote."""
+    src = (p['src_hi'], p['src_lo'], p['sport'])
+    dst = (p['dst_hi'], p['dst_lo'], p['dport'])
+    a_is_src = (src[0] < dst[0]) | ((src[0] == dst[0]) & ((src[1] < dst[1]) | ((src[1] == dst[1]) & (src[2] <= dst[2]))))
+    e1 = tuple(np.where(a_is_src, s, d) for s, d in zip(src, dst))
+    e2 = tuple(np.where(a_is_src, d, s) for s, d in zip(src, dst))
+    return e1, e2, a_is_src
+
+
+def _hash(fields):
+    h = np.zeros(len(fields[0]), dtype=np.uint64)
+    for f in fields:
+        h = h * _MIX ^ pd.util.hash_array(np.asarray(f, dtype=np.uint64))
+    return h
+
+
+class FlowTable:
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, active_timeout=DEFAULT_ACTIVE_TIMEOUT,
+                 max_flows=DEFAULT_MAX_FLOWS):
+        self.idle_timeout = float(idle_timeout)
+        self.active_timeout = float(active_timeout)
+        self.max_flows = int(max_flows)
+        n_slots = 1 << int(np.ceil(np.log2(max(2 * self.max_flows, 2))))
+        self._mask = np.uint64(n_slots - 1)
+        self._slot_key = np.zeros(n_slots, dtype=np.uint64)
+        self._slot_idx = np.full(n_slots, _EMPTY, dtype=np.int64)
+        self._n_tomb = 0
+        self.state = np.zeros(self.max_flows, dtype=FLOW_DTYPE)
+        self._slot_of = np.full(self.max_flows, -1, dtype=np.int64)  # posição na tabela hash de cada fluxo vivo
+        self._free = np.arange(self.max_flows - 1, -1, -1, dtype=np.int64)  # pilha de índices livres
+        self._n_free = self.max_flows
+        self._closed = []
+        self.packets = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return self.max_flows - self._n_free
+
+    # --- tabela hash ---------------------------------------------------------
+    def _same_tuple(self, idx, e1, e2, proto):
+        s = self.state[idx]
+        a = s['a_init'].astype(bool)
+        return ((np.where(a, s['src_hi'], s['dst_hi']) == e1[0]) & (np.where(a, s['src_lo'], s['dst_lo']) == e1[1])
+                & (np.where(a, s['sport'], s['dport']) == e1[2]) & (np.where(a, s['dst_hi'], s['src_hi']) == e2[0])
+                & (np.where(a, s['dst_lo'], s['src_lo']) == e2[1]) & (np.where(a, s['dport'], s['sport']) == e2[2])
+                & (s['proto'] == proto))
+
+    def _lookup(self, h, e1, e2, proto):
+        """Índice do fluxo vivo de cada chave (-1 se não existe); sondagem linear em lote."""
+        out = np.full(len(h), -1, dtype=np.int64)
+        pos = h & self._mask
+        todo = np.arange(len(h))
+        while todo.size:
+            p = pos[todo]
+            idx = self._slot_idx[p]
+            live = idx >= 0
+            match = np.zeros(todo.size, dtype=bool)
+            cand = np.flatnonzero(live & (self._slot_key[p] == h[todo]))
+            if cand.size:
+                t = todo[cand]
+                match[cand] = self._same_tuple(idx[cand], tuple(x[t] for x in e1), tuple(x[t] for x in e2), proto[t])
+            out[todo[match]] = idx[match]
+            todo = todo[~match & (idx != _EMPTY)]
+            pos[todo] = (pos[todo] + np.uint64(1)) & self._mask
+        return out
+
+    def _insert(self, h, idx):
+        """Insere chaves ausentes (primeira posição vazia ou lápide); disputas resolvidas por ordem."""
+        pos = h & self._mask
+        todo = np.arange(len(h))
+        while todo.size:
+            free = self._slot_idx[pos[todo]] < 0
+            cand = todo[free]
+            _, first = np.unique(pos[cand], return_index=True)
+            win = cand[first]
+            self._n_tomb -= int(np.sum(self._slot_idx[pos[win]] == _TOMB))
+            self._slot_key[pos[win]] = h[win]
+            self._slot_idx[pos[win]] = idx[win]
+            self._slot_of[idx[win]] = pos[win]
+            todo = np.setdiff1d(todo, win, assume_unique=True)
+            pos[todo] = (pos[todo] + np.uint64(1)) & self._mask
+
+    def _release(self, idx):
+        """Remove fluxos da tabela (lápides) e devolve os índices à pilha livre."""
+        if len(idx) == 0:
+            return
+        self._slot_idx[self._slot_of[idx]] = _TOMB
+        self._slot_of[idx] = -1
+        self._n_tomb += len(idx)
+        self._free[self._n_free:self._n_free + len(idx)] = idx
+        self._n_free += len(idx)
+        if self._n_tomb > len(self._slot_idx) // 4:
+            self._rehash()
+
+    def _rehash(self):
+        live = np.flatnonzero(self._slot_of >= 0)
+        self._slot_key[:] = 0
+        self._slot_idx[:] = _EMPTY
+        self._n_tomb = 0
+        self._insert(self.state['key'][live], live)
+
+    def _allocate(self, n):
+        """n índices livres; sem espaço, fecha os fluxos vistos há mais tempo (memória limitada)."""
+        short = n - self._n_free
+        if short > 0:
+            live = np.flatnonzero(self._slot_of >= 0)
+            oldest = live[np.argpartition(self.state['ltime'][live], short - 1)[:short]]
+            self._close(oldest)
+            self.evicted += short
+        self._n_free -= n
+        return self._free[self._n_free:self._n_free + n].copy()
+
+    def _close(self, idx):
+        idx = np.asarray(idx, dtype=np.int64)
+        if len(idx):
+            self._closed.append(self.state[idx].copy())
+            self._release(idx)
+
+    # --- pacotes -------------------------------------------------------------
+    def add(self, p):
+        """Processa um lote de pacotes (dict de arrays, ver packet_batch); fecha fluxos expirados."""
+        n = len(p['ts'])
+        if n == 0:
+            return self
+        self.packets += n
+        e1, e2, a_is_src = _canonical(p)
+        proto = p['proto']
+        order = np.lexsort((p['ts'], proto, e2[2], e2[1], e2[0], e1[2], e1[1], e1[0]))
+        t = p['ts'][order]
+        e1 = tuple(x[order] for x in e1)
+        e2 = tuple(x[order] for x in e2)
+        a_is_src, proto = a_is_src[order], proto[order]
+        q = {k: v[order] for k, v in p.items()}
+
+        # uma chave por 5-tupla canônica do lote, e o fluxo vivo correspondente na tabela
+        new_key = np.ones(n, dtype=bool)
+        new_key[1:] = ((e1[0][1:] != e1[0][:-1]) | (e1[1][1:] != e1[1][:-1]) | (e1[2][1:] != e1[2][:-1])
+                       | (e2[0][1:] != e2[0][:-1]) | (e2[1][1:] != e2[1][:-1]) | (e2[2][1:] != e2[2][:-1])
+                       | (proto[1:] != proto[:-1]))
+        ki = np.flatnonzero(new_key)
+        kid = np.cumsum(new_key) - 1
+        h = _hash([e1[0][ki], e1[1][ki], e1[2][ki], e2[0][ki], e2[1][ki], e2[2][ki], proto[ki]])
+        h[h < 2] += np.uint64(2)
+        slot = self._lookup(h, tuple(x[ki] for x in e1), tuple(x[ki] for x in e2), proto[ki])
+
+        # segmentos: quebra por ociosidade; subsegmentos: a cada active_timeout desde o início do fluxo
+        prev_t = np.empty(n)
+        prev_t[1:] = t[:-1]
+        has_slot = slot[kid] >= 0
+        prev_t[ki] = np.where(slot >= 0, self.state['ltime'][np.maximum(slot, 0)], np.nan)
+        gap = t - prev_t
+        seg_new = (new_key & ~has_slot) | (gap > self.idle_timeout)
+        seg = np.cumsum(seg_new | new_key) - 1
+        si = np.flatnonzero(seg_new | new_key)
+        seg_cont = ~seg_new[si]  # primeiro segmento da chave que continua o fluxo da tabela
+        seg_start = np.where(seg_cont, self.state['stime'][np.maximum(slot[kid[si]], 0)], t[si])
+        sub = np.floor((t - seg_start[seg]) / self.active_timeout).astype(np.int64)
+        grp_new = np.ones(n, dtype=bool)
+        grp_new[1:] = (seg[1:] != seg[:-1]) | (sub[1:] != sub[:-1])
+        g = np.cumsum(grp_new) - 1
+        gi = np.flatnonzero(grp_new)
+        G = len(gi)
+        cont = grp_new[gi] & np.isin(gi, si[seg_cont]) & (sub[gi] == 0)
+        g_slot = np.where(cont, slot[kid[gi]], -1)
+        last_of_key = np.ones(G, dtype=bool)
+        last_of_key[:-1] = kid[gi[1:]] != kid[gi[:-1]]
+
+        # fluxos da tabela não continuados neste lote (ociosos ou além do active timeout) são fechados
+        continued = np.zeros(len(slot), dtype=bool)
+        continued[kid[gi[cont]]] = True
+        self._close(slot[(slot >= 0) & ~continued])
+        # continuado mas quebrado de novo no lote: o estado somado sai em `st`, a entrada antiga é liberada
+        self._release(g_slot[cont & ~last_of_key])
+
+        st = self._aggregate(q, t, g, gi, G, a_is_src, g_slot)
+        st['key'] = h[kid[gi]]
+
+        # o último grupo de cada chave fica aberto na tabela; os anteriores já terminaram
+        self._closed.append(st[~last_of_key])
+        keep = np.flatnonzero(last_of_key)
+        reuse = g_slot[keep] >= 0
+        self.state[g_slot[keep[reuse]]] = st[keep[reuse]]
+        fresh = keep[~reuse]
+        if len(fresh) > self.max_flows:  # o lote sozinho passa do limite: os mais antigos saem direto
+            order = np.argsort(st['ltime'][fresh], kind='stable')
+            self._closed.append(st[fresh[order[:-self.max_flows]]])
+            self.evicted += len(fresh) - self.max_flows
+            fresh = fresh[order[-self.max_flows:]]
+        if len(fresh):
+            idx = self._allocate(len(fresh))
+            self.state[idx] = st[fresh]
+            self._insert(st['key'][fresh], idx)
+        self.expire(t.max())
+        return self
+
+    def _aggregate(self, q, t, g, gi, G, a_is_src, g_slot):
+        """Estado FLOW_DTYPE de cada grupo do lote, somado ao estado da tabela quando o grupo o continua."""
+        cont = g_slot >= 0
+        prev = self.state[np.maximum(g_slot, 0)]
+        st = np.zeros(G, dtype=FLOW_DTYPE)
+        a_init = np.where(cont, prev['a_init'].astype(bool), a_is_src[gi])
+        fwd = a_is_src == a_init[g]
+
+        # orientação do registro: src = iniciador
+        first = gi
+        for f, (s_col, d_col) in {'hi': ('src_hi', 'dst_hi'), 'lo': ('src_lo', 'dst_lo'), 'port': ('sport', 'dport')}.items():
+            s_val = np.where(fwd[first], q[s_col][first], q[d_col][first])
+            d_val = np.where(fwd[first], q[d_col][first], q[s_col][first])
+            st[s_col] = np.where(cont, prev[s_col], s_val)
+            st[d_col] = np.where(cont, prev[d_col], d_val)
+        st['a_init'] = a_init
+        st['family'] = q['family'][first]
+        st['proto'] = q['proto'][first]
+
+        length = q['length'].astype(np.float64)
+        bwd = ~fwd
+        st['spkts'] = prev['spkts'] * cont + np.bincount(g, weights=fwd, minlength=G).astype(np.uint32)
+        st['dpkts'] = prev['dpkts'] * cont + np.bincount(g, weights=bwd, minlength=G).astype(np.uint32)
+        st['sbytes'] = prev['sbytes'] * cont + np.bincount(g, weights=length * fwd, minlength=G).astype(np.uint64)
+        st['dbytes'] = prev['dbytes'] * cont + np.bincount(g, weights=length * bwd, minlength=G).astype(np.uint64)
+        st['stime'] = np.where(cont, prev['stime'], t[first])
+        st['ltime'] = np.maximum.reduceat(t, gi)
+
+        had_s = cont & (prev['spkts'] > 0)
+        had_d = cont & (prev['dpkts'] > 0)
+        for mask, had, prefix, ttl, win, tcpb in ((fwd, had_s, 's', 'sttl', 'swin', 'stcpb'),
+                                                  (bwd, had_d, 'd', 'dttl', 'dwin', 'dtcpb')):
+            idx = np.flatnonzero(mask)
+            gd = g[idx]
+            firsts = np.ones(len(idx), dtype=bool)
+            firsts[1:] = gd[1:] != gd[:-1]
+            lasts = np.ones(len(idx), dtype=bool)
+            lasts[:-1] = gd[1:] != gd[:-1]
+            seen = np.zeros(G, dtype=bool)
+            seen[gd] = True
+            # primeiro pacote do sentido: TTL, janela e sequência base (se a tabela ainda não os tinha)
+            for col, src in ((ttl, 'ttl'), (win, 'win'), (tcpb, 'seq')):
+                v = np.where(cont, prev[col], 0).astype(prev[col].dtype)
+                take = seen & ~had
+                batch_first = np.zeros(G, dtype=prev[col].dtype)
+                batch_first[gd[firsts]] = q[src][idx[firsts]]
+                v[take] = batch_first[take]
+                st[col] = v
+            # intervalo entre pacotes do mesmo sentido (o primeiro do lote emenda no último da tabela)
+            last_prev = prev[f'{prefix}_last']
+            pt = np.empty(len(idx))
+            pt[1:] = t[idx[:-1]]
+            pt[firsts] = np.where(had[gd[firsts]], last_prev[gd[firsts]], np.nan)
+            ia = t[idx] - pt
+            ok = ~np.isnan(ia)
+            st[f'{prefix}_ia_sum'] = prev[f'{prefix}_ia_sum'] * cont + np.bincount(gd[ok], weights=ia[ok], minlength=G)
+            st[f'{prefix}_ia_sq'] = prev[f'{prefix}_ia_sq'] * cont + np.bincount(gd[ok], weights=ia[ok] ** 2, minlength=G)
+            batch_last = np.full(G, np.nan)
+            batch_last[gd[lasts]] = t[idx[lasts]]
+            st[f'{prefix}_last'] = np.where(seen, batch_last, np.where(had, last_prev, 0.0))
+            if prefix == 'd':
+                batch_first_t = np.zeros(G)
+                batch_first_t[gd[firsts]] = t[idx[firsts]]
+                st['d_first'] = np.where(had, prev['d_first'], np.where(seen, batch_first_t, 0.0))
+
+        # handshake TCP: SYN (iniciador) -> SYN-ACK (resposta) -> ACK (iniciador)
+        flags = q['flags']
+        tcp = q['proto'] == TCP
+        syn, ack = (flags & TCP_SYN) > 0, (flags & TCP_ACK) > 0
+        for col, mask in (('syn_t', tcp & fwd & syn & ~ack), ('synack_t', tcp & bwd & syn & ack)):
+            v = np.full(G, np.inf)
+            np.minimum.at(v, g[mask], t[mask])
+            st[col] = np.where(cont, np.minimum(prev[col], v), v)
+        v = np.full(G, np.inf)
+        mask = tcp & fwd & ack & ~syn & (t >= st['synack_t'][g])
+        np.minimum.at(v, g[mask], t[mask])
+        st['ack_t'] = np.where(cont, np.minimum(prev['ack_t'], v), v)
+        return st
+
+    def expire(self, now):
+        """Fecha os fluxos ociosos há mais de idle_timeout ou abertos há mais de active_timeout."""
+        live = np.flatnonzero(self._slot_of >= 0)
+        s = self.state[live]
+        done = (now - s['ltime'] > self.idle_timeout) | (now - s['stime'] >= self.active_timeout)
+        self._close(live[done])
+        return self
+
+    def flush(self):
+        """Fecha todos os fluxos abertos (fim da captura)."""
+        self._close(np.flatnonzero(self._slot_of >= 0))
+        return self
+
+    def snapshot(self):
+        """Estados dos fluxos ainda abertos (gravados no checkpoint da ingestão contínua)."""
+        return self.state[np.flatnonzero(self._slot_of >= 0)].copy()
+
+    def restore(self, states):
+        """Reabre os fluxos de um snapshot() (depois de um restart)."""
+        if len(states) > self.max_flows:  # snapshot de uma tabela maior: os mais antigos são fechados
+            states = np.sort(states, order='ltime')
+            self._closed.append(states[:-self.max_flows])
+            states = states[-self.max_flows:]
+        if len(states):
+            idx = self._allocate(len(states))
+            self.state[idx] = states
+            self._insert(states['key'].copy(), idx)
+        return self
+
+    def pop_closed(self):
+        """Estados fechados desde a última chamada (array FLOW_DTYPE)."""
+        closed = np.concatenate(self._closed) if self._closed else np.zeros(0, dtype=FLOW_DTYPE)
+        self._closed = []
+        return closed
+
+
+def _per_pkt(total, pkts):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(pkts > 0, total / np.maximum(pkts, 1), 0.0)
+
+
+def _window_counts(keys, window=CT_WINDOW):
+    """Quantos dos últimos `window` registros (incluindo o próprio) têm a mesma chave."""
+    keys = keys if isinstance(keys, list) else [keys]
+    n = len(keys[0])
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    codes = pd.MultiIndex.from_arrays(keys).factorize()[0].astype(np.int64)
+    pos = np.arange(n, dtype=np.int64)
+    composite = codes * (n + window) + pos  # ordenado por (chave, posição)
+    order = np.argsort(composite, kind='stable')
+    sorted_comp = composite[order]
+    start = np.searchsorted(sorted_comp, sorted_comp - (window - 1), side='left')
+    counts = np.empty(n, dtype=np.int64)
+    counts[order] = np.arange(n) - start + 1
+    return counts
+
+
+def flow_records(states):
+    """Estados FLOW_DTYPE fechados -> DataFrame no espaço de features do UNSW-NB15 (ordenado por stime)."""
+    s = np.sort(states, order='stime')
+    dur = s['ltime'] - s['stime']
+    spkts = s['spkts'].astype(np.float64)
+    dpkts = s['dpkts'].astype(np.float64)
+    sbytes = s['sbytes'].astype(np.float64)
+    dbytes = s['dbytes'].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(dur > 0, (spkts + dpkts - 1) / dur, 0.0)
+        sload = np.where(dur > 0, sbytes * 8 / dur, 0.0)
+        dload = np.where(dur > 0, dbytes * 8 / dur, 0.0)
+    s_ia_n = np.maximum(spkts - 1, 0)
+    d_ia_n = np.maximum(dpkts - 1, 0)
+    sinpkt = _per_pkt(s['s_ia_sum'], s_ia_n)
+    dinpkt = _per_pkt(s['d_ia_sum'], d_ia_n)
+    sjit = np.sqrt(np.maximum(_per_pkt(s['s_ia_sq'], s_ia_n) - sinpkt ** 2, 0.0))
+    djit = np.sqrt(np.maximum(_per_pkt(s['d_ia_sq'], d_ia_n) - dinpkt ** 2, 0.0))
+    with np.errstate(invalid='ignore'):
+        synack = np.where(np.isfinite(s['synack_t']) & np.isfinite(s['syn_t']), s['synack_t'] - s['syn_t'], 0.0)
+        ackdat = np.where(np.isfinite(s['ack_t']) & np.isfinite(s['synack_t']), s['ack_t'] - s['synack_t'], 0.0)
+    src_ip = decode_ips(s['src_hi'], s['src_lo'], s['family'])
+    dst_ip = decode_ips(s['dst_hi'], s['dst_lo'], s['family'])
+    df = pd.DataFrame({
+        'src_ip': src_ip, 'sport': s['sport'], 'dst_ip': dst_ip, 'dsport': s['dport'], 'proto_num': s['proto'],
+        'stime': s['stime'], 'ltime': s['ltime'], 'dur': dur,
+        'spkts': s['spkts'], 'dpkts': s['dpkts'], 'sbytes': s['sbytes'], 'dbytes': s['dbytes'], 'rate': rate,
+        'sttl': s['sttl'], 'dttl': s['dttl'], 'sload': sload, 'dload': dload,
+        'sinpkt': sinpkt * 1000, 'dinpkt': dinpkt * 1000, 'sjit': sjit * 1000, 'djit': djit * 1000,  # ms, como no UNSW
+        'swin': s['swin'], 'stcpb': s['stcpb'], 'dtcpb': s['dtcpb'], 'dwin': s['dwin'],
+        'tcprtt': synack + ackdat, 'synack': synack, 'ackdat': ackdat,
+        'smean': _per_pkt(sbytes, spkts).astype(np.int64), 'dmean': _per_pkt(dbytes, dpkts).astype(np.int64),
+        'is_sm_ips_ports': ((s['src_hi'] == s['dst_hi']) & (s['src_lo'] == s['dst_lo'])
+                            & (s['sport'] == s['dport'])).astype(np.uint8),
+    })
+    # contagens nas últimas 100 conexões (chaves inteiras, sem strings)
+    src, dst = (s['src_hi'], s['src_lo']), (s['dst_hi'], s['dst_lo'])
+    df['ct_src_ltm'] = _window_counts(list(src))
+    df['ct_dst_ltm'] = _window_counts(list(dst))
+    df['ct_src_dport_ltm'] = _window_counts([*src, s['dport']])
+    df['ct_dst_sport_ltm'] = _window_counts([*dst, s['sport']])
+    df['ct_dst_src_ltm'] = _window_counts([*src, *dst])
+    return df
@@ -0,0 +1,112 @@
+# src/ingest/nmap_ingest.py
+"""
+Ingestão em streaming do XML do Nmap (iterparse)
+- Cada <host> é lido, reduzido a (ip, portas) e liberado: memória constante mesmo para scans de /16
+- Grava direto a tabela de features de portas por host (scan_ports.csv):
+  src_ip, host_int, open_ports_count, port_21 ... port_3306 (0/1)
+- open_ports_count conta as <port> abertas (tcp/80 e udp/80 contam duas vezes), como o
+  port_bitmap do feature_engineer sobre o scan.csv porta-a-porta
+- Sem DOM completo e sem o CSV intermediário porta-a-porta (scan.csv)
+
+Uso: python src/ingest/nmap_ingest.py --xml Data/Raw/scan.xml --out Data/Raw/scan_ports.csv
+"""
+import csv
+import sys
+import argparse
+import ipaddress
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from instrumentation.metrics import REGISTRY, stage
+from instrumentation.profiling import Profiler, add_profile_args
+
+IMPORTANT_PORTS = ['21', '22', '23', '53', '80', '139', '445', '3306']
+
+
+def parse_ports(spec):
+    """'21,22,80,8000-8010' -> ['21', '22', '80', '8000', ..., '8010'] (ordem preservada, sem repetidos)."""
+    ports = []
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = (int(x) for x in part.split('-', 1))
+            ports.extend(str(p) for p in range(lo, hi + 1))
+        else:
+            ports.append(str(int(part)))
+    return list(dict.fromkeys(ports))
+
+
+def host_address(host):
+    """Endereço IP do <host> (o primeiro ipv4/ipv6; senão o primeiro <address>, como no nmap_to_csv)."""
+    first = None
+    for addr in host.iter('address'):
+        if addr.get('addrtype') in ('ipv4', 'ipv6'):
+            return addr.get('addr')
+        first = first or addr.get('addr')
+    return first
+
+
+def iter_nmap_hosts(xml_path):
+    """Gera (ip, [(porta, estado, serviço), ...]) por <host>, limpando a árvore a cada host."""
+    context = ET.iterparse(str(xml_path), events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or elem.tag not in ('host', 'hosthint'):
+            continue
+        if elem.tag == 'host':
+            ip = host_address(elem)
+            if ip is not None:
+                ports = []
+                for port in elem.iter('port'):
+                    state = port.find('state')
+                    service = port.find('service')
+                    ports.append((port.get('portid'),
+                                  state.get('state') if state is not None else 'unknown',
+                                  service.get('name', 'unknown') if service is not None else 'unknown'))
+                yield ip, ports
+        root.clear()  # descarta o host (e o que veio antes): a árvore nunca cresce
+
+
+def ipv4_int(ip):
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ''
+    return int(addr) if addr.version == 4 else ''
+
+
+def write_port_features(xml_path, out_path, ports=IMPORTANT_PORTS):
+    """Uma linha por host, escrita enquanto o XML é lido. Devolve o número de hosts."""
+    ports = [str(p) for p in ports]
+    n_hosts = 0
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['src_ip', 'host_int', 'open_ports_count'] + [f'port_{p}' for p in ports])
+        for ip, host_ports in iter_nmap_hosts(xml_path):
+            open_ports = [pid for pid, state, _ in host_ports if state == 'open']
+            open_set = set(open_ports)
+            writer.writerow([ip, ipv4_int(ip), len(open_ports)] + [int(p in open_set) for p in ports])
+            n_hosts += 1
+    return n_hosts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="XML do Nmap -> tabela de features de portas por host (streaming)")
+    parser.add_argument('--xml', default='Data/Raw/scan.xml')
+    parser.add_argument('--out', default='Data/Raw/scan_ports.csv')
+    parser.add_argument('--ports', default=','.join(IMPORTANT_PORTS),
+                        help='portas que viram colunas port_<n> (lista e/ou faixas, ex.: 21,22,80,1-1024)')
+    add_profile_args(parser)
+    args = parser.parse_args()
+    prof = Profiler.from_args(args, 'nmap_ingest', Path(args.out).parent / 'profiles')
+
+    with stage('nmap_parse') as st, prof.stage('nmap_parse'):
+        n = write_port_features(args.xml, args.out, parse_ports(args.ports))
+        st.add_items(n)
+    REGISTRY.write_snapshot('nmap_ingest')
+    prof.close()
+    print(f"[ok] Features de portas salvas em: {args.out} ({n} hosts)")
@@ -1,26 +1,125 @@
-import pandas as pd
-from scapy.all import rdpcap
+import sys
+import ipaddress
+from pathlib import Path
 import argparse
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from instrumentation.metrics import REGISTRY, stage
+from instrumentation.profiling import Profiler, add_profile_args
+from features.ip_codec import FAMILY_V4, encode_ips
+
 parser = argparse.ArgumentParser()
 parser.add_argument("--pcap", required=True)
 parser.add_argument("--out", required=True)
-parser.add_argument("--max", type=int, default=1000)
+parser.add_argument("--max", type=int, default=None,
+                    help="máximo de pacotes lidos (0 = todos; padrão: 1000 por pacote, todos com --flows)")
+parser.add_argument("--flows", action="store_true",
+                    help="gera registros de fluxo bidirecionais (features do UNSW-NB15) em vez de linhas por pacote")
+parser.add_argument("--idle_timeout", type=float, default=60.0, help="--flows: segundos sem pacotes que fecham um fluxo")
+parser.add_argument("--active_timeout", type=float, default=1800.0, help="--flows: duração máxima de um registro de fluxo")
+parser.add_argument("--max_flows", type=int, default=1_000_000, help="--flows: fluxos abertos ao mesmo tempo (memória limitada)")
+parser.add_argument("--batch_size", type=int, default=65536, help="--flows: pacotes por lote da tabela de fluxos")
+add_profile_args(parser)
 args = parser.parse_args()
+if args.max is None:
+    args.max = 0 if args.flows else 1000  # truncar a captura cortaria fluxos ao meio
+prof = Profiler.from_args(args, "pcap_ingest", Path(args.out).parent / "profiles")
+
+# imports pesados só depois do parse (--help é instantâneo); de scapy, só as camadas
+# necessárias para dissecar Ethernet/IP, em vez de scapy.all (todas as camadas)
+import numpy as np
+import pandas as pd
+from scapy.utils import rdpcap
+import scapy.layers.l2, scapy.layers.inet, scapy.layers.inet6  # noqa: F401 (registram as camadas)
+
+
+def ingest_flows():
+    """Pacotes lidos em streaming (PcapReader) -> tabela de fluxos em lotes -> CSV de fluxos."""
+    from scapy.utils import PcapReader
+    from scapy.layers.inet import IP, TCP, UDP
+    from scapy.layers.inet6 import IPv6
+    from ingest.flow_table import FlowTable, PACKET_FIELDS, packet_batch, flow_records
+
+    table = FlowTable(args.idle_timeout, args.active_timeout, args.max_flows)
+    cols = {k: [] for k in PACKET_FIELDS}
+    closed = []
+
+    def push():
+        if cols["ts"]:
+            table.add(packet_batch(cols))
+            closed.append(table.pop_closed())
+            for v in cols.values():
+                v.clear()
+
+    with stage("flow_table") as st, prof.stage("flow_table"), PcapReader(args.pcap) as reader:
+        for n, pkt in enumerate(reader):
+            if args.max and n >= args.max:
+                print(f"[warn] --max {args.max}: captura truncada; fluxos ainda abertos saem incompletos (--max 0 lê tudo)")
+                break
+            ip = pkt.getlayer(IP) or pkt.getlayer(IPv6)
+            if ip is None:
+                continue
+            l4 = ip.getlayer(TCP) or ip.getlayer(UDP)
+            src, dst = int(ipaddress.ip_address(ip.src)), int(ipaddress.ip_address(ip.dst))
+            tcp = l4 if isinstance(l4, TCP) else None
+            cols["ts"].append(float(pkt.time))
+            cols["src_hi"].append(src >> 64)
+            cols["src_lo"].append(src & 0xFFFFFFFFFFFFFFFF)
+            cols["dst_hi"].append(dst >> 64)
+            cols["dst_lo"].append(dst & 0xFFFFFFFFFFFFFFFF)
+            cols["family"].append(ip.version)
+            cols["sport"].append(l4.sport if l4 is not None else 0)
+            cols["dport"].append(l4.dport if l4 is not None else 0)
+            cols["proto"].append(ip.proto if ip.version == 4 else ip.nh)
+            cols["length"].append(len(pkt))
+            cols["ttl"].append(ip.ttl if ip.version == 4 else ip.hlim)
+            cols["flags"].append(int(tcp.flags) & 0xFF if tcp is not None else 0)
+            cols["win"].append(tcp.window if tcp is not None else 0)
+            cols["seq"].append(tcp.seq if tcp is not None else 0)
+            if len(cols["ts"]) >= args.batch_size:
+                push()
+        push()
+        closed.append(table.flush().pop_closed())
+        st.add_items(table.packets)
+
+    with stage("ingest_write_csv") as wt, prof.stage("write_csv"):
+        flows = flow_records(np.concatenate(closed))
+        wt.add_items(len(flows))
+        flows.to_csv(args.out, index=False)
+    REGISTRY.write_snapshot("pcap_ingest")
+    prof.close()
+    evicted = f", {table.evicted} fechados por limite de memória" if table.evicted else ""
+    print(f"CSV de fluxos gerado com sucesso! ({table.packets} pacotes -> {len(flows)} fluxos{evicted})")
+
+
+if args.flows:
+    ingest_flows()
+    sys.exit(0)
+
+with stage("scapy_parse") as st, prof.stage("scapy_parse"):
+    packets = rdpcap(args.pcap)
+    rows = []
+
+    for pkt in packets[:args.max or None]:
+        rows.append({
+            "time": pkt.time,
+            "src": pkt[0][1].src if hasattr(pkt[0][1], 'src') else "",
+            "dst": pkt[0][1].dst if hasattr(pkt[0][1], 'dst') else "",
+            "proto": pkt[0][1].name if hasattr(pkt[0][1], 'name') else "",
+            "length": len(pkt),
+            "info": str(pkt.summary())
+        })
+    st.add_items(len(rows))
 
-packets = rdpcap(args.pcap)
-rows = []
-
-for pkt in packets[:args.max]:
-    rows.append({
-        "time": pkt.time,
-        "src": pkt[0][1].src if hasattr(pkt[0][1], 'src') else "",
-        "dst": pkt[0][1].dst if hasattr(pkt[0][1], 'dst') else "",
-        "proto": pkt[0][1].name if hasattr(pkt[0][1], 'name') else "",
-        "length": len(pkt),
-        "info": str(pkt.summary())
-    })
-
-df = pd.DataFrame(rows)
-df.to_csv(args.out, index=False)
-print("CSV gerado com sucesso!")
+with stage("ingest_write_csv", items=len(rows)), prof.stage("write_csv"):
+    df = pd.DataFrame(rows, columns=["time", "src", "dst", "proto", "length", "info"])
+    # IPs convertidos uma vez aqui: src_int/dst_int (uint32, vazio se não for IPv4) viram as
+    # chaves inteiras de groupby/merge no feature_engineer
+    for col in ("src", "dst"):
+        _, lo, family = encode_ips(df[col])
+        df[f"{col}_int"] = pd.array(lo.astype("uint32"), dtype="UInt32")
+        df.loc[family != FAMILY_V4, f"{col}_int"] = pd.NA
+    df.to_csv(args.out, index=False)
+REGISTRY.write_snapshot("pcap_ingest")
+prof.close()
+print(f"CSV gerado com sucesso! ({len(rows)} pacotes, {len(rows) / st.seconds:.0f} pacotes/s)" if st.seconds else "CSV gerado com sucesso!")
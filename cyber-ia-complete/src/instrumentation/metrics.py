@@ -0,0 +1,268 @@
+# src/instrumentation/metrics.py
+"""
+Instrumentação leve (sem dependências) no formato de exposição do Prometheus
+- Counter / Gauge / Histogram com labels, thread-safe
+- stage(): context manager que mede a latência de um estágio e conta itens processados
+- Scripts (processos curtos) salvam um snapshot JSON em reports/metrics/<job>.json;
+  a API expõe as próprias métricas + esses snapshots em GET /metrics
+- merge_snapshots(): soma os snapshots de vários processos (workers da API) numa única série por labels
+"""
+import os
+import json
+import time
+import math
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# latências de ~1 ms a ~2 min
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# tamanhos de lote (linhas / pacotes)
+SIZE_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+METRICS_DIR_ENV = 'CYBERAI_METRICS_DIR'
+
+
+def _fmt(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    items = ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                     for k, v in labels.items())
+    return '{' + items + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labelnames, k)), 'value': v} for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labelnames, k)), 'counts': list(s[0]), 'sum': s[1], 'count': s[2]}
+                    for k, s in self._values.items()]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        out = {}
+        for name, m in list(self._metrics.items()):
+            fam = {'type': m.kind, 'help': m.help, 'samples': m.snapshot()}
+            if m.kind == 'histogram':
+                fam['buckets'] = list(m.buckets)
+            out[name] = fam
+        return out
+
+    def write_snapshot(self, job, metrics_dir=None):
+        """Salva o snapshot em <metrics_dir>/<job>.json (escrita atômica)."""
+        metrics_dir = Path(metrics_dir or os.environ.get(METRICS_DIR_ENV, Path('reports') / 'metrics'))
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        path = metrics_dir / f'{job}.json'
+        tmp = path.with_suffix('.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'job': job, 'written_at': time.time(), 'families': self.snapshot()}, f)
+        os.replace(tmp, path)
+        return path
+
+    def render(self, extra_snapshots=(), own=None):
+        """
+        Texto no formato Prometheus; snapshots externos ganham o label job=<script>.
+        own: famílias no lugar das deste processo (ex.: merge_snapshots dos workers da API).
+        """
+        families = {}
+        for name, fam in (own if own is not None else self.snapshot()).items():
+            families[name] = dict(fam, samples=list(fam['samples']))
+        for snap in extra_snapshots:
+            job = snap.get('job', 'unknown')
+            for name, fam in snap.get('families', {}).items():
+                target = families.setdefault(name, dict(fam, samples=[]))
+                if target['type'] != fam['type'] or target.get('buckets') != fam.get('buckets'):
+                    continue  # família incompatível: ignora em vez de gerar exposição inválida
+                target['samples'] = target['samples'] + [dict(s, labels={**s['labels'], 'job': job})
+                                                         for s in fam['samples']]
+        lines = []
+        for name in sorted(families):
+            fam = families[name]
+            lines.append(f"# HELP {name} {fam['help']}")
+            lines.append(f"# TYPE {name} {fam['type']}")
+            for s in fam['samples']:
+                if fam['type'] == 'histogram':
+                    for b, c in zip(fam['buckets'], s['counts']):
+                        lines.append(f"{name}_bucket{_label_str({**s['labels'], 'le': _fmt(float(b))})} {c}")
+                    lines.append(f"{name}_bucket{_label_str({**s['labels'], 'le': '+Inf'})} {s['count']}")
+                    lines.append(f"{name}_sum{_label_str(s['labels'])} {_fmt(float(s['sum']))}")
+                    lines.append(f"{name}_count{_label_str(s['labels'])} {s['count']}")
+                else:
+                    lines.append(f"{name}{_label_str(s['labels'])} {_fmt(float(s['value']))}")
+        return '\n'.join(lines) + '\n'
+
+
+def load_snapshots(metrics_dir):
+    snaps = []
+    metrics_dir = Path(metrics_dir)
+    if not metrics_dir.exists():
+        return snaps
+    for path in sorted(metrics_dir.glob('*.json')):
+        try:
+            with open(path, 'r') as f:
+                snaps.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # snapshot sendo reescrito / corrompido: ignora nesta coleta
+    return snaps
+
+
+def merge_snapshots(snaps):
+    """
+    Famílias somadas de vários snapshots (mesma família e labels): counters, histogramas e gauges
+    (ex.: requisições em andamento) viram o total dos processos.
+    """
+    families = {}
+    for snap in snaps:
+        for name, fam in snap.get('families', {}).items():
+            target = families.setdefault(name, dict(fam, samples={}))
+            if target['type'] != fam['type'] or target.get('buckets') != fam.get('buckets'):
+                continue
+            for s in fam['samples']:
+                key = tuple(sorted(s['labels'].items()))
+                cur = target['samples'].get(key)
+                if cur is None:
+                    target['samples'][key] = dict(s, counts=list(s['counts'])) if 'counts' in s else dict(s)
+                elif 'counts' in s:
+                    cur['counts'] = [a + b for a, b in zip(cur['counts'], s['counts'])]
+                    cur['sum'] += s['sum']
+                    cur['count'] += s['count']
+                else:
+                    cur['value'] += s['value']
+    return {name: dict(fam, samples=list(fam['samples'].values())) for name, fam in families.items()}
+
+
+# registro padrão do processo + métricas comuns do pipeline
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram('cyberai_stage_seconds', 'Duração de cada estágio do pipeline (s)', ('stage',))
+STAGE_ITEMS = REGISTRY.counter('cyberai_stage_items_total', 'Itens processados por estágio (pacotes, linhas, hosts)', ('stage',))
+STAGE_ERRORS = REGISTRY.counter('cyberai_stage_errors_total', 'Exceções por estágio', ('stage',))
+STAGE_THROUGHPUT = REGISTRY.gauge('cyberai_stage_items_per_second', 'Vazão da última execução do estágio', ('stage',))
+BATCH_SIZE = REGISTRY.histogram('cyberai_batch_rows', 'Tamanho dos lotes processados', ('stage',), buckets=SIZE_BUCKETS)
+CACHE_REQUESTS = REGISTRY.counter('cyberai_cache_requests_total', 'Consultas a caches (hit/miss)', ('cache', 'result'))
+
+
+class _StageTimer:
+    def __init__(self, name):
+        self.name = name
+        self.items = None
+        self.seconds = None
+
+    def add_items(self, n):
+        self.items = (self.items or 0) + int(n)
+
+
+@contextmanager
+def stage(name, items=None):
+    """
+    with stage('compute_isof_score', items=len(X)) as st: ...
+    Itens também podem ser informados dentro do bloco: st.add_items(n).
+    """
+    timer = _StageTimer(name)
+    if items is not None:
+        timer.add_items(items)
+    t0 = time.perf_counter()
+    try:
+        yield timer
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        timer.seconds = time.perf_counter() - t0
+        STAGE_SECONDS.observe(timer.seconds, stage=name)
+        if timer.items is not None:
+            STAGE_ITEMS.inc(timer.items, stage=name)
+            BATCH_SIZE.observe(timer.items, stage=name)
+            if timer.seconds > 0:
+                STAGE_THROUGHPUT.set(timer.items / timer.seconds, stage=name)
+
+
+def record_cache(cache, hit, n=1):
+    CACHE_REQUESTS.inc(n, cache=cache, result='hit' if hit else 'miss')
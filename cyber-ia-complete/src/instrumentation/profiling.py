@@ -0,0 +1,155 @@
+# src/instrumentation/profiling.py
+"""
+Profiling opcional (cProfile + tracemalloc) para os entry points do pipeline
+- add_profile_args(parser): adiciona --profile / --profile_dir aos CLIs
+- Profiler.stage(nome): perfil de CPU e top alocações de memória por estágio
+- Saída ao lado dos relatórios: <dir>/<job>-<timestamp>/<estágio>.prof (pstats) e .txt
+- Desligado (padrão), stage() não faz nada e não custa nada
+- RequestProfiler: toggle por requisição na API (?profile=1), só se habilitado no servidor
+"""
+import io
+import json
+import time
+import functools
+import threading
+import contextvars
+import cProfile
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_PROFILE_DIR = Path('reports') / 'profiles'
+
+
+def add_profile_args(parser, default_dir=None):
+    parser.add_argument('--profile', action='store_true',
+                        help='gera perfis de CPU (cProfile) e memória (tracemalloc) por estágio')
+    parser.add_argument('--profile_dir', default=default_dir,
+                        help=f'pasta dos perfis (padrão: {DEFAULT_PROFILE_DIR})')
+    return parser
+
+
+def _top_allocations(snapshot, baseline=None, limit=25):
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap>')]
+    snapshot = snapshot.filter_traces(filters)
+    if baseline is not None:
+        stats = snapshot.compare_to(baseline.filter_traces(filters), 'lineno')
+        return [{'where': str(s.traceback), 'size_kb': round(s.size / 1024, 1),
+                 'size_diff_kb': round(s.size_diff / 1024, 1), 'count': s.count} for s in stats[:limit]]
+    stats = snapshot.statistics('lineno')
+    return [{'where': str(s.traceback), 'size_kb': round(s.size / 1024, 1), 'count': s.count} for s in stats[:limit]]
+
+
+def write_profile(out_base, cpu_profile, allocations, peak_bytes, seconds, top=40):
+    """Grava <out_base>.prof (abrível com snakeviz/pstats) e <out_base>.txt (resumo legível)."""
+    out_base = Path(out_base)
+    out_base.parent.mkdir(parents=True, exist_ok=True)
+    cpu_profile.dump_stats(str(out_base) + '.prof')
+    buf = io.StringIO()
+    pstats.Stats(cpu_profile, stream=buf).sort_stats('cumulative').print_stats(top)
+    with open(str(out_base) + '.txt', 'w') as f:
+        f.write(f"tempo: {seconds:.4f}s  pico de memória (tracemalloc): {peak_bytes / 1024 / 1024:.1f} MB\n\n")
+        f.write("== Top alocações (tracemalloc) ==\n")
+        for a in allocations:
+            diff = f" ({a['size_diff_kb']:+.1f} KB)" if 'size_diff_kb' in a else ''
+            f.write(f"{a['size_kb']:>12.1f} KB{diff}  {a['count']:>8} blocos  {a['where']}\n")
+        f.write("\n== CPU (cProfile, cumulativo) ==\n")
+        f.write(buf.getvalue())
+    return str(out_base) + '.txt'
+
+
+class Profiler:
+    def __init__(self, enabled, job, out_dir=None, nframes=1):
+        self.enabled = bool(enabled)
+        self.job = job
+        self.nframes = nframes
+        self.summary = []
+        self.out_dir = None
+        if self.enabled:
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+            self.out_dir = Path(out_dir or DEFAULT_PROFILE_DIR) / f'{job}-{stamp}'
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start(nframes)
+
+    @classmethod
+    def from_args(cls, args, job, default_dir=None):
+        return cls(getattr(args, 'profile', False), job, getattr(args, 'profile_dir', None) or default_dir)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        baseline = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base_mem = tracemalloc.get_traced_memory()[0]
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            seconds = time.perf_counter() - t0
+            current, peak = tracemalloc.get_traced_memory()
+            allocations = _top_allocations(tracemalloc.take_snapshot(), baseline)
+            index = len(self.summary) + 1
+            txt = write_profile(self.out_dir / f'{index:02d}-{name}', prof, allocations, peak - base_mem, seconds)
+            self.summary.append({'stage': name, 'seconds': round(seconds, 4),
+                                 'peak_mb': round((peak - base_mem) / 1024 / 1024, 2),
+                                 'retained_mb': round((current - base_mem) / 1024 / 1024, 2),
+                                 'report': txt})
+
+    def close(self):
+        if not self.enabled:
+            return None
+        path = self.out_dir / 'summary.json'
+        with open(path, 'w') as f:
+            json.dump({'job': self.job, 'stages': self.summary}, f, indent=2)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        print(f"[ok] Perfis salvos em: {self.out_dir}")
+        for s in self.summary:
+            print(f"     {s['stage']:<28} {s['seconds']:>9.3f}s  pico={s['peak_mb']:.1f}MB")
+        return path
+
+
+class RequestProfiler:
+    """
+    Profiling por requisição para a API.
+    - begin(): chamado pelo middleware quando a requisição pede ?profile=1 e o servidor permite
+    - wrap(func): decorator dos endpoints; perfila o handler na thread em que ele roda
+    Um perfil por vez (tracemalloc é global ao processo); concorrentes rodam sem perfil.
+    """
+
+    def __init__(self, enabled, out_dir):
+        self.enabled = bool(enabled)
+        self.out_dir = Path(out_dir)
+        self._current = contextvars.ContextVar('profile_request', default=None)
+        self._lock = threading.Lock()
+
+    def begin(self):
+        holder = {}
+        self._current.set(holder)
+        return holder
+
+    def wrap(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            holder = self._current.get()
+            if holder is None or not self._lock.acquire(blocking=False):
+                return func(*args, **kwargs)
+            try:
+                prof = Profiler(True, f'api-{func.__name__}', self.out_dir)
+                with prof.stage(func.__name__):
+                    result = func(*args, **kwargs)
+                holder['report'] = prof.summary[-1]['report']
+                prof.close()
+                return result
+            finally:
+                self._lock.release()
+        return wrapper
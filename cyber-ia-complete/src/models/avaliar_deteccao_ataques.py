@@ -1,8 +1,21 @@
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
 import pandas as pd
-from sklearn.metrics import classification_report, confusion_matrix
 
-def main():
-    df = pd.read_csv("reports/infer.csv")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.threshold_sweep import (ThresholdSweep, curves_frame, DEFAULT_THRESHOLDS, DEFAULT_GRID_2D,
+                                    DEFAULT_WEIGHTS)
+
+
+def avaliar_decisao(path):
+    """Decisão fixa (final_anomaly) do infer.csv contra os rótulos."""
+    from sklearn.metrics import classification_report, confusion_matrix
+
+    df = pd.read_csv(path)
 
     y_true = df["label"]            # verdade do dataset
     y_pred = df["final_anomaly"]    # decisão da IA
@@ -19,5 +32,68 @@ def main():
     print("Ataques detectados pela IA:", (y_pred == 1).sum())
     print("Ataques corretamente detectados (TP):", ((y_true == 1) & (y_pred == 1)).sum())
 
+
+def iter_scores(path, args):
+    """(iso, ae, label) por bloco do CSV; iso orientado para 'maior = mais anômalo'."""
+    has_ae = args.ae_col in pd.read_csv(path, nrows=0).columns
+    usecols = [args.iso_col, args.label_col] + ([args.ae_col] if has_ae else [])
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=args.chunksize):
+        iso = chunk[args.iso_col].to_numpy(dtype=np.float64)
+        iso = -iso if args.iso_higher_is_normal else iso
+        ae = chunk[args.ae_col].to_numpy(dtype=np.float64) if has_ae else None
+        yield iso, ae, chunk[args.label_col].to_numpy()
+
+
+def varrer_thresholds(path, args):
+    """Curvas e melhores pontos de operação para milhares de thresholds, em dois passes por blocos."""
+    sweep = ThresholdSweep(args.thresholds, args.grid_2d, args.weights)
+    for iso, ae, _ in iter_scores(path, args):
+        sweep.observe(iso, ae)
+    sweep.fit_grid()
+    for iso, ae, y in iter_scores(path, args):
+        sweep.update(iso, ae, y)
+
+    curves = sweep.curves()
+    best = sweep.best(curves, metric=args.metric)
+    os.makedirs(args.outdir, exist_ok=True)
+    curves_frame(curves).to_csv(os.path.join(args.outdir, "threshold_sweep.csv"), index=False)
+    with open(os.path.join(args.outdir, "threshold_sweep.json"), "w") as f:
+        json.dump({"n_pos": sweep.n_pos, "n_neg": sweep.n_neg, "metric": args.metric, "best": best}, f, indent=2)
+
+    print(f"\n=== VARREDURA DE THRESHOLDS ({sweep.n_pos} ataques, {sweep.n_neg} normais) ===")
+    for rule, p in best.items():
+        cut = (f"iso>={p['threshold_iso']:.6g} / ae>={p['threshold_ae']:.6g}" if "threshold_iso" in p
+               else f">={p['threshold']:.6g}")
+        areas = f"  roc_auc={p['roc_auc']:.4f} ap={p['average_precision']:.4f}" if "roc_auc" in p else ""
+        print(f"{rule:<15} {cut:<36} precision={p['precision']:.4f} recall={p['recall']:.4f} "
+              f"f1={p['f1']:.4f} fpr={p['fpr']:.4f}{areas}")
+    print(f"\n[ok] Curvas salvas em: {os.path.join(args.outdir, 'threshold_sweep.csv')}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Avalia a detecção contra os rótulos do UNSW-NB15")
+    ap.add_argument("--csv", default="reports/infer.csv", help="CSV com rótulos e scores/decisão da inferência")
+    ap.add_argument("--sweep", action="store_true",
+                    help="varre thresholds e regras de combinação a partir dos scores brutos (iso_score/ae_mse)")
+    ap.add_argument("--label_col", default="label")
+    ap.add_argument("--iso_col", default="iso_score")
+    ap.add_argument("--ae_col", default="ae_mse")
+    ap.add_argument("--iso_higher_is_normal", action=argparse.BooleanOptionalAction, default=True,
+                    help="iso_score do decision_function (maior = mais normal) é negado; use --no-... para score já orientado")
+    ap.add_argument("--thresholds", type=int, default=DEFAULT_THRESHOLDS, help="thresholds por detector / regra ponderada")
+    ap.add_argument("--grid_2d", type=int, default=DEFAULT_GRID_2D, help="thresholds por eixo nas regras or/and")
+    ap.add_argument("--weights", type=float, nargs="+", default=list(DEFAULT_WEIGHTS),
+                    help="pesos do iso na regra ponderada (ae recebe 1 - peso)")
+    ap.add_argument("--metric", default="f1", choices=["f1", "precision", "recall"], help="critério do melhor ponto")
+    ap.add_argument("--chunksize", type=int, default=200000, help="linhas lidas por bloco")
+    ap.add_argument("--outdir", default="reports", help="pasta de threshold_sweep.csv/.json")
+    args = ap.parse_args()
+
+    if args.sweep:
+        varrer_thresholds(args.csv, args)
+    else:
+        avaliar_decisao(args.csv)
+
+
 if __name__ == "__main__":
     main()
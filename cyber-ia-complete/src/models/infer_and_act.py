@@ -3,12 +3,19 @@
 Inferência + relatório + (opcional) ação (block)
 - Carrega: models/isof.joblib  (dict {'model': clf, 'threshold': thresh})
          models/auto_model/ (Keras saved model + report.json with threshold)
+         models/preprocessor.json (colunas + escala do treino)
+         ou a versão ativa de um registro (--registry models/registry)
+         ou o Autoencoder quantizado int8/float16 (--auto_quantized, sem TensorFlow)
 - Lê features CSV (por src_ip)
-- Gera reports/infer.json e reports/infer.csv
+- Gera reports/infer.json, reports/infer.csv e a tabela colunar lida pela API, publicada por geração
+  (reports/infer.generations/g<n>.npy + reports/infer.generation)
+- Acrescenta os scores da execução ao histórico por host (reports/history, append-only)
+- Agrupa os hosts sinalizados em incidentes e emite só os novos/escalados (reports/alerts/incidents.json)
 - Uso seguro: por padrão roda em --dry (não realiza bloqueios)
 """
 import os
 import json
+import time
 import argparse
 from pathlib import Path
 import sys
@@ -18,41 +25,186 @@ import subprocess
 import numpy as np
 import pandas as pd
 import joblib
-import tensorflow as tf
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # permite importar os pacotes de src/
+from models.quantile_sketch import TDigest, sketch_from_scores
+from models.registry import ModelRegistry
+from features.preprocessor import FeaturePreprocessor
+from instrumentation.metrics import REGISTRY, stage
+from instrumentation.profiling import Profiler, add_profile_args
+from reporting.results_table import ResultsTable, BLOCK_CMD
+from reporting.score_history import ScoreHistory, DEFAULT_SEGMENT_SECONDS
+from reporting.report_segments import SegmentWriter
+from reporting.report_generations import publish_with_json
+from reporting.alert_engine import AlertEngine, DEFAULT_WINDOW as DEFAULT_ALERT_WINDOW
+from features.ip_codec import encode_ips, FAMILY_V4
+from models.score_cache import ScoreCache, DEFAULT_MAX_ENTRIES, fingerprint, row_digests
+from instrumentation.metrics import record_cache
+
+DEFAULT_QUANTILE = 95  # artifacts saved before threshold_q was recorded
 
 def load_isof(path):
     obj = joblib.load(path)
     clf = obj.get('model', obj)  # backwards compat
     thresh = obj.get('threshold', None) if isinstance(obj, dict) else None
-    return clf, thresh
+    sketch = obj.get('score_sketch') if isinstance(obj, dict) else None
+    sketch = TDigest.from_dict(sketch) if sketch else None
+    q = obj.get('threshold_q') if isinstance(obj, dict) else None  # percentile the threshold was set at
+    return clf, thresh, sketch, q
 
 def load_auto(path):
     # path is directory containing saved_model + report.json
-    model = tf.keras.models.load_model(path)
+    import tensorflow as tf  # lazy: IsolationForest-only runs never pay the TensorFlow import
+    # (train_detection saves the Keras model next to it as <path>.keras)
+    keras_path = str(path) + '.keras'
+    model = tf.keras.models.load_model(keras_path if Path(keras_path).exists() else path)
     report_path = Path(path) / 'report.json'
     thresh = None
+    sketch = None
+    q = None
     if report_path.exists():
         with open(report_path, 'r') as f:
             report = json.load(f)
             thresh = report.get('threshold')
-    return model, thresh
+            q = report.get('threshold_q')
+            if report.get('score_sketch'):
+                sketch = TDigest.from_dict(report['score_sketch'])
+    return model, thresh, sketch, q
+
+def load_auto_quantized(path, auto_dir=None):
+    # quantized export (quantized_autoencoder.py): NumPy only; threshold/sketch from <auto>/report.json
+    # when present (recalibrations land there), otherwise the threshold recorded at export time
+    from models.quantized_autoencoder import QuantizedAutoencoder
+    model = QuantizedAutoencoder.load(path)
+    thresh, sketch, q = model.threshold, None, model.meta.get('threshold_q')
+    report_path = Path(auto_dir) / 'report.json' if auto_dir else None
+    if report_path is not None and report_path.exists():
+        with open(report_path, 'r') as f:
+            report = json.load(f)
+        thresh = report.get('threshold', thresh)
+        q = report.get('threshold_q', q)
+        if report.get('score_sketch'):
+            sketch = TDigest.from_dict(report['score_sketch'])
+    return model, thresh, sketch, q
+
+def load_from_registry(root, version=None):
+    """Loads forest/autoencoder/thresholds/sketches from a registry version (active by default)."""
+    bundle = ModelRegistry(root).load(version)
+    forest_obj = bundle.forest_artifact
+    isof_sketch = forest_obj.get('score_sketch') if isinstance(forest_obj, dict) else None
+    isof_q = forest_obj.get('threshold_q') if isinstance(forest_obj, dict) else None
+    auto_sketch = auto_q = None
+    if bundle.has('autoencoder_report'):
+        auto_q = bundle.autoencoder_report.get('threshold_q')
+        if bundle.autoencoder_report.get('score_sketch'):
+            auto_sketch = TDigest.from_dict(bundle.autoencoder_report['score_sketch'])
+    return {
+        'version': bundle.version,
+        'isof': (bundle.forest, bundle.thresholds.get('isof'), TDigest.from_dict(isof_sketch) if isof_sketch else None, isof_q),
+        'auto': (bundle.autoencoder, bundle.thresholds.get('auto'), auto_sketch, auto_q) if bundle.has('autoencoder') else (None, None, None, None),
+        'prep': bundle.preprocessor if bundle.has('preprocessor') else None,
+    }
+
+def recalibrate_threshold(sketch, scores, q):
+    """Mescla os scores ao vivo no sketch persistido e devolve o novo threshold."""
+    sketch = sketch if sketch is not None else TDigest()
+    sketch.merge(sketch_from_scores(scores))
+    return sketch.percentile(q), sketch
+
+def save_isof_sketch(path, sketch, thresh, q):
+    obj = joblib.load(path)
+    if not isinstance(obj, dict):
+        obj = {'model': obj}
+    obj['threshold'] = thresh
+    obj['threshold_q'] = q
+    obj['score_sketch'] = sketch.to_dict()
+    joblib.dump(obj, path)
+
+def save_auto_sketch(path, sketch, thresh, q):
+    report_path = Path(path) / 'report.json'
+    report = {}
+    if report_path.exists():
+        with open(report_path, 'r') as f:
+            report = json.load(f)
+    report['threshold'] = thresh
+    report['threshold_q'] = q
+    report['score_sketch'] = sketch.to_dict()
+    report_path.parent.mkdir(parents=True, exist_ok=True)  # --auto_quantized without the Keras model directory
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
 
 def compute_isof_score(clf, X):
     # scikit-learn IsolationForest: score_samples -> higher = more normal, but we use -score so larger = more anomalous
-    raw = clf.score_samples(X)
+    with stage('compute_isof_score', items=len(X)):
+        raw = clf.score_samples(X)
     scores = -raw
     return scores
 
 def compute_auto_mse(model, X):
-    pred = model.predict(X, verbose=0)
-    mse = np.mean((X - pred)**2, axis=1)
+    with stage('compute_auto_mse', items=len(X)):
+        pred = model.predict(X, verbose=0)
+        mse = np.mean((X - pred)**2, axis=1)
     return mse, pred
 
-def explain_auto_errors(X_row, recon_row, columns, topk=3):
-    # absolute reconstruction error per feature, return topk features and errors
-    errors = np.abs(X_row - recon_row)
-    idx = np.argsort(-errors)[:topk]
-    return [(columns[i], float(errors[i])) for i in idx]
+def explain_auto_errors_batch(X, recon, topk=3):
+    # top-k features by absolute reconstruction error, for every row: (int16 column indices, float32 errors)
+    # padded with -1 / 0 when there are fewer than topk features; column names live in the report's explain_columns
+    # argpartition selects the k largest errors in O(n_features); only those k are sorted
+    if X.shape[1] > np.iinfo(np.int16).max:
+        raise ValueError(f"too many feature columns for int16 explanation indices: {X.shape[1]}")
+    errors = np.abs(X - recon)
+    k = min(topk, errors.shape[1])
+    idx = np.argpartition(-errors, k - 1, axis=1)[:, :k] if k < errors.shape[1] else np.tile(np.arange(k), (len(errors), 1))
+    top = np.take_along_axis(errors, idx, axis=1)
+    order = np.argsort(-top, axis=1, kind='stable')
+    idx = np.take_along_axis(idx, order, axis=1)
+    top_idx = np.full((len(errors), topk), -1, dtype=np.int16)
+    top_err = np.zeros((len(errors), topk), dtype=np.float32)
+    top_idx[:, :k] = idx
+    top_err[:, :k] = np.take_along_axis(top, order, axis=1)
+    return top_idx, top_err
+
+def compute_auto_explained(auto_model, X, topk, batch_size=65536):
+    """
+    MSE do autoencoder + explicação top-k das mesmas linhas: (mse, top_idx, top_err).
+    Em lotes: a reconstrução de cada lote é descartada logo após o top-k (nunca há N x F reconstruído).
+    """
+    n = len(X)
+    mse = np.empty(n)
+    top_idx = np.full((n, topk), -1, dtype=np.int16) if topk > 0 else None
+    top_err = np.zeros((n, topk), dtype=np.float32) if topk > 0 else None
+    with stage('compute_auto_mse', items=n):
+        for start in range(0, n, batch_size):
+            Xb = X[start:start + batch_size]
+            recon = auto_model.predict(Xb, verbose=0)
+            mse[start:start + len(Xb)] = np.mean((Xb - recon)**2, axis=1)
+            if topk > 0:
+                top_idx[start:start + len(Xb)], top_err[start:start + len(Xb)] = explain_auto_errors_batch(Xb, recon, topk)
+    return mse, top_idx, top_err
+
+def triage_mask(isof_scores, isof_thresh, args):
+    """
+    Linhas que vão para o autoencoder.
+    - decision 'or': todas
+    - decision 'cascade': score do forest >= --triage_score, ou (padrão) dentro da faixa de incerteza
+      isof_thresh - --triage_band; tudo que o forest já sinaliza está sempre incluído
+    """
+    if args.decision != 'cascade':
+        return np.ones(len(isof_scores), dtype=bool)
+    cut = args.triage_score if args.triage_score is not None else isof_thresh - args.triage_band
+    return isof_scores >= min(cut, isof_thresh)
+
+def model_cache_key(isof_clf, auto_model, prep, registry_version=None):
+    """Namespace do cache de scores: versão do registro (imutável) ou hash do conteúdo dos modelos."""
+    if registry_version is not None:
+        return f'registry:{registry_version}'
+    parts = [type(isof_clf).__name__, getattr(isof_clf, 'n_features_in_', '')]
+    for est, feats in zip(getattr(isof_clf, 'estimators_', []), getattr(isof_clf, 'estimators_features_', [])):
+        parts += [est.tree_.feature, est.tree_.threshold, np.asarray(feats)]
+    if auto_model is not None:
+        parts += list(auto_model.get_weights())
+    parts.append(json.dumps(prep.to_dict(), sort_keys=True) if prep is not None else 'no-prep')
+    return 'content:' + fingerprint(*parts)
 
 def attempt_block(ip, dry=True):
     """
@@ -62,7 +214,7 @@ def attempt_block(ip, dry=True):
     - if not dry and linux: run iptables command (requires sudo)
     - otherwise: print warning and return
     """
-    cmd = f"iptables -A INPUT -s {ip} -j DROP"
+    cmd = BLOCK_CMD.format(ip=ip)
     if dry:
         return {"cmd": cmd, "executed": False, "note": "dry-run"}
     # only attempt to run on Linux
@@ -81,12 +233,43 @@ def main():
     ap.add_argument('--features', required=True, help='CSV de features (por src_ip)')
     ap.add_argument('--isof', default='models/isof.joblib', help='caminho para IsolationForest (joblib)')
     ap.add_argument('--auto', default='models/auto_model', help='diretório do Autoencoder (saved model)')
+    ap.add_argument('--auto_quantized', default=None, help='pasta da exportação int8/float16 do autoencoder (substitui o modelo Keras)')
+    ap.add_argument('--prep', default='models/preprocessor.json', help='artefato de pré-processamento gerado no treino')
     ap.add_argument('--out', default='reports/infer.json', help='arquivo JSON de saída')
     ap.add_argument('--outcsv', default='reports/infer.csv', help='arquivo CSV de saída')
+    ap.add_argument('--out_table', default=None, help='base da tabela colunar (<base>.generations/ + contador <base>.generation); padrão: --out sem extensão')
     ap.add_argument('--dry', action='store_true', default=True, help='modo dry-run (padrão)')
     ap.add_argument('--block', action='store_true', help='executa bloqueios (APENAS EM LAB, exige --dry false)')
     ap.add_argument('--topk', type=int, default=3, help='top-K features explicativas para autoencoder')
+    ap.add_argument('--registry', default=None, help='pasta do registro de modelos; usa a versão ativa em vez de --isof/--auto')
+    ap.add_argument('--model_version', default=None, help='versão específica do registro (padrão: ativa)')
+    ap.add_argument('--recalibrate', action='store_true', help='mescla os scores desta execução nos sketches salvos e recalcula os thresholds')
+    ap.add_argument('--batch_size', type=int, default=65536, help='linhas por lote do autoencoder (reconstrução + top-k)')
+    ap.add_argument('--decision', choices=['or', 'cascade'], default='or',
+                    help="'or': os dois detectores em todas as linhas; 'cascade': autoencoder só na triagem do forest")
+    ap.add_argument('--triage_band', type=float, default=0.05,
+                    help='cascade: faixa abaixo do threshold do forest que ainda vai para o autoencoder')
+    ap.add_argument('--triage_score', type=float, default=None,
+                    help='cascade: score mínimo do forest para ir ao autoencoder (substitui --triage_band)')
+    ap.add_argument('--score_cache', default=None, help='pasta do cache de scores por conteúdo (linhas inalteradas não são re-pontuadas)')
+    ap.add_argument('--score_cache_size', type=int, default=DEFAULT_MAX_ENTRIES, help='máximo de entradas (LRU) por versão de modelo')
+    ap.add_argument('--quantile', type=float, default=None,
+                    help=f'percentil usado na recalibração / fallback de threshold (padrão: threshold_q salvo com cada modelo, senão {DEFAULT_QUANTILE})')
+    ap.add_argument('--segment_rows', type=int, default=50000, help='linhas por segmento do relatório (publicado assim que o lote é pontuado)')
+    ap.add_argument('--segments_dir', default=None, help='pasta dos segmentos do relatório (padrão: <tabela>.segments)')
+    ap.add_argument('--history', default=None, help='pasta do histórico de scores por host (padrão: <pasta de --out>/history)')
+    ap.add_argument('--no_history', action='store_true', help='não acrescenta esta execução ao histórico')
+    ap.add_argument('--history_segment_seconds', type=int, default=DEFAULT_SEGMENT_SECONDS, help='duração de cada segmento do histórico (s)')
+    ap.add_argument('--history_retention_days', type=float, default=0, help='remove segmentos mais antigos que isso (0 = guarda tudo)')
+    ap.add_argument('--run_ts', type=int, default=None, help='timestamp (epoch s) desta execução no histórico e nos alertas; padrão: agora')
+    ap.add_argument('--alerts_dir', default=None, help='estado e incidentes do motor de alertas (padrão: <pasta de --out>/alerts)')
+    ap.add_argument('--no_alerts', action='store_true', help='não agrupa/suprime alertas nesta execução')
+    ap.add_argument('--alert_window', type=int, default=DEFAULT_ALERT_WINDOW, help='incidente sem reaparecer por mais que isso (s) volta como novo')
+    ap.add_argument('--alert_renotify', type=int, default=0, help='reemite incidentes ativos a cada N s (0 = só novos/escalados)')
+    ap.add_argument('--alert_escalate_ratio', type=float, default=2.0, help='escala quando o nº de hosts chega a este múltiplo do último envio')
+    add_profile_args(ap)
     args = ap.parse_args()
+    prof = Profiler.from_args(args, 'infer_and_act', Path(args.out).parent / 'profiles')
 
     # Safety checks
     if args.block and args.dry:
@@ -99,126 +282,251 @@ def main():
     if not Path(args.features).exists():
         print("[error] features csv not found:", args.features)
         sys.exit(1)
-    df = pd.read_csv(args.features)
+    with prof.stage('load_features'):
+        df = pd.read_csv(args.features)
     if 'src_ip' not in df.columns and 'src' in df.columns:
         df = df.rename(columns={'src':'src_ip'})
     if 'src_ip' not in df.columns:
         print("[error] CSV must contain a column 'src_ip' (or 'src'). Columns:", df.columns.tolist())
         sys.exit(1)
 
-    number_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    if len(number_cols) == 0:
-        print("[error] no numeric features found in CSV. Need numeric columns for model input.")
-        sys.exit(1)
-    X = df[number_cols].fillna(0).values.astype('float32')
-
     # Load models
-    if not Path(args.isof).exists():
-        print("[error] IsolationForest model not found:", args.isof)
-        sys.exit(1)
-    isof_clf, isof_thresh = load_isof(args.isof)
-    print(f"[ok] IsolationForest loaded. threshold={isof_thresh}")
+    with prof.stage('load_models'):
+        if args.registry:
+            loaded = load_from_registry(args.registry, args.model_version)
+            isof_clf, isof_thresh, isof_sketch, isof_q = loaded['isof']
+            auto_model, auto_thresh, auto_sketch, auto_q = loaded['auto']
+            prep = loaded['prep']
+            registry_version = loaded['version']
+            print(f"[ok] Registry version {loaded['version']} loaded. isof threshold={isof_thresh} auto threshold={auto_thresh}")
+        else:
+            if not Path(args.isof).exists():
+                print("[error] IsolationForest model not found:", args.isof)
+                sys.exit(1)
+            isof_clf, isof_thresh, isof_sketch, isof_q = load_isof(args.isof)
+            print(f"[ok] IsolationForest loaded. threshold={isof_thresh}")
 
-    if not Path(args.auto).exists():
-        print("[warn] Autoencoder model directory not found:", args.auto)
-        auto_model = None
-        auto_thresh = None
-    else:
-        auto_model, auto_thresh = load_auto(args.auto)
-        print(f"[ok] Autoencoder loaded. threshold={auto_thresh}")
+            if args.auto_quantized:
+                auto_model, auto_thresh, auto_sketch, auto_q = load_auto_quantized(args.auto_quantized, args.auto)
+                print(f"[ok] Autoencoder ({auto_model.mode}) loaded. threshold={auto_thresh}")
+            elif not Path(args.auto).exists():
+                print("[warn] Autoencoder model directory not found:", args.auto)
+                auto_model = None
+                auto_thresh = None
+                auto_sketch = None
+                auto_q = None
+            else:
+                auto_model, auto_thresh, auto_sketch, auto_q = load_auto(args.auto)
+                print(f"[ok] Autoencoder loaded. threshold={auto_thresh}")
+            prep = FeaturePreprocessor.load(args.prep) if Path(args.prep).exists() else None
+            registry_version = None
 
-    # compute scores
-    isof_scores = compute_isof_score(isof_clf, X)
-    if auto_model is not None:
-        auto_mse, auto_recon = compute_auto_mse(auto_model, X)
-    else:
-        auto_mse = np.zeros(len(isof_scores))
-        auto_recon = np.zeros_like(X)
-
-    # Determine flags (if threshold missing, use percentiles as fallback)
-    if isof_thresh is None:
-        isof_thresh = float(np.percentile(isof_scores, 95))
-        print(f"[info] isof threshold not found; using 95th percentile -> {isof_thresh:.6f}")
-    if auto_thresh is None:
-        auto_thresh = float(np.percentile(auto_mse, 95)) if len(auto_mse)>0 else 0.0
-        print(f"[info] auto threshold not found; using 95th percentile -> {auto_thresh:.6f}")
-
-    isof_flag = (isof_scores >= isof_thresh).astype(int)
-    auto_flag = (auto_mse >= auto_thresh).astype(int)
-
-    # decision rule: flagged if either model marks it
-    combined_flag = ((isof_flag==1) | (auto_flag==1)).astype(int)
-
-    results = []
-    for i, row in df.iterrows():
-        src = row['src_ip']
-        rec = {
-            'src_ip': src,
-            'isof_score': float(isof_scores[i]),
-            'isof_flag': int(isof_flag[i]),
-            'auto_mse': float(auto_mse[i]) if len(auto_mse)>0 else None,
-            'auto_flag': int(auto_flag[i]) if len(auto_mse)>0 else None,
-            'combined_flag': int(combined_flag[i])
-        }
+    # Recalibration / fallback percentile: --quantile, else the one each threshold was trained at
+    # (train_detection uses the 90th; recalibrating at another percentile would silently move the threshold)
+    isof_q = args.quantile if args.quantile is not None else (isof_q or DEFAULT_QUANTILE)
+    auto_q = args.quantile if args.quantile is not None else (auto_q or DEFAULT_QUANTILE)
 
-        # explanation: top-k features by reconstruction error if auto model present
-        if auto_model is not None:
-            expl = explain_auto_errors(X[i], auto_recon[i], number_cols, topk=args.topk)
-            rec['auto_top_features'] = expl
+    # Model input: the training-time preprocessing artifact (no refit, no dtype discovery)
+    with prof.stage('preprocess'):
+        if prep is not None:
+            number_cols = prep.columns
+            X = prep.transform(df)
+        else:
+            print("[warn] preprocessing artifact not found; using unscaled numeric columns:", args.prep)
+            number_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+            if len(number_cols) == 0:
+                print("[error] no numeric features found in CSV. Need numeric columns for model input.")
+                sys.exit(1)
+            X = df[number_cols].fillna(0).values.astype('float32')
+
+    # compute scores (rows already in the score cache skip both detectors)
+    topk = args.topk if auto_model is not None else 0
+    n = len(X)
+    with prof.stage('score_cache'):
+        hit = np.zeros(n, dtype=bool)
+        if args.score_cache:
+            cache_key = model_cache_key(isof_clf, auto_model, prep, registry_version)
+            cache = ScoreCache(args.score_cache, cache_key, topk=topk, max_entries=args.score_cache_size)
+            digest_hi, digest_lo = row_digests(X)
+            hit, cached = cache.lookup(digest_hi, digest_lo)
+            record_cache('score_cache', True, int(hit.sum()))
+            record_cache('score_cache', False, int(n - hit.sum()))
+        miss = np.flatnonzero(~hit)
+        isof_scores = np.empty(n)
+        auto_mse = np.full(n, np.nan)  # NaN = autoencoder não rodou nesta linha
+        top_idx = np.full((n, topk), -1, dtype=np.int16) if topk else None
+        top_err = np.zeros((n, topk), dtype=np.float32) if topk else None
+        if hit.any():
+            isof_scores[hit], auto_mse[hit] = cached['isof_score'], cached['auto_mse']
+            if topk:
+                top_idx[hit], top_err[hit] = cached['top_idx'], cached['top_err']
+    isof_flag = np.zeros(n, dtype=int)
+    auto_flag = np.full(n, -1)  # -1 where the autoencoder did not score the row
+    combined_flag = np.zeros(n, dtype=int)
+    scored_by_auto = []  # rows the autoencoder actually ran on (cache misses)
+    triaged = [0]
+
+    def score_forest(rows):
+        todo = rows[~hit[rows]]
+        if len(todo):
+            with prof.stage('score_forest'):
+                isof_scores[todo] = compute_isof_score(isof_clf, X if len(todo) == n else X[todo])
 
-        # action: prepare block command (dry-run) or attempt block
-        if rec['combined_flag'] == 1:
+    def score_autoencoder(rows):
+        # Autoencoder: every row (decision 'or') or only the forest's triage set (decision 'cascade')
+        if auto_model is None:
+            return
+        triage = triage_mask(isof_scores[rows], isof_thresh, args)
+        ae_rows, skipped = rows[triage], rows[~triage]
+        # cache hits carry the autoencoder output of an earlier run (other mode / threshold): outside
+        # this run's triage it is dropped, so cascade flags never depend on the state of the cache
+        auto_mse[skipped] = np.nan
+        if topk:
+            top_idx[skipped], top_err[skipped] = -1, 0
+        need = ae_rows[np.isnan(auto_mse[ae_rows])]
+        triaged[0] += len(ae_rows)
+        if len(need):
+            with prof.stage('score_autoencoder'):
+                mse, idx, err = compute_auto_explained(auto_model, X if len(need) == n else X[need], topk, args.batch_size)
+            auto_mse[need] = mse
+            if topk:
+                top_idx[need], top_err[need] = idx, err
+            scored_by_auto.append(need)
+
+    # Report segments: with fixed thresholds each batch is flagged and published as soon as it is scored;
+    # recalibration / missing thresholds need every score first, then the segments are written at the end
+    streaming = not args.recalibrate and isof_thresh is not None and (auto_model is None or auto_thresh is not None)
+    src_ips = df['src_ip'].astype(str).to_numpy()
+    ipv4_only = bool(np.all(encode_ips(src_ips)[2] == FAMILY_V4))
+    table_base = args.out_table or Path(args.out).with_suffix('')
+    writer = SegmentWriter(args.segments_dir or f'{table_base}.segments', number_cols, has_auto=auto_model is not None)
+    csv_header = [True]
+
+    def summarize(upto):
+        ae_scored = ~np.isnan(auto_mse[:upto])
+        return {
+            'n_hosts': int(upto),
+            'n_flagged': int(np.sum(combined_flag[:upto])),
+            'isof_threshold': float(isof_thresh),
+            'auto_threshold': float(auto_thresh) if auto_thresh is not None else None,
+            'decision': args.decision,
+            'auto_scored': int(ae_scored.sum()),
+            'model_version': registry_version,  # versão do registro (GET /model compara com a ativa)
+        }
+
+    def publish(lo, hi):
+        # flags, actions and one report segment (+ the matching CSV rows) for rows [lo, hi)
+        rows = slice(lo, hi)
+        isof_flag[rows] = isof_scores[rows] >= isof_thresh
+        scored = ~np.isnan(auto_mse[rows])
+        if auto_thresh is not None:
+            auto_flag[lo:hi][scored] = (auto_mse[lo:hi][scored] >= auto_thresh).astype(int)
+        # decision rule: flagged if either model marks it (in cascade, the autoencoder only sees triaged rows)
+        combined_flag[rows] = (isof_flag[rows] == 1) | (auto_flag[rows] == 1)
+        with prof.stage('build_results'):
+            part = ResultsTable.build(src_ips[rows], isof_scores[rows], isof_flag[rows], auto_mse[rows], auto_flag[rows],
+                                      combined_flag[rows], top_idx[rows] if topk else None, top_err[rows] if topk else None,
+                                      number_cols, has_auto=auto_model is not None, ipv4_only=ipv4_only)
+            # action: prepare block command (dry-run) or attempt block, only for flagged hosts
+            flagged = part.flagged()
             if args.block and not args.dry:
                 # attempt block for real (only in linux)
-                action_res = attempt_block(src, dry=False)
+                for i in flagged:
+                    part.set_action(i, attempt_block(src_ips[lo + i], dry=False))
             else:
-                action_res = attempt_block(src, dry=True)
-            rec['action'] = action_res
-        else:
-            rec['action'] = {'cmd': None, 'executed': False, 'note': 'no action'}
+                part.set_action(flagged)
+        with stage('report_serialization', items=len(part)), prof.stage('report_serialization'):
+            writer.append(part, dict(summarize(hi), n_hosts_total=n))
+            part.to_frame().to_csv(args.outcsv, mode='w' if csv_header[0] else 'a', header=csv_header[0], index=False)
+            csv_header[0] = False
 
-        results.append(rec)
+    segment_rows = max(1, args.segment_rows)
+    if streaming:
+        for lo in range(0, max(n, 1), segment_rows):
+            batch = np.arange(lo, min(n, lo + segment_rows))
+            score_forest(batch)
+            score_autoencoder(batch)
+            if len(batch):
+                publish(lo, lo + len(batch))
+    else:
+        score_forest(np.arange(n))
 
-    # Save JSON and CSV
-    out = {
-        'summary': {
-            'n_hosts': int(len(df)),
-            'n_flagged': int(np.sum(combined_flag)),
-            'isof_threshold': float(isof_thresh),
-            'auto_threshold': float(auto_thresh)
-        },
-        'results': results
-    }
-    with open(args.out, 'w') as f:
-        json.dump(out, f, indent=2)
-    # CSV (flatten)
-    rows_for_csv = []
-    for r in results:
-        flat = {
-            'src_ip': r['src_ip'],
-            'isof_score': r['isof_score'],
-            'isof_flag': r['isof_flag'],
-            'auto_mse': r['auto_mse'],
-            'auto_flag': r['auto_flag'],
-            'combined_flag': r['combined_flag'],
-        }
-        # keep action fields
-        if r.get('action'):
-            flat['action_cmd'] = r['action'].get('cmd')
-            flat['action_executed'] = r['action'].get('executed', False)
-            flat['action_note'] = r['action'].get('note', '')
-        else:
-            flat['action_cmd'] = None
-            flat['action_executed'] = False
-            flat['action_note'] = ''
-        rows_for_csv.append(flat)
-    pd.DataFrame(rows_for_csv).to_csv(args.outcsv, index=False)
+        # Recalibrate thresholds on live scores (sketches are merged and persisted with the models)
+        # (registry versions are immutable: recalibrated thresholds apply to this run only)
+        if args.recalibrate:
+            isof_thresh, isof_sketch = recalibrate_threshold(isof_sketch, isof_scores, isof_q)
+            if not args.registry:
+                save_isof_sketch(args.isof, isof_sketch, isof_thresh, isof_q)
+            print(f"[ok] isof threshold recalibrated ({isof_sketch.count:.0f} scores) -> {isof_thresh:.6f}")
+        if isof_thresh is None:
+            isof_thresh = sketch_from_scores(isof_scores).percentile(isof_q)
+            print(f"[info] isof threshold not found; using {isof_q:g}th percentile -> {isof_thresh:.6f}")
+
+        score_autoencoder(np.arange(n))
+        ae_scored = ~np.isnan(auto_mse)
+        if auto_model is not None and args.recalibrate:
+            if args.decision == 'cascade':
+                # the triage set is biased towards anomalies: it would drag the threshold up
+                print("[warn] auto threshold not recalibrated in cascade mode (autoencoder scores only the triage set)")
+            else:
+                auto_thresh, auto_sketch = recalibrate_threshold(auto_sketch, auto_mse[ae_scored], auto_q)
+                if not args.registry:
+                    save_auto_sketch(args.auto, auto_sketch, auto_thresh, auto_q)
+                print(f"[ok] auto threshold recalibrated ({auto_sketch.count:.0f} scores) -> {auto_thresh:.6f}")
+        if auto_model is None:
+            auto_thresh = None  # sem autoencoder não há flag do autoencoder (antes: limiar 0 marcava todos os hosts)
+        elif auto_thresh is None and ae_scored.any():
+            auto_thresh = sketch_from_scores(auto_mse[ae_scored]).percentile(auto_q)
+            print(f"[info] auto threshold not found; using {auto_q:g}th percentile -> {auto_thresh:.6f}")
+        for lo in range(0, n, segment_rows):
+            publish(lo, min(n, lo + segment_rows))
+
+    need = np.concatenate(scored_by_auto) if scored_by_auto else np.array([], dtype=np.int64)
+    if args.decision == 'cascade' and auto_model is not None:
+        print(f"[ok] Cascade: autoencoder ran on {len(need)} rows "
+              f"({triaged[0]}/{n} in triage, {triaged[0] - len(need)} from cache)")
+    if args.score_cache:
+        changed = np.union1d(miss, need)
+        cache.update(digest_hi[changed], digest_lo[changed], isof_scores[changed], auto_mse[changed],
+                     top_idx[changed] if topk else None, top_err[changed] if topk else None)
+        cache.save()
+        print(f"[ok] Score cache: {int(hit.sum())}/{n} rows reused, {len(changed)} scored ({len(cache)} entries)")
+
+    summary = summarize(n)
+    table = writer.finish(summary)
+    if csv_header[0]:  # no rows: header-only CSV
+        table.to_frame().to_csv(args.outcsv, index=False)
+    # JSON (streamed page by page) and the consolidated columnar table as a new generation, under one lock
+    # (API workers map it read-only and switch when the generation counter changes; the generation claims
+    # this infer.json as its source, so no worker converts it again)
+    with stage('report_serialization', items=len(table)), prof.stage('report_serialization'):
+        generation = publish_with_json(table, table_base, args.out)
+    run_ts = args.run_ts if args.run_ts is not None else int(time.time())
+    if not args.no_history:
+        with stage('history_append', items=len(table)), prof.stage('history_append'):
+            history = ScoreHistory(args.history or Path(args.out).parent / 'history', args.history_segment_seconds)
+            history.append(run_ts, src_ips, isof_scores, auto_mse, isof_flag, auto_flag, combined_flag)
+            if args.history_retention_days > 0:
+                history.prune(run_ts - int(args.history_retention_days * 86400))
+        print(f"[ok] Histórico: {len(history.blocks)} blocos em {history.root}")
+    if not args.no_alerts:
+        with stage('alert_engine', items=int(summary['n_flagged'])), prof.stage('alert_engine'):
+            engine = AlertEngine(args.alerts_dir or Path(args.out).parent / 'alerts', window=args.alert_window,
+                                 renotify=args.alert_renotify, escalate_ratio=args.alert_escalate_ratio)
+            alerts = engine.process(table, run_ts)
+            engine.save(alerts)
+        a = alerts['summary']
+        print(f"[ok] Alertas: {a['flagged_hosts']} hosts sinalizados em {a['incidents_active']} incidentes; "
+              f"{a['emitted']} emitidos ({a['new']} novos, {a['escalated']} escalados), {a['suppressed']} suprimidos")
+    REGISTRY.write_snapshot('infer_and_act', Path(args.out).parent / 'metrics')
+    prof.close()
 
     print(f"[ok] Inferência salva em: {args.out}")
     print(f"[ok] Inferência (csv) salva em: {args.outcsv}")
-    print("Resumo:", out['summary'])
-    if out['summary']['n_flagged'] > 0:
-        print(f"[warning] {out['summary']['n_flagged']} hosts foram sinalizados. Verifique reports/infer.json para detalhes.")
+    print(f"[ok] Tabela de resultados: {len(table)} hosts em {table.nbytes / 1024 / 1024:.1f} MB (geração {generation})")
+    print("Resumo:", summary)
+    if summary['n_flagged'] > 0:
+        print(f"[warning] {summary['n_flagged']} hosts foram sinalizados. Verifique reports/infer.json para detalhes.")
     else:
         print("[ok] Nenhum host sinalizado.")
 
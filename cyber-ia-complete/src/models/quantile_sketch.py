@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Sketch de quantis em streaming (t-digest "merging", vetorizado com NumPy)
+- Atualizado em lotes à medida que os scores são produzidos (memória O(compression))
+- Mesclável: sketches de execuções/processos diferentes podem ser somados (merge)
+- Serializável em dict puro (JSON / joblib) para ser salvo junto dos modelos
+"""
+import numpy as np
+
+
+class TDigest:
+    def __init__(self, compression=200, buffer_size=None):
+        self.compression = float(compression)
+        self.buffer_size = int(buffer_size or 10 * compression)
+        self._means = np.empty(0, dtype=np.float64)
+        self._weights = np.empty(0, dtype=np.float64)
+        self._buffer = []
+        self._buffered = 0
+        self.count = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _k(self, q):
+        # função de escala k1: centróides menores nas caudas (onde ficam os thresholds)
+        return self.compression / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0.0, 1.0) - 1)
+
+    def update(self, values):
+        """Adiciona um lote de valores (array-like) ao sketch."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        v = v[np.isfinite(v)]
+        if v.size == 0:
+            return self
+        self._buffer.append(v)
+        self._buffered += v.size
+        self.count += v.size
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+        if self._buffered >= self.buffer_size:
+            self._compress()
+        return self
+
+    def _compress(self, extra_means=None, extra_weights=None):
+        means = [self._means] + self._buffer
+        weights = [self._weights] + [np.ones(b.size) for b in self._buffer]
+        if extra_means is not None:
+            means.append(extra_means)
+            weights.append(extra_weights)
+        means = np.concatenate(means)
+        weights = np.concatenate(weights)
+        self._buffer, self._buffered = [], 0
+        if means.size == 0:
+            return
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # cada item cai no "bin" de largura 1 na escala k do seu quantil central
+        q_mid = (np.cumsum(weights) - weights / 2) / total
+        bins = np.floor(self._k(q_mid) - self._k(0.0)).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        w = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / w
+        self._weights = w
+
+    def merge(self, other):
+        """Mescla outro TDigest neste (in-place)."""
+        other._compress()
+        if other.count == 0:
+            return self
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(other._means, other._weights)
+        return self
+
+    def quantile(self, q):
+        """Quantil aproximado (q em [0, 1], escalar ou array); None se o sketch estiver vazio."""
+        self._compress()
+        if self.count == 0:
+            return None
+        if self._means.size == 1:
+            return float(self._means[0]) if np.ndim(q) == 0 else np.full(np.shape(q), self._means[0])
+        cum = np.cumsum(self._weights)
+        centers = cum - self._weights / 2
+        xp = np.r_[0.0, centers, self.count]
+        fp = np.r_[self.min, self._means, self.max]
+        out = np.interp(np.asarray(q) * self.count, xp, fp)
+        return float(out) if np.ndim(q) == 0 else out
+
+    def percentile(self, p):
+        """Equivalente a np.percentile(scores, p) para o sketch."""
+        return self.quantile(p / 100.0)
+
+    def to_dict(self):
+        self._compress()
+        return {
+            'type': 'tdigest',
+            'compression': self.compression,
+            'count': self.count,
+            'min': float(self.min) if self.count else None,
+            'max': float(self.max) if self.count else None,
+            'means': self._means.tolist(),
+            'weights': self._weights.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        td = cls(compression=d.get('compression', 200))
+        td._means = np.asarray(d.get('means', []), dtype=np.float64)
+        td._weights = np.asarray(d.get('weights', []), dtype=np.float64)
+        td.count = float(d.get('count', td._weights.sum()))
+        if td.count:
+            td.min = float(d['min'])
+            td.max = float(d['max'])
+        return td
+
+
+def sketch_from_scores(scores, compression=200, batch_size=65536):
+    """Constrói um TDigest a partir de um array, em lotes."""
+    td = TDigest(compression=compression)
+    scores = np.asarray(scores).ravel()
+    for start in range(0, len(scores), batch_size):
+        td.update(scores[start:start + batch_size])
+    return td
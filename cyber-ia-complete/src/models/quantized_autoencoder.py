@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Exportação quantizada do Autoencoder para pontuação em CPU (sem TensorFlow na inferência)
+- Pesos das camadas Dense exportados em int8 (simétrico, uma escala por neurônio de saída)
+  ou float16; bias em float32. Modelo ~4x (int8) / ~2x (float16) menor que o float32
+- Inferência em NumPy: x @ W + bias + ativação; W = pesos * escala em float32 é montado camada a
+  camada dentro de cada predict e descartado em seguida (nunca há cópia float32 do modelo inteiro:
+  a memória residente é a dos pesos quantizados + uma camada); mesma assinatura
+  predict()/get_weights() do Keras usada pelo infer_and_act
+- Calibração: MSE e flags (no threshold do report.json) comparados com o modelo float em
+  linhas reais; o erro do MSE é medido em frações do threshold (|Δmse| / threshold), não relativo
+  a cada MSE (MSEs minúsculos inflam o erro relativo sem mudar nenhuma flag); a exportação só é
+  gravada se o erro e a concordância das flags ficarem na tolerância
+- Modo padrão float16 (o de menor erro); int8 perde mais precisão e pode exigir tolerância maior
+  (ex.: --tolerance 0.03 --min_agreement 0.998), uma troca que deve ser explícita
+- Layout: <out>/quant.json (modo, ativações, threshold, calibração) + layer<i>.w/.scale/.b.npy
+Uso:
+  python src/models/quantized_autoencoder.py --auto models/auto_model --features Data/Processed/features.csv
+  python src/models/quantized_autoencoder.py --auto models/auto_model --features Data/Processed/features.csv \
+      --mode int8 --tolerance 0.03 --min_agreement 0.998
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # permite importar os pacotes de src/
+from features.preprocessor import FeaturePreprocessor
+from instrumentation.metrics import REGISTRY, stage
+from instrumentation.profiling import Profiler, add_profile_args
+
+MODES = ('int8', 'float16', 'float32')
+META_FILE = 'quant.json'
+_ACTIVATIONS = {
+    'linear': None,
+    'relu': lambda z: np.maximum(z, 0, out=z),
+    'sigmoid': lambda z: np.divide(1.0, 1.0 + np.exp(-z, out=z), out=z),
+    'tanh': lambda z: np.tanh(z, out=z),
+}
+
+
+def quantize_kernel(kernel, mode):
+    """Kernel (entrada x saída) -> (pesos no modo pedido, escala por coluna de saída ou None)."""
+    kernel = np.asarray(kernel, dtype=np.float32)
+    if mode == 'int8':
+        scale = np.abs(kernel).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0  # neurônio sem pesos: qualquer escala reconstrói zeros
+        q = np.clip(np.rint(kernel / scale), -127, 127).astype(np.int8)
+        return q, scale.astype(np.float32)
+    if mode == 'float16':
+        return kernel.astype(np.float16), None
+    return kernel, None
+
+
+def dequantize_kernel(w, scale):
+    """
+    Kernel armazenado -> float32 com a escala int8 aplicada. NumPy não tem produto de matrizes
+    int8/float16: a conversão é feita por camada a cada lote (O(pesos), desprezível frente ao
+    produto O(linhas x pesos)) e não é guardada, para o modelo em memória continuar quantizado.
+    """
+    if scale is None:
+        return w.astype(np.float32, copy=False)  # float32 armazenado: sem cópia
+    w = w.astype(np.float32)  # int8: cópia nova, então a escala pode ser aplicada nela mesma
+    w *= scale
+    return w
+
+
+class QuantizedAutoencoder:
+    def __init__(self, layers, mode, meta=None):
+        # layers: [(pesos, escala|None, bias float32, ativação)]
+        self.layers = layers
+        self.mode = mode
+        self.meta = dict(meta or {})
+
+    @classmethod
+    def from_layers(cls, layers, mode='int8', meta=None):
+        """[(kernel, bias, ativação)] em float32 -> modelo quantizado."""
+        if mode not in MODES:
+            raise ValueError(f"modo de quantização inválido: {mode} (use {', '.join(MODES)})")
+        out = []
+        for kernel, bias, activation in layers:
+            if activation not in _ACTIVATIONS:
+                raise ValueError(f"ativação sem suporte na inferência quantizada: {activation}")
+            w, scale = quantize_kernel(kernel, mode)
+            out.append((w, scale, np.asarray(bias, dtype=np.float32), activation))
+        return cls(out, mode, meta)
+
+    @classmethod
+    def from_keras(cls, model, mode='int8', meta=None):
+        """Camadas Dense de um modelo Keras (ex.: build_autoencoder), na ordem do grafo sequencial."""
+        layers = []
+        for layer in model.layers:
+            weights = layer.get_weights()
+            if not weights:
+                continue  # InputLayer
+            if type(layer).__name__ != 'Dense' or len(weights) != 2:
+                raise ValueError(f"camada sem suporte na exportação quantizada: {layer.name} ({type(layer).__name__})")
+            layers.append((weights[0], weights[1], layer.get_config().get('activation', 'linear')))
+        return cls.from_layers(layers, mode, meta)
+
+    @property
+    def n_features(self):
+        return self.layers[0][0].shape[0]
+
+    @property
+    def nbytes(self):
+        return int(sum(w.nbytes + b.nbytes + (s.nbytes if s is not None else 0) for w, s, b, _ in self.layers))
+
+    def get_weights(self):
+        """Arrays armazenados (mesmo papel do Keras get_weights: hash de conteúdo no cache de scores)."""
+        return [a for w, s, b, _ in self.layers for a in (w, s, b) if a is not None]
+
+    def predict(self, X, verbose=0, batch_size=None):
+        """Reconstrução float32; a cópia float32 de cada kernel vive só durante a sua camada."""
+        h = np.asarray(X, dtype=np.float32)
+        for w, scale, bias, activation in self.layers:
+            h = h @ dequantize_kernel(w, scale)
+            h += bias
+            fn = _ACTIVATIONS[activation]
+            if fn is not None:
+                h = fn(h)
+        return h
+
+    def save(self, out_dir):
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        layers = []
+        for i, (w, scale, bias, activation) in enumerate(self.layers):
+            np.save(out_dir / f'layer{i}.w.npy', w)
+            np.save(out_dir / f'layer{i}.b.npy', bias)
+            if scale is not None:
+                np.save(out_dir / f'layer{i}.scale.npy', scale)
+            layers.append({'activation': activation, 'shape': list(w.shape), 'scaled': scale is not None})
+        meta = dict(self.meta, mode=self.mode, layers=layers, nbytes=self.nbytes)
+        tmp = out_dir / (META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, out_dir / META_FILE)  # quant.json por último: a pasta só vale com todos os pesos gravados
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        with open(path / META_FILE) as f:
+            meta = json.load(f)
+        layers = []
+        for i, spec in enumerate(meta['layers']):
+            w = np.load(path / f'layer{i}.w.npy')
+            scale = np.load(path / f'layer{i}.scale.npy') if spec['scaled'] else None
+            layers.append((w, scale, np.load(path / f'layer{i}.b.npy'), spec['activation']))
+        return cls(layers, meta['mode'], meta)
+
+    @property
+    def threshold(self):
+        return self.meta.get('threshold')
+
+
+def reconstruction_mse(model, X, batch_size=65536):
+    mse = np.empty(len(X))
+    for start in range(0, len(X), batch_size):
+        Xb = X[start:start + batch_size]
+        mse[start:start + len(Xb)] = np.mean((Xb - model.predict(Xb, verbose=0)) ** 2, axis=1)
+    return mse
+
+
+def rows_per_second(model, X, repeats=3, batch_size=65536):
+    """Melhor de `repeats` passadas completas (reduz ruído de aquecimento)."""
+    best = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        reconstruction_mse(model, X, batch_size)
+        best = min(best, time.perf_counter() - t0)
+    return len(X) / best if best > 0 else float('inf')
+
+
+def calibrate(reference, quantized, X, threshold, tolerance=0.01, min_agreement=0.999):
+    """
+    MSE / flags do modelo quantizado contra o float nas mesmas linhas.
+    Erro do MSE em frações do threshold (sem threshold: da mediana do MSE de referência).
+    Passa se o p99 desse erro <= tolerance e a concordância das flags >= min_agreement.
+    """
+    with stage('calibrate_quantized', items=len(X)):
+        ref = reconstruction_mse(reference, X)
+        got = reconstruction_mse(quantized, X)
+    # erro na escala da decisão: uma troca de flag exige |Δmse| da ordem da distância ao threshold
+    scale = threshold if threshold is not None else (float(np.median(ref)) if len(X) else 1.0)
+    err = np.abs(got - ref) / max(abs(scale), np.finfo(np.float32).tiny)
+    result = {
+        'rows': int(len(X)),
+        'mse_err_scale': 'threshold' if threshold is not None else 'median_mse',
+        'mse_err_p50': float(np.percentile(err, 50)) if len(X) else 0.0,
+        'mse_err_p99': float(np.percentile(err, 99)) if len(X) else 0.0,
+        'mse_err_max': float(err.max()) if len(X) else 0.0,
+        'tolerance': tolerance,
+        'min_agreement': min_agreement,
+    }
+    if threshold is not None:
+        flips = (ref >= threshold) != (got >= threshold)
+        result['flag_agreement'] = float(1.0 - flips.mean()) if len(X) else 1.0
+        result['flag_flips'] = int(flips.sum())
+        result['flags_reference'] = int((ref >= threshold).sum())
+    result['ok'] = bool(result['mse_err_p99'] <= tolerance and result.get('flag_agreement', 1.0) >= min_agreement)
+    return result
+
+
+def calibration_rows(features, prep, rows, random_state=42):
+    """Amostra uniforme de linhas do CSV de features, pré-processadas como na inferência."""
+    df = pd.read_csv(features)
+    if rows and len(df) > rows:
+        df = df.sample(n=rows, random_state=random_state)
+    return prep.transform(df)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Exporta o Autoencoder em int8/float16 e valida contra o modelo float")
+    ap.add_argument('--auto', default='models/auto_model', help='diretório do Autoencoder (<auto>.keras + report.json)')
+    ap.add_argument('--prep', default='models/preprocessor.json', help='artefato de pré-processamento do treino')
+    ap.add_argument('--features', required=True, help='CSV de features usado na calibração')
+    ap.add_argument('--mode', choices=MODES, default='float16',
+                    help='float16: menor erro; int8 (4x menor que float32) perde mais precisão e pode exigir --tolerance/--min_agreement maiores')
+    ap.add_argument('--out', default=None, help='pasta da exportação (padrão: <auto>/quantized-<modo>)')
+    ap.add_argument('--calib_rows', type=int, default=50000, help='linhas amostradas para a calibração (0 = todas)')
+    ap.add_argument('--tolerance', type=float, default=0.01, help='p99 máximo de |Δmse| / threshold (sem threshold: / mediana do MSE)')
+    ap.add_argument('--min_agreement', type=float, default=0.999, help='fração mínima de flags iguais às do modelo float')
+    ap.add_argument('--force', action='store_true', help='grava a exportação mesmo reprovada na calibração')
+    add_profile_args(ap)
+    args = ap.parse_args()
+    out = Path(args.out or Path(args.auto) / f'quantized-{args.mode}')
+    prof = Profiler.from_args(args, 'quantize_autoencoder', Path('reports') / 'profiles')
+
+    for path in (args.features, args.prep):
+        if not Path(path).exists():
+            print("[error] file not found:", path)
+            sys.exit(1)
+    with prof.stage('load_models'):
+        from models.infer_and_act import load_auto
+        model, thresh, _, thresh_q = load_auto(args.auto)
+        prep = FeaturePreprocessor.load(args.prep)
+    with prof.stage('load_features'):
+        X = calibration_rows(args.features, prep, args.calib_rows)
+
+    with prof.stage('quantize'):
+        quantized = QuantizedAutoencoder.from_keras(model, args.mode, meta={'threshold': thresh, 'threshold_q': thresh_q, 'columns': prep.columns})
+    float_nbytes = int(sum(w.nbytes for w in model.get_weights()))
+    with prof.stage('calibrate'):
+        result = calibrate(model, quantized, X, thresh, args.tolerance, args.min_agreement)
+    with prof.stage('throughput'):
+        result['rows_per_s_float'] = rows_per_second(model, X)
+        result['rows_per_s_quantized'] = rows_per_second(quantized, X)
+    result['nbytes_float'] = float_nbytes
+    result['nbytes_quantized'] = quantized.nbytes
+    quantized.meta['calibration'] = result
+
+    print(f"[info] {args.mode}: {quantized.nbytes} bytes (float32: {float_nbytes}); "
+          f"|Δmse|/{result['mse_err_scale']} p99={result['mse_err_p99']:.2e}; "
+          f"flags iguais={result.get('flag_agreement', float('nan')):.5f} ({result.get('flag_flips', 0)} trocas)")
+    print(f"[info] {result['rows_per_s_quantized']:.0f} linhas/s quantizado vs {result['rows_per_s_float']:.0f} linhas/s Keras")
+    if not result['ok'] and not args.force:
+        print(f"[error] calibração reprovada (tolerância {args.tolerance}, concordância mínima {args.min_agreement}); nada gravado")
+        prof.close()
+        sys.exit(1)
+    quantized.save(out)
+    REGISTRY.write_snapshot('quantize_autoencoder')
+    prof.close()
+    print(f"[ok] Autoencoder {args.mode} salvo em {out} (use infer_and_act.py --auto_quantized {out})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Registro versionado de modelos
+- Cada versão é uma pasta models/registry/<versão>/ com manifest.json + componentes
+  (forest.joblib, autoencoder.keras, preprocessor.json, ...)
+- O manifest concentra thresholds, schema de features e metadados do treino
+- models/registry/ACTIVE aponta para a versão ativa; a troca é atômica (os.replace)
+- Componentes são carregados sob demanda; joblib com mmap_mode='r' só mantém mapeados os ndarrays
+  simples (ex.: scaler). As árvores do sklearn são copiadas para a memória ao carregar
+  (Tree.__setstate__), então cada processo tem a sua cópia da floresta
+- Cada ativação empilha a versão anterior em models/registry/ACTIVE.history; rollback volta para ela
+- ActiveModel segue o ponteiro ACTIVE sem reiniciar o processo; hoje só GET /model da API o usa
+  (infer_and_act --registry carrega a versão uma vez por execução)
+
+Uso:
+  python src/models/registry.py list --registry models/registry
+  python src/models/registry.py activate <versão> --registry models/registry
+  python src/models/registry.py rollback --registry models/registry
+"""
+import os
+import sys
+import json
+import argparse
+import shutil
+import hashlib
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+
+DEFAULT_ROOT = Path('models') / 'registry'
+ACTIVE_FILE = 'ACTIVE'
+HISTORY_FILE = 'ACTIVE.history'  # versões ativas anteriores, a mais recente por último
+MANIFEST_FILE = 'manifest.json'
+
+
+def _sha256(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _atomic_write_text(path, text):
+    tmp = Path(path).with_name(f".{Path(path).name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ModelBundle:
+    """Uma versão do registro; cada componente é carregado só no primeiro acesso."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE, 'r') as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _component_path(self, name):
+        comp = self.manifest.get('components', {}).get(name)
+        if comp is None:
+            return None
+        return self.path / comp['file']
+
+    def _load(self, name, loader):
+        if name not in self._cache:
+            with self._lock:
+                if name not in self._cache:
+                    path = self._component_path(name)
+                    self._cache[name] = loader(path) if path is not None else None
+        return self._cache[name]
+
+    def has(self, name):
+        return name in self.manifest.get('components', {})
+
+    @property
+    def thresholds(self):
+        return self.manifest.get('thresholds', {})
+
+    @property
+    def feature_schema(self):
+        return self.manifest.get('feature_schema')
+
+    @property
+    def forest_artifact(self):
+        # mmap_mode='r' não mantém a floresta mapeada: Tree.__setstate__ copia os arrays de nós
+        return self._load('forest', lambda p: joblib.load(p, mmap_mode='r'))
+
+    @property
+    def forest(self):
+        obj = self.forest_artifact
+        return obj.get('model', obj) if isinstance(obj, dict) else obj  # backwards compat
+
+    @property
+    def autoencoder(self):
+        def load(p):
+            import tensorflow as tf  # import tardio: só paga o custo quem usa o autoencoder
+            return tf.keras.models.load_model(p)
+        return self._load('autoencoder', load)
+
+    @property
+    def autoencoder_report(self):
+        def load(p):
+            with open(p, 'r') as f:
+                return json.load(f)
+        return self._load('autoencoder_report', load)
+
+    @property
+    def scaler(self):
+        return self._load('scaler', lambda p: joblib.load(p, mmap_mode='r'))
+
+    @property
+    def preprocessor(self):
+        def load(p):
+            from features.preprocessor import FeaturePreprocessor
+            return FeaturePreprocessor.load(p)
+        return self._load('preprocessor', load)
+
+
+class ModelRegistry:
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = Path(root)
+
+    def versions(self):
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir()
+                      if p.is_dir() and (p / MANIFEST_FILE).exists())
+
+    def active_version(self):
+        active = self.root / ACTIVE_FILE
+        if not active.exists():
+            return None
+        return active.read_text().strip() or None
+
+    def history(self):
+        path = self.root / HISTORY_FILE
+        if not path.exists():
+            return []
+        return [line.strip() for line in path.read_text().splitlines() if line.strip()]
+
+    def activate(self, version, remember=True):
+        if not (self.root / version / MANIFEST_FILE).exists():
+            raise FileNotFoundError(f"versão não encontrada no registro: {version}")
+        previous = self.active_version()
+        if remember and previous is not None and previous != version:
+            _atomic_write_text(self.root / HISTORY_FILE, ''.join(v + '\n' for v in self.history() + [previous]))
+        _atomic_write_text(self.root / ACTIVE_FILE, version + '\n')
+        return version
+
+    def rollback(self):
+        """Reativa a versão ativa antes da atual (desempilha ACTIVE.history)."""
+        history = self.history()
+        while history and not (self.root / history[-1] / MANIFEST_FILE).exists():
+            history.pop()  # versão removida do registro à mão: pula
+        if not history:
+            raise FileNotFoundError(f"nenhuma versão anterior para reativar em {self.root}")
+        version = history.pop()
+        self.activate(version, remember=False)
+        _atomic_write_text(self.root / HISTORY_FILE, ''.join(v + '\n' for v in history))
+        return version
+
+    def load(self, version=None):
+        version = version or self.active_version()
+        if version is None:
+            raise FileNotFoundError(f"nenhuma versão ativa em {self.root}")
+        return ModelBundle(self.root / version)
+
+    def publish(self, components, thresholds=None, feature_schema=None, metadata=None, activate=True, base=None):
+        """
+        Publica uma nova versão a partir de arquivos já salvos.
+        components: {'forest': 'models/isof.joblib', 'autoencoder': 'models/auto_model.keras', ...}
+        base: versão da qual herdar componentes/thresholds não informados (ex.: refresh só da floresta)
+        A pasta é montada num diretório temporário e renomeada no final (nunca fica meia versão visível).
+        """
+        components = dict(components)
+        thresholds = dict(thresholds or {})
+        if base is not None:
+            base_bundle = self.load(base)
+            for name in base_bundle.manifest.get('components', {}):
+                if components.get(name) is None:
+                    components[name] = base_bundle._component_path(name)
+            thresholds = {**base_bundle.thresholds, **thresholds}
+            feature_schema = feature_schema or base_bundle.feature_schema
+        self.root.mkdir(parents=True, exist_ok=True)
+        version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ') + '-' + uuid.uuid4().hex[:6]
+        tmp_dir = self.root / f".{version}.tmp"
+        tmp_dir.mkdir()
+        manifest_components = {}
+        try:
+            for name, src in components.items():
+                if src is None or not Path(src).exists():
+                    continue
+                src = Path(src)
+                file_name = name + ''.join(src.suffixes)
+                shutil.copy2(src, tmp_dir / file_name)  # cópia (não hardlink): retreinos sobrescrevem os originais
+                manifest_components[name] = {'file': file_name, 'sha256': _sha256(tmp_dir / file_name)}
+            manifest = {
+                'version': version,
+                'created': datetime.now(timezone.utc).isoformat(),
+                'components': manifest_components,
+                'thresholds': thresholds,
+                'feature_schema': feature_schema,
+                'metadata': metadata or {},
+            }
+            with open(tmp_dir / MANIFEST_FILE, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_dir, self.root / version)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        if activate:
+            self.activate(version)
+        return version
+
+
+class ActiveModel:
+    """
+    Referência à versão ativa para processos de longa duração (hoje: GET /model da API).
+    get() relê o ponteiro ACTIVE (barato: um stat) e troca o bundle quando ele muda;
+    quem já segurava o bundle antigo continua com ele.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry if isinstance(registry, ModelRegistry) else ModelRegistry(registry)
+        self._bundle = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _pointer_stamp(self):
+        try:
+            st = os.stat(self.registry.root / ACTIVE_FILE)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def get(self):
+        stamp = self._pointer_stamp()
+        if self._bundle is None or stamp != self._stamp:
+            with self._lock:
+                if self._bundle is None or stamp != self._stamp:
+                    bundle = self.registry.load()
+                    if self._bundle is None or bundle.version != self._bundle.version:
+                        self._bundle = bundle
+                    self._stamp = stamp
+        return self._bundle
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Registro versionado de modelos')
+    ap.add_argument('command', choices=['list', 'activate', 'rollback'])
+    ap.add_argument('version', nargs='?', default=None, help='versão a ativar (activate)')
+    ap.add_argument('--registry', default=str(DEFAULT_ROOT), help='pasta do registro')
+    args = ap.parse_args()
+    registry = ModelRegistry(args.registry)
+    try:
+        if args.command == 'list':
+            active = registry.active_version()
+            for version in registry.versions():
+                print(f"{'*' if version == active else ' '} {version}")
+            return 0
+        if args.command == 'activate':
+            if args.version is None:
+                ap.error('activate exige a versão')
+            version = registry.activate(args.version)
+        else:
+            version = registry.rollback()
+    except FileNotFoundError as e:
+        print(f"[error] {e}")
+        return 1
+    print(f"[ok] Versão ativa em {registry.root}: {version}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,84 +1,124 @@
 import pandas as pd
 import os
+import sys
+import argparse
 import numpy as np
 import joblib
-import tensorflow as tf
-from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.quantile_sketch import TDigest
+from models.infer_and_act import load_auto, save_auto_sketch, DEFAULT_QUANTILE
+from features.preprocessor import FeaturePreprocessor
+from instrumentation.profiling import Profiler, add_profile_args
 
 # Caminhos
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 DATA_PATH = os.path.join(BASE_DIR, "data", "processed", "features.csv")
 REPORTS_PATH = os.path.join(BASE_DIR, "reports")
 MODEL_IF = os.path.join(BASE_DIR, "models", "isof.joblib")
-MODEL_AE = os.path.join(BASE_DIR, "models", "auto_model.keras")
+AUTO_DIR = os.path.join(BASE_DIR, "models", "auto_model")  # <dir>.keras + <dir>/report.json (threshold + sketch)
 SCALER_PATH = os.path.join(BASE_DIR, "models", "scaler.joblib")
+PREP_PATH = os.path.join(BASE_DIR, "models", "preprocessor.json")
+CHUNK_ROWS = 65536
+
+parser = argparse.ArgumentParser(description="Inferência (Isolation Forest + Autoencoder) sobre features.csv")
+parser.add_argument("--recalibrate", action="store_true",
+                    help="mescla os erros desta execução no sketch salvo em report.json e grava o novo threshold "
+                         "(vale a partir da próxima execução; esta usa o threshold salvo)")
+parser.add_argument("--quantile", type=float, default=None,
+                    help=f"percentil do threshold (padrão: threshold_q salvo com o modelo, senão {DEFAULT_QUANTILE})")
+parser.add_argument("--chunk_rows", type=int, default=CHUNK_ROWS, help="linhas do CSV lidas e pontuadas por vez")
+add_profile_args(parser)
+args = parser.parse_args()
+prof = Profiler.from_args(args, "run_inference", os.path.join(REPORTS_PATH, "profiles"))
 
 os.makedirs(REPORTS_PATH, exist_ok=True)
 
-print("Carregando dados...")
-df = pd.read_csv(DATA_PATH)
-
 # Carregar modelos
 iso_obj = joblib.load(MODEL_IF)
 if isinstance(iso_obj, dict):
     iso = iso_obj['model']
 else:
     iso = iso_obj
-autoencoder = tf.keras.models.load_model(MODEL_AE)
-
-# Criar scaler se não existir
-if os.path.exists(SCALER_PATH):
-    scaler = joblib.load(SCALER_PATH)
+# threshold, sketch e percentil persistidos pelo train_detection (mesmo report.json do infer_and_act)
+autoencoder, threshold, sketch, threshold_q = load_auto(AUTO_DIR)
+q = args.quantile if args.quantile is not None else (threshold_q or DEFAULT_QUANTILE)
+
+# Normalizar com o pré-processamento do treino (nunca reajusta na inferência)
+if os.path.exists(PREP_PATH):
+    prep = FeaturePreprocessor.load(PREP_PATH)
+    transform = prep.transform
+elif os.path.exists(SCALER_PATH):
+    scaler = joblib.load(SCALER_PATH)  # legado
+    transform = lambda chunk: scaler.transform(chunk.select_dtypes(include=[np.number]).fillna(0).values)
 else:
-    print("Criando scaler...")
-    from sklearn.preprocessing import StandardScaler
-    scaler = StandardScaler()
-    scaler.fit(df.select_dtypes(include=[np.number]).fillna(0).values)
-    joblib.dump(scaler, SCALER_PATH)
-    print(f"Scaler salvo em {SCALER_PATH}")
-
-# Normalizar
-X = scaler.transform(df)
-
-# Isolation Forest
-print("Rodando Isolation Forest...")
-df["iso_score"] = iso.decision_function(X)
-df["iso_anomaly"] = iso.predict(X) == -1
-
-# Autoencoder
-print("Rodando Autoencoder...")
-reconstructions = autoencoder.predict(X)
-mse = np.mean(np.square(X - reconstructions), axis=1)
-df["ae_mse"] = mse
-
-# Threshold automático (95%)
-threshold = np.percentile(mse, 95)
-df["ae_anomaly"] = mse > threshold
-
-# Consolidação
-df["final_anomaly"] = df["iso_anomaly"] | df["ae_anomaly"]
-
-# Classificação textual
-df["threat_level"] = df["final_anomaly"].map({
-    True: "Suspeito",
-    False: "Normal"
-})
+    raise FileNotFoundError(f"Pré-processamento não encontrado ({PREP_PATH}). Treine os modelos primeiro.")
+
+
+def reconstruction_mse(X):
+    return np.mean(np.square(X - autoencoder.predict(X, verbose=0)), axis=1)
+
+
+def chunks():
+    return pd.read_csv(DATA_PATH, chunksize=args.chunk_rows)
+
+
+# Modelo sem threshold salvo (treinado antes dos sketches): uma passada só para o percentil,
+# em vez de guardar todos os erros em memória
+if threshold is None:
+    print(f"[info] threshold do autoencoder não encontrado em {AUTO_DIR}; percentil {q:g} calculado numa passada extra")
+    with prof.stage("autoencoder_threshold"):
+        fallback = TDigest()
+        for chunk in chunks():
+            fallback.update(reconstruction_mse(transform(chunk)))
+        threshold = fallback.percentile(q)
+
+# Uma passada: cada bloco do CSV é pontuado, marcado e gravado; só o sketch (O(1)) atravessa os blocos
+print("Rodando Isolation Forest + Autoencoder em blocos...")
+live = TDigest()
+total = anomalies = 0
+csv_path = os.path.join(REPORTS_PATH, "infer.csv")
+with prof.stage("score"):
+    for i, df in enumerate(chunks()):
+        X = transform(df)
+        df["iso_score"] = iso.decision_function(X)
+        df["iso_anomaly"] = iso.predict(X) == -1
+        mse = reconstruction_mse(X)
+        live.update(mse)
+        df["ae_mse"] = mse
+        df["ae_anomaly"] = mse > threshold
+        # Consolidação
+        df["final_anomaly"] = df["iso_anomaly"] | df["ae_anomaly"]
+        # Classificação textual
+        df["threat_level"] = df["final_anomaly"].map({
+            True: "Suspeito",
+            False: "Normal"
+        })
+        df.to_csv(csv_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        total += len(df)
+        anomalies += int(df["final_anomaly"].sum())
+
+# Recalibração contínua: o sketch salvo absorve os erros desta execução
+if args.recalibrate:
+    sketch = sketch if sketch is not None else TDigest()
+    sketch.merge(live)
+    save_auto_sketch(AUTO_DIR, sketch, sketch.percentile(q), q)
+    print(f"[ok] threshold do autoencoder recalibrado ({sketch.count:.0f} erros) -> {sketch.percentile(q):.6f}")
 
 # Estatísticas
 summary = {
-    "total_events": len(df),
-    "anomalies_detected": int(df["final_anomaly"].sum()),
-    "anomaly_rate_percent": round(df["final_anomaly"].mean() * 100, 2),
-    "autoencoder_threshold": float(threshold)
+    "total_events": total,
+    "anomalies_detected": anomalies,
+    "anomaly_rate_percent": round(anomalies / total * 100, 2) if total else 0.0,
+    "autoencoder_threshold": float(threshold),
+    "autoencoder_threshold_q": q,
 }
 
 # Salvar relatório
-df.to_csv(os.path.join(REPORTS_PATH, "infer.csv"), index=False)
-
 import json
 with open(os.path.join(REPORTS_PATH, "infer.json"), "w") as f:
     json.dump(summary, f, indent=4)
 
+prof.close()
 print("Inferência concluída!")
 print(summary)
-
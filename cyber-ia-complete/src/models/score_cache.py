@@ -0,0 +1,123 @@
+# src/models/score_cache.py
+"""
+Cache de scores por conteúdo (linhas de features que não mudaram não passam pelos detectores)
+- Chave: versão do modelo (namespace = um arquivo) + digest de 128 bits da linha pré-processada
+- Valores: score do IsolationForest, MSE do autoencoder e top-K (índices/erros) da explicação;
+  flags não são guardadas: são recalculadas com os thresholds da execução
+- LRU limitado: cada entrada guarda a última execução em que foi usada; acima de max_entries,
+  as menos recentes saem no save(). Só as max_versions versões de modelo mais recentes ficam em disco
+- Persistência: <dir>/<versão>.npy (array estruturado), gravado de forma atômica
+"""
+import os
+import time
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+DEFAULT_MAX_VERSIONS = 3
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def row_digests(X):
+    """Digest de 128 bits (hi, lo uint64) por linha, vetorizado: hash por coluna combinado em duas trilhas."""
+    X = np.ascontiguousarray(X)
+    n = X.shape[0]
+    hi = np.full(n, X.shape[1], dtype=np.uint64)
+    lo = np.zeros(n, dtype=np.uint64)
+    bits = X.view(np.uint32) if X.dtype == np.float32 else X.astype(np.float64).view(np.uint64)
+    for j in range(X.shape[1]):
+        col = bits[:, j]
+        hi = hi * _MIX ^ pd.util.hash_array(col, hash_key='cyberai-digest-a')
+        lo = lo * _MIX ^ pd.util.hash_array(col, hash_key='cyberai-digest-b')
+    return hi, lo
+
+
+def fingerprint(*parts):
+    """Hash de conteúdo do modelo (arrays de pesos/limiares, textos) -> namespace do cache."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(str(part.dtype).encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(str(part).encode())
+        h.update(b'|')
+    return h.hexdigest()[:16]
+
+
+def cache_dtype(topk):
+    fields = [('hi', '<u8'), ('lo', '<u8'), ('last_used', '<u8'), ('isof_score', '<f8'), ('auto_mse', '<f8')]
+    if topk:
+        fields += [('top_idx', '<i2', (topk,)), ('top_err', '<f4', (topk,))]
+    return np.dtype(fields)
+
+
+class ScoreCache:
+    def __init__(self, cache_dir, model_key, topk=0, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_versions=DEFAULT_MAX_VERSIONS):
+        self.dir = Path(cache_dir)
+        self.model_key = model_key
+        self.topk = int(topk)
+        self.max_entries = int(max_entries)
+        self.max_versions = int(max_versions)
+        name = hashlib.sha256(f'{model_key}|topk={self.topk}'.encode()).hexdigest()[:16]
+        self.path = self.dir / f'{name}.npy'
+        self.now = time.time_ns()
+        self.entries = self._load()
+
+    def _load(self):
+        dtype = cache_dtype(self.topk)
+        if self.path.exists():
+            try:
+                data = np.load(self.path, allow_pickle=False)
+                if data.dtype == dtype:
+                    return data  # já ordenado por hi no save()
+            except (OSError, ValueError):
+                pass  # cache corrompido: recomeça vazio
+        return np.zeros(0, dtype=dtype)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, hi, lo):
+        """Devolve (máscara de acertos, entradas correspondentes às linhas com acerto)."""
+        e = self.entries
+        if len(e) == 0:
+            return np.zeros(len(hi), dtype=bool), e[:0]
+        pos = np.searchsorted(e['hi'], hi)
+        pos_c = np.minimum(pos, len(e) - 1)
+        hit = (pos < len(e)) & (e['hi'][pos_c] == hi) & (e['lo'][pos_c] == lo)
+        rows = pos_c[hit]
+        e['last_used'][rows] = self.now
+        return hit, e[rows]
+
+    def update(self, hi, lo, isof_score, auto_mse, top_idx=None, top_err=None):
+        new = np.zeros(len(hi), dtype=self.entries.dtype)
+        new['hi'], new['lo'], new['last_used'] = hi, lo, self.now
+        new['isof_score'], new['auto_mse'] = isof_score, auto_mse
+        if self.topk:
+            new['top_idx'], new['top_err'] = top_idx, top_err
+        merged = np.concatenate([new, self.entries])  # novas primeiro: vencem no unique abaixo
+        _, first = np.unique(merged['hi'], return_index=True)
+        self.entries = merged[first]
+
+    def save(self):
+        e = self.entries
+        if len(e) > self.max_entries:
+            keep = np.argpartition(-e['last_used'].astype(np.int64), self.max_entries - 1)[:self.max_entries]
+            e = e[keep]
+        e = e[np.argsort(e['hi'], kind='stable')]
+        self.entries = e
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = Path(str(self.path) + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.save(f, e)
+        os.replace(tmp, self.path)
+        # versões antigas do modelo: mantém só as mais recentes
+        files = sorted(self.dir.glob('*.npy'), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+        for old in files[self.max_versions:]:
+            old.unlink(missing_ok=True)
+        return self.path
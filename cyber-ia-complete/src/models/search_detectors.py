@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Busca de hiperparâmetros dos detectores (IsolationForest + Autoencoder) em paralelo
+- O CSV é lido e pré-processado uma única vez (mesmo FeaturePreprocessor do treino);
+  treino / validação / rótulos vão para .npy em --workdir e cada worker os abre com mmap
+- Trials (grade de --contamination/--n_estimators/--max_samples e --epochs/--batch/--latent)
+  rodam num pool de processos; cada processo lê as matrizes compartilhadas, sem cópia do CSV
+- Autoencoder: a loss de validação é medida várias vezes por época (--checks_per_epoch);
+  trials acima da mediana dos outros no mesmo ponto são podados (regra da mediana)
+- Qualidade: average precision / ROC AUC / F1 no threshold do trial, sobre a validação rotulada;
+  custo: microssegundos de inferência por linha, medidos depois do pool, um trial por vez (modelos
+  salvos em <workdir>/trials/), sem disputa de CPU com os outros trials. Saída: todos os trials + frente de Pareto
+Uso:
+  python src/models/search_detectors.py --features Data/Processed/features.csv \
+      --n_estimators 100 200 --max_samples 256 auto --latent 8 16 --batch 64 256 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing as mp
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # permite importar os pacotes de src/
+from features.preprocessor import FeaturePreprocessor
+from instrumentation.profiling import Profiler, add_profile_args
+from models.train_detection import parse_max_samples, build_autoencoder
+
+OBJECTIVES = ('average_precision', 'roc_auc', 'f1')
+COST_SAMPLE = 20000  # linhas da validação usadas para medir o custo de inferência
+
+
+# --- dados compartilhados ----------------------------------------------------
+def prepare_shared(features_csv, workdir, label_col='label', val_fraction=0.2, random_state=42):
+    """
+    Lê o CSV uma vez, ajusta o pré-processamento e grava as matrizes usadas pelos trials:
+    train.npy (só linhas normais), val.npy, val_labels.npy. Devolve o dict de caminhos.
+    """
+    df = pd.read_csv(features_csv)
+    if label_col not in df.columns:
+        raise ValueError(f"column '{label_col}' not found: the search needs labels to measure detection quality")
+    y = (df[label_col].to_numpy() != 0).astype(np.int8)
+    rng = np.random.default_rng(random_state)
+    is_val = rng.random(len(df)) < val_fraction
+    train = ~is_val & (y == 0)  # detectores treinados só com tráfego normal (como preparar_treino_normal)
+    prep = FeaturePreprocessor.fit(df[train], exclude=(label_col,))
+    X = prep.transform(df)
+
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    paths = {'train': str(workdir / 'train.npy'), 'val': str(workdir / 'val.npy'),
+             'val_labels': str(workdir / 'val_labels.npy'), 'prep': str(workdir / 'preprocessor.json')}
+    np.save(paths['train'], X[train])
+    np.save(paths['val'], X[is_val])
+    np.save(paths['val_labels'], y[is_val])
+    prep.save(paths['prep'])
+    return paths
+
+
+def open_shared(paths):
+    return (np.load(paths['train'], mmap_mode='r'), np.load(paths['val'], mmap_mode='r'),
+            np.load(paths['val_labels'], mmap_mode='r'))
+
+
+# --- avaliação ---------------------------------------------------------------
+def quality(scores, labels, threshold):
+    from sklearn.metrics import average_precision_score, roc_auc_score, f1_score
+
+    return {
+        'average_precision': float(average_precision_score(labels, scores)),
+        'roc_auc': float(roc_auc_score(labels, scores)),
+        'f1': float(f1_score(labels, scores >= threshold, zero_division=0)),
+    }
+
+
+def inference_cost(score_fn, X, repeats=3):
+    """Melhor tempo de `repeats` execuções, em microssegundos por linha (após um aquecimento)."""
+    X = np.asarray(X[:COST_SAMPLE])
+    score_fn(X[:256])
+    best = min(_timed(score_fn, X) for _ in range(repeats))
+    return best / len(X) * 1e6
+
+
+def _timed(fn, X):
+    t0 = time.perf_counter()
+    fn(X)
+    return time.perf_counter() - t0
+
+
+# --- trials ------------------------------------------------------------------
+def run_forest_trial(paths, params, model_path, n_jobs=1):
+    import joblib
+    from sklearn.ensemble import IsolationForest
+
+    X_train, X_val, y_val = open_shared(paths)
+    clf = IsolationForest(n_estimators=params['n_estimators'], contamination=params['contamination'],
+                          max_samples=parse_max_samples(params['max_samples']), n_jobs=n_jobs, random_state=42)
+    t0 = time.perf_counter()
+    clf.fit(X_train)
+    fit_seconds = time.perf_counter() - t0
+    # threshold no percentil (1 - contamination) dos scores de treino, maior = mais anômalo
+    threshold = float(np.percentile(-clf.score_samples(X_train), 100 * (1 - params['contamination'])))
+    scores = -clf.score_samples(X_val)
+    joblib.dump(clf, model_path)  # custo medido depois, fora do pool
+    return {'model': 'forest', 'params': params, 'status': 'ok', 'fit_seconds': fit_seconds,
+            'threshold': threshold, **quality(scores, y_val, threshold), 'model_path': str(model_path)}
+
+
+def _record_and_check(history, lock, step, loss, warmup, min_trials):
+    """Registra a loss deste trial no ponto `step` e diz se ele deve ser podado (acima da mediana dos outros)."""
+    with lock:
+        others = list(history.get(step, []))
+        history[step] = others + [loss]
+    return step >= warmup and len(others) >= min_trials and loss > float(np.median(others))
+
+
+def run_auto_trial(paths, params, model_path, history, lock, checks_per_epoch=4, warmup=2, min_trials=3, quantile=90):
+    import tensorflow as tf
+
+    X_train, X_val, y_val = open_shared(paths)
+    X_train = np.asarray(X_train)
+    X_val = np.asarray(X_val)
+    X_loss = X_val[np.asarray(y_val) == 0][:4096]  # loss de validação só em linhas normais
+    model = build_autoencoder(X_train.shape[1], latent=params['latent'])
+    steps_per_epoch = int(np.ceil(len(X_train) / params['batch']))
+    # mesmas frações de época em todos os trials, qualquer que seja o batch: pontos comparáveis na poda
+    check_at = {max(1, round(steps_per_epoch * (i + 1) / checks_per_epoch)) for i in range(checks_per_epoch)}
+    state = {'step': 0, 'pruned': False, 'losses': []}
+
+    class PruneOnValidationLoss(tf.keras.callbacks.Callback):
+        # avalia em frações fixas da época e interrompe o treino se o trial for podado
+        def on_train_batch_end(self, batch, logs=None):
+            if batch + 1 not in check_at:
+                return
+            loss = float(np.mean((X_loss - self.model(X_loss, training=False).numpy()) ** 2))
+            state['losses'].append(loss)
+            if _record_and_check(history, lock, state['step'], loss, warmup, min_trials):
+                state['pruned'] = True
+                self.model.stop_training = True
+            state['step'] += 1
+
+    t0 = time.perf_counter()
+    model.fit(X_train, X_train, epochs=params['epochs'], batch_size=params['batch'], verbose=0,
+              callbacks=[PruneOnValidationLoss()])
+    fit_seconds = time.perf_counter() - t0
+    result = {'model': 'autoencoder', 'params': params, 'fit_seconds': fit_seconds,
+              'checks': len(state['losses']), 'val_loss': state['losses'][-1] if state['losses'] else None}
+    if state['pruned']:
+        return {**result, 'status': 'pruned'}
+
+    threshold = float(np.percentile(auto_mse(model, X_train[:100000]), quantile))
+    model.save(model_path)
+    return {**result, 'status': 'ok', 'threshold': threshold, **quality(auto_mse(model, X_val), y_val, threshold),
+            'model_path': str(model_path)}
+
+
+def auto_mse(model, X):
+    return np.mean((X - model.predict(X, batch_size=65536, verbose=0)) ** 2, axis=1)
+
+
+def trial_cost(trial, X_val):
+    """Recarrega o modelo salvo pelo trial e mede o custo de inferência (chamado serialmente, após o pool)."""
+    if trial['model'] == 'forest':
+        import joblib
+        clf = joblib.load(trial['model_path'])
+        return inference_cost(clf.score_samples, X_val)
+    import tensorflow as tf
+    model = tf.keras.models.load_model(trial['model_path'])
+    return inference_cost(lambda X: auto_mse(model, X), X_val)
+
+
+# --- grade e Pareto ----------------------------------------------------------
+def grid(**space):
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def pareto_front(trials, objective='average_precision'):
+    """Trials não dominados: nenhum outro tem qualidade >= e custo <= (com uma desigualdade estrita)."""
+    done = sorted((t for t in trials if t['status'] == 'ok'), key=lambda t: (t['cost_us_per_row'], -t[objective]))
+    front, best = [], -np.inf
+    for t in done:
+        if t[objective] > best:
+            front.append(t)
+            best = t[objective]
+    return front
+
+
+def train_command(trial, features):
+    """Linha de comando do train_detection.py que reproduz o trial."""
+    p = trial['params']
+    if trial['model'] == 'forest':
+        flags = f"--contamination {p['contamination']} --n_estimators {p['n_estimators']} --max_samples {p['max_samples']}"
+    else:
+        flags = f"--epochs {p['epochs']} --batch {p['batch']} --latent {p['latent']}"
+    return f"python src/models/train_detection.py --features {features} {flags}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Busca paralela de hiperparâmetros do IsolationForest e do Autoencoder")
+    ap.add_argument('--features', required=True, help='CSV de features rotulado (coluna --label_col)')
+    ap.add_argument('--label_col', default='label')
+    ap.add_argument('--val_fraction', type=float, default=0.2, help='fração das linhas usada na validação')
+    ap.add_argument('--workdir', default='reports/search', help='matrizes compartilhadas (.npy, mmap) e resultado')
+    ap.add_argument('--out', default=None, help='JSON de saída (padrão: <workdir>/search.json)')
+    ap.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help='processos do pool')
+    ap.add_argument('--objective', choices=OBJECTIVES, default='average_precision', help='eixo de qualidade do Pareto')
+    ap.add_argument('--contamination', type=float, nargs='+', default=[0.05])
+    ap.add_argument('--n_estimators', type=int, nargs='+', default=[100, 200])
+    ap.add_argument('--max_samples', nargs='+', default=['auto', '256'])
+    ap.add_argument('--epochs', type=int, nargs='+', default=[30])
+    ap.add_argument('--batch', type=int, nargs='+', default=[64, 256])
+    ap.add_argument('--latent', type=int, nargs='+', default=[8, 16])
+    ap.add_argument('--no_auto', action='store_true', help='só trials do IsolationForest (não importa o TensorFlow)')
+    ap.add_argument('--checks_per_epoch', type=int, default=4, help='medições da loss de validação por época')
+    ap.add_argument('--prune_warmup', type=int, default=2, help='medições antes de permitir poda')
+    ap.add_argument('--prune_min_trials', type=int, default=3, help='trials já medidos no mesmo ponto para podar')
+    ap.add_argument('--quantile', type=float, default=90, help='percentil do threshold do autoencoder (como no treino)')
+    add_profile_args(ap)
+    args = ap.parse_args()
+    prof = Profiler.from_args(args, 'search_detectors', Path(args.workdir) / 'profiles')
+
+    if not os.path.exists(args.features):
+        print("[error] features csv not found:", args.features)
+        sys.exit(1)
+    with prof.stage('prepare_shared'):
+        try:
+            paths = prepare_shared(args.features, args.workdir, args.label_col, args.val_fraction)
+        except ValueError as e:
+            print("[error]", e)
+            sys.exit(1)
+    print(f"[ok] Dados pré-processados uma vez em {args.workdir} (train/val .npy, abertos via mmap pelos workers)")
+
+    forest_trials = grid(contamination=args.contamination, n_estimators=args.n_estimators, max_samples=args.max_samples)
+    auto_trials = [] if args.no_auto else grid(epochs=args.epochs, batch=args.batch, latent=args.latent)
+    print(f"[info] {len(forest_trials)} trials do forest + {len(auto_trials)} do autoencoder em {args.workers} processos")
+
+    results = []
+    trials_dir = Path(args.workdir) / 'trials'
+    trials_dir.mkdir(parents=True, exist_ok=True)
+    # spawn: processos limpos (o TensorFlow não tolera fork depois de inicializado)
+    ctx = mp.get_context('spawn')
+    with prof.stage('trials'), ctx.Manager() as manager, \
+            ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx) as pool:
+        history, lock = manager.dict(), manager.Lock()
+        futures = [pool.submit(run_forest_trial, paths, p, trials_dir / f'forest-{i}.joblib')
+                   for i, p in enumerate(forest_trials)]
+        futures += [pool.submit(run_auto_trial, paths, p, trials_dir / f'auto-{i}.keras', history, lock,
+                                args.checks_per_epoch, args.prune_warmup, args.prune_min_trials, args.quantile)
+                    for i, p in enumerate(auto_trials)]
+        for fut in as_completed(futures):
+            r = fut.result()
+            results.append(r)
+            detail = (f"{args.objective}={r[args.objective]:.4f} fit={r['fit_seconds']:.1f}s"
+                      if r['status'] == 'ok' else f"pruned after {r['checks']} checks (val_loss={r['val_loss']:.6f})")
+            print(f"[trial] {r['model']:<11} {r['params']} -> {detail}")
+
+    # custo de inferência com a máquina livre: um trial por vez, no mesmo processo (dentro do pool,
+    # os tempos de cada trial dependiam de quantos outros estavam treinando ao mesmo tempo)
+    with prof.stage('inference_cost'):
+        X_val = open_shared(paths)[1]
+        for r in results:
+            if r['status'] == 'ok':
+                r['cost_us_per_row'] = trial_cost(r, X_val)
+
+    front = pareto_front(results, args.objective)
+    for t in front:
+        t['train_command'] = train_command(t, args.features)
+    out = args.out or os.path.join(args.workdir, 'search.json')
+    with open(out, 'w') as f:
+        json.dump({'objective': args.objective, 'features': args.features, 'trials': results, 'pareto': front}, f, indent=2)
+    prof.close()
+
+    print(f"\n=== FRENTE DE PARETO ({args.objective} x custo de inferência) ===")
+    for t in front:
+        print(f"{t['model']:<11} {t[args.objective]:.4f}  {t['cost_us_per_row']:.2f}us/row  {t['params']}")
+    print(f"[ok] {len(results)} trials ({sum(r['status'] == 'pruned' for r in results)} podados) salvos em: {out}")
+
+
+if __name__ == '__main__':
+    main()
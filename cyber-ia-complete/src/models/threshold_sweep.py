@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Varredura vetorizada de thresholds para os detectores (sem refazer a inferência)
+- Entrada: scores brutos (iso_score / ae_mse) + rótulos, lidos em blocos (chunks)
+- Grade de thresholds por quantis (t-digest do primeiro passe): milhares de cortes por detector
+- Segundo passe: cada bloco vira um histograma por bin da grade e por rótulo (searchsorted + bincount);
+  a soma cumulativa ordenada do histograma dá TP/FP de todos os thresholds de uma vez
+- Regras de combinação: 'or' / 'and' sobre a grade 2D (iso x ae) e 'weighted'
+  (média ponderada dos scores normalizados por quantil, uma curva por peso)
+- Convenção: score maior = mais anômalo (iso_score do decision_function deve ser negado)
+"""
+import numpy as np
+
+from models.quantile_sketch import TDigest
+
+DEFAULT_THRESHOLDS = 1000
+DEFAULT_GRID_2D = 200
+DEFAULT_WEIGHTS = (0.25, 0.5, 0.75)
+
+
+def quantile_grid(sketch, n):
+    """n thresholds crescentes e únicos nos quantis do sketch (min e max incluídos)."""
+    return np.unique(sketch.quantile(np.linspace(0.0, 1.0, n)))
+
+
+def _bin(grid, scores):
+    # bin b = quantos thresholds são <= score: score >= grid[t] <=> bin > t
+    return np.searchsorted(grid, scores, side='right')
+
+
+def _counts_ge(hist):
+    """hist[..., b] por bin -> contagem com score >= grid[t] para cada t (soma cumulativa reversa)."""
+    return np.flip(np.cumsum(np.flip(hist, axis=-1), axis=-1), axis=-1)[..., 1:]
+
+
+def metrics_from_counts(tp, fp, n_pos, n_neg):
+    """Matrizes de confusão e métricas (arrays de qualquer forma) a partir de TP/FP por threshold."""
+    tp = np.asarray(tp, dtype=np.float64)
+    fp = np.asarray(fp, dtype=np.float64)
+    fn = n_pos - tp
+    tn = n_neg - fp
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+        recall = tp / n_pos if n_pos else np.zeros_like(tp)
+        fpr = fp / n_neg if n_neg else np.zeros_like(fp)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+            'precision': precision, 'recall': recall, 'fpr': fpr, 'f1': f1}
+
+
+def curve_areas(m):
+    """ROC AUC (trapézio) e average precision (degraus) de uma curva 1D ordenada por threshold."""
+    fpr = np.concatenate([[1.0], m['fpr'], [0.0]])
+    tpr = np.concatenate([[1.0], m['recall'], [0.0]])
+    roc_auc = float(-np.trapezoid(tpr, fpr)) if hasattr(np, 'trapezoid') else float(-np.trapz(tpr, fpr))
+    recall = np.concatenate([m['recall'], [0.0]])
+    average_precision = float(np.sum((recall[:-1] - recall[1:]) * m['precision']))
+    return roc_auc, average_precision
+
+
+class ThresholdSweep:
+    """
+    Acumulador de dois passes:
+        sweep = ThresholdSweep()
+        for iso, ae, y in blocos: sweep.observe(iso, ae)      # passe 1: grade de thresholds
+        sweep.fit_grid()
+        for iso, ae, y in blocos: sweep.update(iso, ae, y)    # passe 2: histogramas por rótulo
+        sweep.curves(), sweep.best()
+    ae pode ser None (só o IsolationForest é avaliado).
+    """
+
+    def __init__(self, n_thresholds=DEFAULT_THRESHOLDS, grid_2d=DEFAULT_GRID_2D, weights=DEFAULT_WEIGHTS):
+        self.n_thresholds = int(n_thresholds)
+        self.grid_2d = int(grid_2d)
+        self.weights = tuple(float(w) for w in weights)
+        self.sketches = {'iso': TDigest(), 'ae': TDigest()}
+        self.grids = None
+        self.n_pos = 0
+        self.n_neg = 0
+
+    # --- passe 1 -------------------------------------------------------------
+    def observe(self, iso, ae=None):
+        self.sketches['iso'].update(iso)
+        if ae is not None:
+            self.sketches['ae'].update(ae)
+        return self
+
+    def fit_grid(self):
+        names = [k for k, s in self.sketches.items() if s.count]
+        self.grids = {k: quantile_grid(self.sketches[k], self.n_thresholds) for k in names}
+        self.grids_2d = {k: quantile_grid(self.sketches[k], self.grid_2d) for k in names}
+        self.hist = {k: np.zeros((2, len(g) + 1), dtype=np.int64) for k, g in self.grids.items()}
+        self.weighted_grid = np.linspace(0.0, 1.0, self.n_thresholds)
+        if 'ae' in self.grids:
+            self.hist_2d = np.zeros((2, len(self.grids_2d['iso']) + 1, len(self.grids_2d['ae']) + 1), dtype=np.int64)
+            self.hist_weighted = np.zeros((len(self.weights), 2, self.n_thresholds + 1), dtype=np.int64)
+        return self
+
+    def _normalize(self, name, scores):
+        # score -> quantil aproximado em [0, 1] (mesma escala para os dois detectores na regra ponderada)
+        grid = self.grids[name]
+        return np.interp(scores, grid, np.linspace(0.0, 1.0, len(grid)))
+
+    # --- passe 2 -------------------------------------------------------------
+    def update(self, iso, ae, labels):
+        if self.grids is None:
+            raise RuntimeError("fit_grid() must run before update()")
+        y = (np.asarray(labels) != 0).astype(np.int64)
+        self.n_pos += int(y.sum())
+        self.n_neg += int(len(y) - y.sum())
+        iso = np.asarray(iso, dtype=np.float64)
+        nb = self.hist['iso'].shape[1]
+        self.hist['iso'] += np.bincount(y * nb + _bin(self.grids['iso'], iso), minlength=2 * nb).reshape(2, nb)
+        if 'ae' not in self.grids:
+            return self
+        ae = np.asarray(ae, dtype=np.float64)
+        nb = self.hist['ae'].shape[1]
+        self.hist['ae'] += np.bincount(y * nb + _bin(self.grids['ae'], ae), minlength=2 * nb).reshape(2, nb)
+
+        _, ni, na = self.hist_2d.shape
+        cell = _bin(self.grids_2d['iso'], iso) * na + _bin(self.grids_2d['ae'], ae)
+        self.hist_2d += np.bincount(y * ni * na + cell, minlength=2 * ni * na).reshape(2, ni, na)
+
+        qi, qa = self._normalize('iso', iso), self._normalize('ae', ae)
+        nb = self.n_thresholds + 1
+        for w, hist in zip(self.weights, self.hist_weighted):
+            b = _bin(self.weighted_grid, w * qi + (1 - w) * qa)
+            hist += np.bincount(y * nb + b, minlength=2 * nb).reshape(2, nb)
+        return self
+
+    # --- resultados ----------------------------------------------------------
+    def _metrics(self, hist):
+        ge = _counts_ge(hist)
+        return metrics_from_counts(ge[1], ge[0], self.n_pos, self.n_neg)
+
+    def curves(self):
+        """
+        {regra: {'threshold': ..., métricas...}}; 1D para 'iso', 'ae' e 'weighted_<w>',
+        2D (iso x ae) para 'or' / 'and' com 'threshold_iso' / 'threshold_ae'.
+        """
+        out = {}
+        for name, grid in self.grids.items():
+            out[name] = dict(threshold=grid, **self._metrics(self.hist[name]))
+        if 'ae' not in self.grids:
+            return out
+        for w, hist in zip(self.weights, self.hist_weighted):
+            out[f'weighted_{w:g}'] = dict(threshold=self.weighted_grid, **self._metrics(hist))
+
+        # 'and': score_iso >= ti e score_ae >= ta -> soma cumulativa reversa nos dois eixos
+        both = np.flip(np.cumsum(np.cumsum(np.flip(self.hist_2d, axis=(1, 2)), axis=1), axis=2), axis=(1, 2))[:, 1:, 1:]
+        # 'or' = N(iso >= ti) + N(ae >= ta) - N(ambos)
+        iso_ge = _counts_ge(self.hist_2d.sum(axis=2))[:, :, None]
+        ae_ge = _counts_ge(self.hist_2d.sum(axis=1))[:, None, :]
+        either = iso_ge + ae_ge - both
+        ti, ta = np.meshgrid(self.grids_2d['iso'], self.grids_2d['ae'], indexing='ij')
+        out['and'] = dict(threshold_iso=ti, threshold_ae=ta, **metrics_from_counts(both[1], both[0], self.n_pos, self.n_neg))
+        out['or'] = dict(threshold_iso=ti, threshold_ae=ta, **metrics_from_counts(either[1], either[0], self.n_pos, self.n_neg))
+        return out
+
+    def best(self, curves=None, metric='f1'):
+        """Melhor ponto de operação por regra (maior `metric`), com AUCs das curvas 1D."""
+        curves = curves or self.curves()
+        out = {}
+        for rule, m in curves.items():
+            i = np.unravel_index(np.argmax(m[metric]), m[metric].shape)
+            point = {k: float(v[i]) for k, v in m.items()}
+            if m[metric].ndim == 1:
+                point['roc_auc'], point['average_precision'] = curve_areas(m)
+            out[rule] = point
+        return out
+
+
+def curves_frame(curves):
+    """Curvas em formato longo (uma linha por regra x threshold) para CSV."""
+    import pandas as pd
+
+    frames = []
+    for rule, m in curves.items():
+        frame = pd.DataFrame({k: np.ravel(v) for k, v in m.items()})
+        frame.insert(0, 'rule', rule)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
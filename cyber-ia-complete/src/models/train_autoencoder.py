@@ -1,23 +1,28 @@
 import pandas as pd
 import os
+import sys
 import numpy as np
-from sklearn.preprocessing import StandardScaler
 import tensorflow as tf
 from tensorflow.keras import layers, models
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features.preprocessor import FeaturePreprocessor
+
 # Caminhos
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 DATA_PATH = os.path.join(BASE_DIR, "data", "processed", "features.csv")
 MODEL_DIR = os.path.join(BASE_DIR, "models", "autoencoder")
+PREP_PATH = os.path.join(BASE_DIR, "models", "preprocessor.json")
 
 os.makedirs(MODEL_DIR, exist_ok=True)
 
 print("Carregando dataset...")
 df = pd.read_csv(DATA_PATH)
 
-# Normalização
-scaler = StandardScaler()
-X = scaler.fit_transform(df)
+# Normalização (colunas + escala salvas para reutilização na inferência)
+prep = FeaturePreprocessor.fit(df)
+X = prep.transform(df)
+prep.save(PREP_PATH)
 
 input_dim = X.shape[1]
 
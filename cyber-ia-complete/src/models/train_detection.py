@@ -8,30 +8,110 @@ Entrada: CSV de features (linhas por 'src', colunas numéricas)
 Saída:
  - models/isof.joblib        -> {'model': clf, 'threshold': thresh}
  - models/auto_model/        -> pasta com modelo Keras + report.json (threshold, last_loss)
+ - models/preprocessor.json  -> colunas, dtypes e parâmetros de escala (reutilizado na inferência)
 """
 import os  # Importa módulo para manipulação de sistema de arquivos
+import sys  # Importa módulo para ajustar o sys.path
 import json  # Importa módulo para manipulação de dados JSON
 import argparse  # Importa módulo para parse de argumentos de linha de comando
 import joblib  # Importa módulo para salvar/carregar modelos de machine learning
 import numpy as np  # Importa biblioteca para computação numérica
 import pandas as pd  # Importa biblioteca para manipulação de dados tabulares
-from sklearn.ensemble import IsolationForest  # Importa algoritmo IsolationForest do scikit-learn
-import tensorflow as tf  # Importa framework TensorFlow para deep learning
+from pathlib import Path  # Importa utilitário de caminhos
 
-def train_isolation(features_csv, out_path, contamination=0.05, n_estimators=200):  # Função para treinar modelo IsolationForest
-    df = pd.read_csv(features_csv)
-    X = df.select_dtypes(include=[np.number]).fillna(0).values
-    clf = IsolationForest(n_estimators=n_estimators, contamination=contamination, random_state=42)  # Cria modelo IsolationForest com parâmetros
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # Permite importar os pacotes de src/
+from models.quantile_sketch import TDigest  # Importa sketch de quantis em streaming
+from models.registry import ModelRegistry  # Importa registro versionado de modelos
+from features.preprocessor import FeaturePreprocessor  # Importa artefato de pré-processamento
+from data.dataset_store import DatasetStore, parse_filters  # Importa dataset particionado (leitura por partição/coluna)
+from instrumentation.profiling import Profiler, add_profile_args  # Importa hooks opcionais de profiling
+
+def read_features(path, where=None, columns=None):  # CSV ou dataset particionado (pasta do load.py)
+    if DatasetStore.exists(path):  # Só as partições que casam com --where e só as colunas do modelo são lidas
+        store = DatasetStore(path)
+        return store.read(parse_filters(where), columns=[c for c in columns if c in store.columns] if columns else None)
+    if where:
+        raise ValueError("--where só se aplica a um dataset particionado (pasta com _dataset.json)")
+    return pd.read_csv(path)
+
+def load_features(features_csv, prep=None, recent=None, where=None):  # Lê os dados uma única vez e aplica (ou ajusta) o pré-processamento
+    df = read_features(features_csv, where, columns=prep.columns if prep is not None else None)
+    if recent:  # Mantém apenas as N linhas mais recentes (modo refresh)
+        df = df.tail(recent)
+    if prep is None:  # Treino completo: ajusta colunas/escala uma vez
+        prep = FeaturePreprocessor.fit(df)
+    return prep.transform(df), prep  # Matriz float32 já escalada + artefato
+
+def estimate_threshold(clf, X, q=90, sample_size=100000, random_state=42, batch_size=65536):  # Estima o threshold a partir de uma amostra das linhas
+    if sample_size and len(X) > sample_size:  # Só amostra quando o conjunto é maior que a amostra pedida
+        rng = np.random.default_rng(random_state)
+        X = X[rng.choice(len(X), size=sample_size, replace=False)]
+    sketch = TDigest()  # Sketch de quantis alimentado lote a lote (sem guardar todos os scores)
+    for start in range(0, len(X), batch_size):
+        sketch.update(-clf.score_samples(X[start:start + batch_size]))   # Scores de anomalia (maior = mais anômalo)
+    return sketch.percentile(q), sketch  # Threshold no percentil q + sketch para recalibração futura
+
+def train_isolation(X, out_path, contamination=0.05, n_estimators=200, max_samples='auto', n_jobs=-1, threshold_sample=100000):  # Função para treinar modelo IsolationForest
+    from sklearn.ensemble import IsolationForest  # Import tardio do scikit-learn (só quando a floresta é treinada)
+    clf = IsolationForest(n_estimators=n_estimators, contamination=contamination, max_samples=max_samples, n_jobs=n_jobs, random_state=42)  # Cria modelo IsolationForest com parâmetros (paralelo, subamostrado)
     clf.fit(X)  # Treina o modelo com os dados
-    scores = -clf.score_samples(X)   # Calcula scores de anomalia (maior = mais anômalo)
-    # threshold por percentil (ajustável)
-    thresh = float(np.percentile(scores, 90))  # Define threshold no percentil 90 dos scores
+    # threshold por percentil (ajustável), estimado sobre uma amostra
+    thresh, sketch = estimate_threshold(clf, X, q=90, sample_size=threshold_sample)  # Define threshold no percentil 90 dos scores
     os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)  # Cria diretório de saída se não existir
-    joblib.dump({'model': clf, 'threshold': thresh}, out_path)  # Salva modelo e threshold em arquivo joblib
+    joblib.dump({'model': clf, 'threshold': thresh, 'threshold_q': 90, 'score_sketch': sketch.to_dict()}, out_path)  # Salva modelo, threshold e sketch em arquivo joblib
     print(f"[ok] IsolationForest salvo em {out_path} (threshold={thresh:.6f})")  # Imprime mensagem de sucesso
     return thresh
 
+# Atributos privados por árvore do sklearn; nem todas as versões os têm (os caches de caminho só existem
+# nas mais recentes, _seeds em BaseBagging idem): cada um é fatiado apenas se existir
+PER_TREE_PRIVATE = ('_seeds', '_average_path_length_per_tree', '_decision_path_lengths')
+
+def check_forest_consistent(clf):  # Árvores, sementes e n_estimators precisam continuar alinhados
+    n_seeds = len(clf._seeds) if hasattr(clf, '_seeds') else len(clf.estimators_)
+    if not (len(clf.estimators_) == n_seeds == clf.n_estimators == len(clf.estimators_features_)):
+        raise RuntimeError(f"floresta inconsistente: {len(clf.estimators_)} árvores, {n_seeds} sementes, "
+                           f"n_estimators={clf.n_estimators}")
+
+def retire_oldest_trees(clf, n_old):  # Remove as n_old árvores mais antigas da floresta
+    if n_old <= 0:
+        return clf
+    clf.estimators_ = clf.estimators_[n_old:]  # Árvores ajustadas
+    clf.estimators_features_ = clf.estimators_features_[n_old:]  # Features usadas por árvore
+    for attr in PER_TREE_PRIVATE:  # Sementes (estimators_samples_) e caches de caminho por árvore, se a versão os tem
+        if hasattr(clf, attr):
+            setattr(clf, attr, getattr(clf, attr)[n_old:])
+    clf.n_estimators = len(clf.estimators_)  # Mantém n_estimators coerente com as árvores restantes
+    check_forest_consistent(clf)
+    return clf
+
+def refresh_isolation(X, model_path, n_new=50, n_jobs=-1, threshold_sample=100000):  # Atualiza a floresta com árvores novas sobre dados recentes
+    obj = joblib.load(model_path)
+    clf = obj.get('model', obj) if isinstance(obj, dict) else obj  # backwards compat
+    n_before = len(clf.estimators_)
+    fitted = obj.get('trees_fitted', n_before) if isinstance(obj, dict) else n_before  # Árvores já ajustadas desde o treino (inclui aposentadas)
+    # Todas as árvores precisam do mesmo tamanho de amostra (normalização do caminho): fixa o max_samples_ do treino
+    if len(X) < clf.max_samples_:
+        raise ValueError(f"refresh exige ao menos max_samples={clf.max_samples_} linhas (recebidas {len(X)}; aumente --recent)")
+    check_forest_consistent(clf)  # ex.: artefato de um refresh antigo que não guardava as sementes de todas as árvores
+    seeds = np.asarray(clf._seeds) if hasattr(clf, '_seeds') else None
+    # random_state derivado das árvores já ajustadas: cada refresh sorteia sementes novas
+    clf.set_params(warm_start=True, n_jobs=n_jobs, n_estimators=n_before + n_new, max_samples=clf.max_samples_,
+                   random_state=(42 + fitted) % 2**32)
+    clf.fit(X)  # Ajusta n_new árvores sobre os dados recentes (o sklearn guarda só as sementes deste lote)
+    if seeds is not None:
+        clf._seeds = np.concatenate([seeds, clf._seeds])
+    clf = retire_oldest_trees(clf, n_new)  # Aposenta as árvores mais antigas (tamanho da floresta constante)
+    clf.set_params(warm_start=False)
+    thresh, sketch = estimate_threshold(clf, X, q=90, sample_size=threshold_sample)  # Recalibra o threshold numa amostra dos dados recentes
+    if clf.contamination != 'auto':  # offset_ (predict/decision_function) recalculado com as árvores que ficaram
+        clf.offset_ = -sketch.percentile(100.0 * (1 - clf.contamination))
+    joblib.dump({'model': clf, 'threshold': thresh, 'threshold_q': 90, 'score_sketch': sketch.to_dict(),
+                 'trees_fitted': fitted + n_new}, model_path)  # Sobrescreve modelo, threshold e sketch
+    print(f"[ok] IsolationForest atualizado em {model_path} (+{n_new} árvores novas, -{n_new} antigas, threshold={thresh:.6f})")
+    return thresh
+
 def build_autoencoder(n_features, latent=16):  # Função para construir arquitetura do autoencoder
+    import tensorflow as tf  # Import tardio do TensorFlow (só quando o autoencoder é construído)
     inp = tf.keras.Input(shape=(n_features,))  # Define camada de entrada com número de features
     x = tf.keras.layers.Dense(128, activation='relu')(inp)  # Primeira camada densa com 128 neurônios e ativação ReLU
     x = tf.keras.layers.Dense(64, activation='relu')(x)  # Segunda camada densa com 64 neurônios
@@ -43,53 +123,120 @@ def build_autoencoder(n_features, latent=16):  # Função para construir arquite
     model.compile(optimizer='adam', loss='mse')  # Compila modelo com otimizador Adam e perda MSE
     return model  # Retorna modelo compilado
 
-def train_autoencoder(features_csv, out_dir, epochs=30, batch_size=64, latent=16):  # Função para treinar autoencoder
-    df = pd.read_csv(features_csv)
-    X = df.select_dtypes(include=[np.number]).fillna(0).values.astype('float32')  # Seleciona dados numéricos e converte para float32
+def train_autoencoder(X, out_dir, epochs=30, batch_size=64, latent=16):  # Função para treinar autoencoder (X já escalado, float32)
     n = X.shape[1]  # Obtém número de features (colunas)
     model = build_autoencoder(n, latent=latent)  # Constrói modelo autoencoder
     history = model.fit(X, X, epochs=epochs, batch_size=batch_size, validation_split=0.15, verbose=1)  # Treina modelo (entrada=saída para reconstrução)
-    recon = model.predict(X, verbose=0)  # Faz predição (reconstrução) dos dados
-    mse = np.mean((X - recon) ** 2, axis=1)  # Calcula erro quadrático médio por amostra
-    thresh = float(np.percentile(mse, 90))  # Define threshold no percentil 90 dos erros
+    sketch = TDigest()  # Sketch de quantis dos erros de reconstrução
+    for start in range(0, len(X), 65536):  # Reconstrói em lotes para não manter todos os erros em memória
+        batch = X[start:start + 65536]
+        recon = model.predict(batch, verbose=0)  # Faz predição (reconstrução) dos dados
+        sketch.update(np.mean((batch - recon) ** 2, axis=1))  # Erro quadrático médio por amostra
+    thresh = sketch.percentile(90)  # Define threshold no percentil 90 dos erros
     os.makedirs(out_dir, exist_ok=True)  # Cria diretório de saída se não existir
     model.save(out_dir + '.keras')  # Salva modelo Keras com extensão .keras
-    report = {'threshold': thresh, 'last_loss': float(history.history['loss'][-1])}  # Cria dicionário com threshold e última perda
+    report = {'threshold': thresh, 'threshold_q': 90, 'last_loss': float(history.history['loss'][-1]), 'score_sketch': sketch.to_dict()}  # Cria dicionário com threshold, última perda e sketch
     with open(os.path.join(out_dir, 'report.json'), 'w') as f:  # Abre arquivo JSON para escrita no diretório
         json.dump(report, f, indent=2)  # Escreve relatório em formato JSON
     print(f"[ok] Autoencoder salvo em {out_dir}.keras (threshold={thresh:.6f})")  # Imprime mensagem de sucesso
     return thresh
 
+def publish_to_registry(registry_root, args, prep, th_isof, th_auto=None, base=None):  # Publica os artefatos treinados como nova versão ativa
+    registry = ModelRegistry(registry_root)
+    components = {'forest': args.out_isof, 'preprocessor': args.out_prep}
+    if th_auto is not None:
+        components['autoencoder'] = args.out_auto + '.keras'
+        components['autoencoder_report'] = os.path.join(args.out_auto, 'report.json')
+    thresholds = {'isof': th_isof}
+    if th_auto is not None:
+        thresholds['auto'] = th_auto
+    version = registry.publish(
+        components, thresholds=thresholds,
+        feature_schema={'columns': prep.columns, 'dtypes': prep.dtypes},
+        metadata={'features': args.features, 'where': args.where, 'refresh': bool(args.refresh)},
+        base=base,
+    )
+    print(f"[ok] Versão publicada e ativada no registro {registry_root}: {version}")
+    return version
+
+def parse_max_samples(value):  # Interpreta --max_samples como 'auto', inteiro ou fração
+    if value == 'auto':
+        return value
+    return float(value) if '.' in str(value) else int(value)
+
 def main():  # Função principal do script
     ap = argparse.ArgumentParser()  # Cria parser de argumentos
-    ap.add_argument('--features', required=True, help='CSV de features (por src)')  # Adiciona argumento obrigatório para arquivo de features
+    ap.add_argument('--features', required=True, help='CSV de features (por src) ou pasta do dataset particionado')  # Adiciona argumento obrigatório para arquivo de features
+    ap.add_argument('--where', action='append', default=[], help="filtro de partição do dataset (ex.: label=0, attack_cat=DoS,Exploits)")  # Predicate pushdown
     ap.add_argument('--out_isof', default='models/isof.joblib', help='caminho para salvar IsolationForest')  # Adiciona argumento para caminho do modelo IsolationForest
     ap.add_argument('--out_auto', default='models/auto_model', help='diretório para salvar Autoencoder')  # Adiciona argumento para diretório do autoencoder
+    ap.add_argument('--out_prep', default='models/preprocessor.json', help='artefato de pré-processamento (colunas + escala)')  # Adiciona argumento para o pré-processador
     ap.add_argument('--contamination', type=float, default=0.05)  # Adiciona argumento para taxa de contaminação
     ap.add_argument('--n_estimators', type=int, default=200)  # Adiciona argumento para número de estimadores
     ap.add_argument('--epochs', type=int, default=30)  # Adiciona argumento para número de épocas
     ap.add_argument('--batch', type=int, default=64)  # Adiciona argumento para tamanho do batch
     ap.add_argument('--latent', type=int, default=16)  # Adiciona argumento para dimensão latente
+    ap.add_argument('--max_samples', default='auto', help="linhas por árvore ('auto', inteiro ou fração)")  # Subamostra por árvore
+    ap.add_argument('--n_jobs', type=int, default=-1, help='núcleos usados pelo IsolationForest (-1 = todos)')  # Paralelismo
+    ap.add_argument('--threshold_sample', type=int, default=100000, help='linhas amostradas para estimar o threshold (0 = todas)')  # Amostra do threshold
+    ap.add_argument('--refresh', action='store_true', help='adiciona árvores novas ao modelo existente e aposenta as mais antigas')  # Modo incremental
+    ap.add_argument('--n_new', type=int, default=50, help='árvores novas (e aposentadas) por refresh')  # Tamanho do refresh
+    ap.add_argument('--recent', type=int, default=None, help='usa apenas as N últimas linhas do CSV no refresh')  # Janela de dados recentes
+    ap.add_argument('--no_auto', action='store_true', help='treina só o IsolationForest (não importa o TensorFlow)')  # Execução sem autoencoder
+    ap.add_argument('--registry', default=None, help='pasta do registro de modelos (ex.: models/registry); publica e ativa uma nova versão')  # Registro versionado
+    add_profile_args(ap)  # Adiciona --profile / --profile_dir
     args = ap.parse_args()  # Faz parse dos argumentos da linha de comando
+    prof = Profiler.from_args(args, 'train_detection')  # Profiler (inativo sem --profile)
 
     print("Carregando features:", args.features)  # Imprime mensagem de carregamento
     if not os.path.exists(args.features):  # Verifica se arquivo de features existe
         raise FileNotFoundError(args.features)  # Lança exceção se arquivo não existir
 
+    max_samples = parse_max_samples(args.max_samples)  # Converte 'auto' / inteiro / fração
+
+    if args.refresh:  # Atualização incremental: apenas a floresta é renovada
+        if not os.path.exists(args.out_isof):
+            raise FileNotFoundError(args.out_isof)
+        if not os.path.exists(args.out_prep):  # O refresh reutiliza a escala do treino original (nunca reajusta)
+            raise FileNotFoundError(args.out_prep)
+        with prof.stage('load_features'):
+            X, prep = load_features(args.features, prep=FeaturePreprocessor.load(args.out_prep), recent=args.recent, where=args.where)
+        with prof.stage('refresh_isolation'):
+            th_isof = refresh_isolation(X, args.out_isof, n_new=args.n_new, n_jobs=args.n_jobs, threshold_sample=args.threshold_sample)
+        if args.registry:  # Nova versão herda o autoencoder da versão ativa
+            publish_to_registry(args.registry, args, prep, th_isof, base=ModelRegistry(args.registry).active_version())
+        print("Resumo do refresh:", json.dumps({'isof_path': args.out_isof, 'isof_threshold': th_isof}, indent=2))
+        prof.close()
+        return
+
+    # Lê o CSV uma vez, ajusta e salva o pré-processamento compartilhado pelos dois modelos
+    with prof.stage('load_features'):
+        X, prep = load_features(args.features, where=args.where)
+    prep.save(args.out_prep)
+    print(f"[ok] Pré-processamento salvo em {args.out_prep} ({prep.n_features} features)")
+
     # Treina IsolationForest
-    th_isof = train_isolation(args.features, args.out_isof, contamination=args.contamination, n_estimators=args.n_estimators)  # Treina modelo IsolationForest
+    with prof.stage('train_isolation'):
+        th_isof = train_isolation(X, args.out_isof, contamination=args.contamination, n_estimators=args.n_estimators, max_samples=max_samples, n_jobs=args.n_jobs, threshold_sample=args.threshold_sample)  # Treina modelo IsolationForest
 
     # Treina Autoencoder
-    th_auto = train_autoencoder(args.features, args.out_auto, epochs=args.epochs, batch_size=args.batch, latent=args.latent)  # Treina modelo autoencoder
+    th_auto = None
+    if not args.no_auto:
+        with prof.stage('train_autoencoder'):
+            th_auto = train_autoencoder(X, args.out_auto, epochs=args.epochs, batch_size=args.batch, latent=args.latent)  # Treina modelo autoencoder
 
     # resumo
     summary = {  # Inicia criação do dicionário de resumo
         'isof_path': args.out_isof,  # Caminho do modelo IsolationForest
         'isof_threshold': th_isof,  # Threshold do IsolationForest
         'auto_path': args.out_auto,  # Caminho do autoencoder
-        'auto_threshold': th_auto  # Threshold do autoencoder
+        'auto_threshold': th_auto,  # Threshold do autoencoder
+        'prep_path': args.out_prep  # Caminho do pré-processamento
     }  # Fecha dicionário de resumo
+    if args.registry:  # Publica forest + autoencoder + thresholds numa única versão
+        summary['registry_version'] = publish_to_registry(args.registry, args, prep, th_isof, th_auto)
     print("Resumo do treino:", json.dumps(summary, indent=2))  # Imprime resumo formatado em JSON
+    prof.close()  # Grava summary.json dos perfis (se --profile)
 
 if __name__ == '__main__':  # Verifica se script está sendo executado diretamente
     main()  # Chama função principal
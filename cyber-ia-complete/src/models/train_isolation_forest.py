@@ -1,8 +1,11 @@
 import pandas as pd
 import os
+import sys
 import joblib
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features.preprocessor import FeaturePreprocessor
 
 # Caminhos
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -14,9 +17,9 @@ os.makedirs(MODEL_PATH, exist_ok=True)
 print("Carregando dataset processado...")
 df = pd.read_csv(DATA_PATH)
 
-# Normalização
-scaler = StandardScaler()
-X = scaler.fit_transform(df)
+# Normalização (colunas + escala salvas para reutilização na inferência)
+prep = FeaturePreprocessor.fit(df)
+X = prep.transform(df)
 
 print("Treinando Isolation Forest...")
 model = IsolationForest(
@@ -28,9 +31,9 @@ model = IsolationForest(
 
 model.fit(X)
 
-# Salvar modelo e scaler
+# Salvar modelo e pré-processamento
 joblib.dump(model, os.path.join(MODEL_PATH, "isolation_forest.joblib"))
-joblib.dump(scaler, os.path.join(MODEL_PATH, "scaler.joblib"))
+prep.save(os.path.join(MODEL_PATH, "preprocessor.json"))
 
 print("Modelo treinado com sucesso!")
 print("Arquivos salvos em /models")
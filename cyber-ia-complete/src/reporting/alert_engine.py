@@ -0,0 +1,206 @@
+# src/reporting/alert_engine.py
+"""
+Agregação e supressão de alertas (incidentes em vez de um alerta por host sinalizado)
+- Hosts sinalizados são agrupados por (sub-rede, assinatura): sub-rede /24 (IPv4) ou /64 (IPv6);
+  assinatura = as `signature_k` primeiras features da explicação do autoencoder (ordenadas),
+  ou só o IsolationForest quando não há explicação
+- Estado limitado entre execuções: <dir>/state.npy (array estruturado por chave de incidente:
+  primeira/última vez visto, nível e nº de hosts do último envio, contadores), gravado de forma atômica;
+  acima de max_entries saem os incidentes vistos há mais tempo; os que sumiram por mais de
+  `window` segundos expiram e voltam como novos
+- Emite só incidentes novos, escalados (nível maior ou nº de hosts >= escalate_ratio x o último envio)
+  ou, opcionalmente, lembretes a cada `renotify` segundos; o resto só incrementa `suppressed`
+- Nível: 1 = um detector; 2 = os dois detectores em algum host; 3 = nível 2 com >= escalate_hosts hosts
+- Saída: <dir>/incidents.json (resumo + incidentes emitidos nesta execução), lido pela API
+"""
+import os
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from features.ip_codec import FAMILY_INVALID, FAMILY_V4, FAMILY_V6, decode_ips
+
+STATE_FILE = 'state.npy'
+INCIDENTS_FILE = 'incidents.json'
+DEFAULT_WINDOW = 86400
+DEFAULT_MAX_ENTRIES = 100_000
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+STATE_DTYPE = np.dtype([('key', '<u8'), ('family', 'u1'), ('subnet', '<u8'), ('signature', '<u8'),
+                        ('first_seen', '<i8'), ('last_seen', '<i8'), ('last_emitted', '<i8'),
+                        ('emitted_level', 'i1'), ('emitted_hosts', '<i8'), ('runs', '<i8'), ('suppressed', '<i8')])
+
+
+def host_subnets(table, rows, prefix4=24, prefix6=64):
+    """(família, prefixo da sub-rede uint64) das linhas; texto que não é IP vira a própria chave do host."""
+    d = table.data[rows]
+    if table.ipv4_only:
+        return np.full(len(d), FAMILY_V4, dtype=np.uint8), d['ip'].astype(np.uint64) >> np.uint64(32 - prefix4)
+    family = d['ip_family'].copy()
+    subnet = np.zeros(len(d), dtype=np.uint64)
+    v4 = family == FAMILY_V4
+    subnet[v4] = d['ip_lo'][v4] >> np.uint64(32 - prefix4)
+    v6 = family == FAMILY_V6
+    subnet[v6] = d['ip_hi'][v6] >> np.uint64(64 - min(prefix6, 64))
+    bad = family == FAMILY_INVALID
+    if bad.any():
+        names = np.array([table.ip_names.get(int(r), '') for r in np.asarray(rows)[bad]], dtype=object)
+        subnet[bad] = pd.util.hash_array(names)
+    return family, subnet
+
+
+def signatures(table, rows, k=2):
+    """Assinatura uint64 por linha: até 4 índices de coluna (top-k da explicação, ordenados) de 16 bits; 0 = sem explicação."""
+    k = min(k, 4, table.topk)
+    if not table.has_auto or k == 0:
+        return np.zeros(len(rows), dtype=np.uint64)
+    idx = np.sort(table.data['top_idx'][rows][:, :k].astype(np.int64), axis=1)
+    sig = np.zeros(len(rows), dtype=np.uint64)
+    for j in range(k):
+        sig = (sig << np.uint64(16)) | (idx[:, j] + 1).astype(np.uint64)  # -1 (sem feature) vira 0
+    return sig
+
+
+def signature_columns(sig, columns):
+    out = []
+    while sig:
+        i = int(sig & 0xFFFF) - 1
+        if i >= 0:
+            out.append(columns[i] if i < len(columns) else str(i))
+        sig >>= 16
+    return out[::-1]
+
+
+def subnet_text(family, subnet, prefix4=24, prefix6=64):
+    if family == FAMILY_V4:
+        return f"{decode_ips([0], [int(subnet) << (32 - prefix4)], [FAMILY_V4])[0]}/{prefix4}"
+    if family == FAMILY_V6:
+        return f"{decode_ips([int(subnet) << (64 - prefix6)], [0], [FAMILY_V6])[0]}/{prefix6}"
+    return None
+
+
+class AlertEngine:
+    def __init__(self, state_dir, window=DEFAULT_WINDOW, renotify=0, escalate_ratio=2.0, escalate_hosts=10,
+                 signature_k=2, max_entries=DEFAULT_MAX_ENTRIES, max_hosts_listed=20):
+        self.dir = Path(state_dir)
+        self.window = int(window)
+        self.renotify = int(renotify)
+        self.escalate_ratio = float(escalate_ratio)
+        self.escalate_hosts = int(escalate_hosts)
+        self.signature_k = int(signature_k)
+        self.max_entries = int(max_entries)
+        self.max_hosts_listed = int(max_hosts_listed)
+        self.state = self._load()
+
+    def _load(self):
+        path = self.dir / STATE_FILE
+        if path.exists():
+            try:
+                data = np.load(path, allow_pickle=False)
+                if data.dtype == STATE_DTYPE:
+                    return data  # ordenado por key no save()
+            except (OSError, ValueError):
+                pass  # estado corrompido: recomeça vazio (tudo volta como novo)
+        return np.zeros(0, dtype=STATE_DTYPE)
+
+    def process(self, table, now=None):
+        """Agrupa os hosts sinalizados de `table`, decide o que emitir e atualiza o estado. Devolve o relatório."""
+        now = int(time.time() if now is None else now)
+        rows = table.flagged()
+        d = table.data[rows]
+        family, subnet = host_subnets(table, rows)
+        sig = signatures(table, rows, self.signature_k)
+        keys = (pd.util.hash_array(subnet) * _MIX) ^ pd.util.hash_array(sig) ^ family.astype(np.uint64)
+        uniq, first, inv = np.unique(keys, return_index=True, return_inverse=True)
+        inv = inv.reshape(-1)
+        n = len(uniq)
+
+        hosts = np.bincount(inv, minlength=n)
+        both = np.bincount(inv, weights=(d['isof_flag'] == 1) & (d['auto_flag'] == 1), minlength=n) > 0
+        level = np.where(both, np.where(hosts >= self.escalate_hosts, 3, 2), 1).astype(np.int8)
+        max_isof = np.full(n, -np.inf)
+        np.fmax.at(max_isof, inv, d['isof_score'])
+        max_auto = np.full(n, np.nan)
+        np.fmax.at(max_auto, inv, d['auto_mse'])
+
+        # estado: incidentes ainda ativos (vistos dentro da janela); os outros expiram
+        st = self.state[self.state['last_seen'] >= now - self.window]
+        pos = np.searchsorted(st['key'], uniq)
+        pos_c = np.minimum(pos, max(len(st) - 1, 0))
+        known = (pos < len(st)) & (st['key'][pos_c] == uniq) if len(st) else np.zeros(n, dtype=bool)
+        prev = st[pos_c] if len(st) else np.zeros(n, dtype=STATE_DTYPE)
+        new = ~known
+        escalated = known & ((level > prev['emitted_level']) | (hosts >= np.ceil(prev['emitted_hosts'] * self.escalate_ratio)))
+        renotify = known & ~escalated & (self.renotify > 0) & (now - prev['last_emitted'] >= self.renotify)
+        emit = new | escalated | renotify
+
+        cur = np.zeros(n, dtype=STATE_DTYPE)
+        cur['key'], cur['family'], cur['subnet'], cur['signature'] = uniq, family[first], subnet[first], sig[first]
+        cur['first_seen'] = np.where(known, prev['first_seen'], now)
+        cur['last_seen'] = now
+        cur['last_emitted'] = np.where(emit, now, prev['last_emitted'])
+        cur['emitted_level'] = np.where(emit, level, prev['emitted_level'])
+        cur['emitted_hosts'] = np.where(emit, hosts, prev['emitted_hosts'])
+        cur['runs'] = np.where(known, prev['runs'], 0) + 1
+        cur['suppressed'] = np.where(known, prev['suppressed'], 0) + ~emit
+        rest = st[~np.isin(st['key'], uniq)]
+        self.state = np.concatenate([cur, rest])
+
+        # hosts de cada incidente emitido (até max_hosts_listed), agrupados com uma ordenação só
+        order = np.argsort(inv, kind='stable')
+        starts = np.searchsorted(inv[order], np.arange(n))
+        ips = table.ips(rows)
+        incidents = []
+        for g in np.flatnonzero(emit):
+            members = order[starts[g]:starts[g] + min(hosts[g], self.max_hosts_listed)]
+            reason = 'new' if new[g] else 'escalated' if escalated[g] else 'renotify'
+            incidents.append({
+                'id': f'{int(uniq[g]):016x}',
+                'reason': reason,
+                'level': int(level[g]),
+                'subnet': subnet_text(int(family[first[g]]), int(subnet[first[g]])),
+                'signature': signature_columns(int(sig[first[g]]), table.columns) if sig[first[g]] else ['isolation_forest'],
+                'host_count': int(hosts[g]),
+                'hosts': [str(ips[m]) for m in members],
+                'max_isof_score': float(max_isof[g]),
+                'max_auto_mse': None if np.isnan(max_auto[g]) else float(max_auto[g]),
+                'first_seen': int(cur['first_seen'][g]),
+                'last_seen': now,
+                'runs': int(cur['runs'][g]),
+                'suppressed': int(cur['suppressed'][g]),
+            })
+        incidents.sort(key=lambda i: (-i['level'], -i['host_count']))
+        return {
+            'summary': {
+                'ts': now,
+                'flagged_hosts': int(len(rows)),
+                'incidents_active': int(n),
+                'emitted': int(emit.sum()),
+                'new': int(new.sum()),
+                'escalated': int(escalated.sum()),
+                'renotified': int(renotify.sum()),
+                'suppressed': int(n - emit.sum()),
+                'state_entries': int(min(len(self.state), self.max_entries)),
+            },
+            'incidents': incidents,
+        }
+
+    def save(self, report=None):
+        st = self.state
+        if len(st) > self.max_entries:
+            keep = np.argpartition(-st['last_seen'], self.max_entries - 1)[:self.max_entries]
+            st = st[keep]
+        self.state = st[np.argsort(st['key'], kind='stable')]
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / (STATE_FILE + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.save(f, self.state)
+        os.replace(tmp, self.dir / STATE_FILE)
+        if report is not None:
+            tmp = self.dir / (INCIDENTS_FILE + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(report, f)
+            os.replace(tmp, self.dir / INCIDENTS_FILE)
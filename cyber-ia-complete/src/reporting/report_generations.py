@@ -0,0 +1,129 @@
+# src/reporting/report_generations.py
+"""
+Publicação da tabela de resultados por geração (leitura por vários processos da API)
+- publish(): grava a tabela em <base>.generations/g<n>.{npy,index.npy,meta.json} e só depois troca,
+  de forma atômica, o contador <base>.generation ({"generation": n, ...}); as gerações antigas saem
+  depois de `keep` publicações (quem ainda as mapeia continua lendo o inode até soltar)
+- GenerationReader.get(): em cada processo, um stat do contador por requisição; a tabela só é
+  reaberta quando a geração muda, e só o meta.json (pequeno) é parseado: dados e índice de IPs são
+  mmap somente leitura, com as páginas compartilhadas entre os workers pelo cache do sistema
+- publish_once(): conversões (ex.: infer.json antigo) feitas por um único processo, sob flock;
+  os outros encontram a geração já publicada para a mesma origem
+- publish_with_json(): o infer_and_act grava o infer.json e a geração sob o mesmo flock, com a
+  origem = chave do JSON; a API que vê esse JSON como o mais recente espera o lock e encontra a
+  geração já publicada (nunca reconverte o JSON da própria execução)
+"""
+import os
+import json
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock (um único escritor por vez fica a cargo de quem publica)
+    fcntl = None
+
+from reporting.results_table import ResultsTable
+
+DEFAULT_KEEP = 2
+
+
+def generation_file(base):
+    return Path(f'{base}.generation')
+
+
+def generations_dir(base):
+    return Path(f'{base}.generations')
+
+
+def read_generation(base):
+    """Conteúdo do contador de gerações, ou None se nada foi publicado."""
+    try:
+        with open(generation_file(base)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def source_key(path):
+    """Identidade de um arquivo de origem (mtime, tamanho, inode): independe de caminho relativo/absoluto."""
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+@contextmanager
+def _locked(base):
+    generations_dir(base).mkdir(parents=True, exist_ok=True)
+    with open(generations_dir(base) / '.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def publish(table, base, keep=DEFAULT_KEEP, source=None):
+    """Grava `table` como a próxima geração e a torna visível para os leitores. Devolve o número."""
+    with _locked(base):
+        return _publish(table, base, keep, source)
+
+
+def _publish(table, base, keep, source):
+    current = read_generation(base)
+    gen = (current['generation'] if current else 0) + 1
+    gdir = generations_dir(base)
+    table.save(gdir / f'g{gen}')
+    info = {'generation': gen, 'table': f'g{gen}', 'n_rows': len(table), 'source': source}
+    tmp = Path(str(generation_file(base)) + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(info, f)
+    os.replace(tmp, generation_file(base))
+    for old in gdir.glob('g*.meta.json'):
+        n = old.name[1:-len('.meta.json')]
+        if n.isdigit() and int(n) <= gen - keep:
+            for suffix in ('.meta.json', '.npy', '.index.npy'):
+                p = gdir / f'g{n}{suffix}'
+                if p.exists():
+                    p.unlink()
+    return gen
+
+
+def publish_once(base, source, build):
+    """
+    Publica build() como geração, a menos que a geração atual já venha de `source` (convertida por
+    outro processo). flock num arquivo ao lado do contador serializa os processos. Devolve a geração.
+    """
+    with _locked(base):
+        current = read_generation(base)
+        if current and current.get('source') == source:
+            return current['generation']
+        return _publish(build(), base, DEFAULT_KEEP, source)
+
+
+def publish_with_json(table, base, json_path, keep=DEFAULT_KEEP):
+    """Grava `json_path` (ResultsTable.write_json) e a geração correspondente atomicamente para os leitores."""
+    with _locked(base):
+        table.write_json(json_path)
+        return _publish(table, base, keep, source_key(json_path))
+
+
+class GenerationReader:
+    def __init__(self, base):
+        self.base = Path(base)
+        self.generation = None
+        self.table = None
+        self._key = None
+
+    def exists(self):
+        return generation_file(self.base).exists()
+
+    def get(self):
+        """Tabela da geração atual (reaberta só quando o contador muda)."""
+        path = generation_file(self.base)
+        st = path.stat()
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if key != self._key:
+            info = read_generation(self.base)
+            if info['generation'] != self.generation:
+                self.table = ResultsTable.load(generations_dir(self.base) / info['table'])
+                self.generation = info['generation']
+            self._key = key
+        return self.table
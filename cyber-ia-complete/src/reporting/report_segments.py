@@ -0,0 +1,227 @@
+# src/reporting/report_segments.py
+"""
+Relatório da inferência gravado em segmentos enquanto os lotes são pontuados
+- <dir>/<run_id>-<n>.npy: linhas de um lote no mesmo array estruturado da ResultsTable (+ .index.npy: IPs ordenados)
+- <dir>/manifest.json (pequeno, trocado de forma atômica a cada segmento): run_id, segmentos
+  (arquivo, linhas, offset, nomes não-IP e ações reais com índice global), resumo parcial, complete
+- Uma execução interrompida deixa os segmentos já gravados legíveis (complete=false)
+- O manifesto de uma execução só aparece com o primeiro segmento; até lá a API serve a última geração
+  completa. Depois, o resumo parcial leva complete=false e n_hosts_total (resultado parcial explícito)
+- SegmentReader.refresh(): mapeia só os segmentos novos desde a última leitura (mmap somente leitura,
+  linhas indexadas por offset do segmento, sem cópia; índice de IPs <run_id>-<n>.index.npy e hosts
+  sinalizados acrescentados); uma execução nova (run_id diferente) recomeça do zero, inclusive quando
+  os segmentos listados já foram apagados por ela
+"""
+import os
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from features.ip_codec import CidrIndex
+from reporting.results_table import ResultsTable, results_dtype
+
+MANIFEST = 'manifest.json'
+
+
+def _atomic_json(path, obj):
+    tmp = Path(str(path) + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+class SegmentWriter:
+    def __init__(self, root, columns=(), has_auto=True, run_id=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.run_id = run_id or f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{time.time_ns() % 10**9:09d}"
+        self.parts = []
+        # o manifesto só é trocado no primeiro segmento: até lá a API continua na última geração completa
+        self.manifest = {'run_id': self.run_id, 'complete': False, 'columns': list(columns),
+                         'has_auto': bool(has_auto), 'n_rows': 0, 'summary': {}, 'segments': []}
+
+    def append(self, part, summary=None):
+        """Grava as linhas de `part` (ResultsTable de um lote) + seu índice de IPs e publica o segmento no manifesto."""
+        offset = self.manifest['n_rows']
+        name = f"{self.run_id}-{len(self.manifest['segments'])}"
+        for suffix, data in (('.npy', part.data), ('.index.npy', part.index.to_array())):
+            tmp = self.root / (name + suffix + '.tmp')
+            with open(tmp, 'wb') as f:
+                np.save(f, data)
+            os.replace(tmp, self.root / (name + suffix))
+        self.manifest['segments'].append({
+            'file': name + '.npy', 'index': name + '.index.npy', 'rows': len(part), 'offset': offset,
+            'ip_names': {str(offset + k): v for k, v in part.ip_names.items()},
+            'action_details': {str(offset + k): v for k, v in part.action_details.items()},
+        })
+        self.manifest['n_rows'] = offset + len(part)
+        if summary is not None:
+            self.manifest['summary'] = summary
+        _atomic_json(self.root / MANIFEST, self.manifest)
+        if not self.parts:
+            self._drop_previous_runs()  # leitores já passaram para esta execução (quem mapeia os antigos segue lendo o inode)
+        self.parts.append(part)
+
+    def _drop_previous_runs(self):
+        for p in self.root.glob('*.npy'):
+            if not p.name.startswith(f'{self.run_id}-'):
+                p.unlink()
+
+    def finish(self, summary):
+        """Marca a execução como completa e devolve a tabela inteira (concatenação dos lotes)."""
+        self.manifest['summary'] = summary
+        self.manifest['complete'] = True
+        if self.parts:  # sem linhas a execução não publica segmentos: a geração final basta
+            _atomic_json(self.root / MANIFEST, self.manifest)
+        ip_names, action_details = {}, {}
+        for seg in self.manifest['segments']:
+            ip_names.update(seg['ip_names'])
+            action_details.update(seg['action_details'])
+        if not self.parts:
+            data = np.zeros(0, dtype=results_dtype(True, 0))
+        else:
+            data = self.parts[0].data if len(self.parts) == 1 else np.concatenate([p.data for p in self.parts])
+        return ResultsTable(data, dict(summary, complete=True), self.manifest['columns'], self.manifest['has_auto'],
+                            ip_names, action_details)
+
+
+def _append_to(buf, n, values):
+    """Copia `values` para buf[n:], dobrando a capacidade quando falta espaço (custo amortizado O(len(values)))."""
+    if n + len(values) > len(buf):
+        grown = np.empty(max(2 * len(buf), n + len(values), 1), dtype=buf.dtype)
+        grown[:n] = buf[:n]
+        buf = grown
+    buf[n:n + len(values)] = values
+    return buf
+
+
+class SegmentedRows:
+    """
+    Linhas de vários segmentos mapeados (np.load mmap_mode='r') vistas como um único array estruturado,
+    sem concatenar: linhas pedidas são buscadas no segmento certo pelo offset. As páginas mapeadas são
+    as do arquivo (compartilhadas entre os workers da API), não cópias privadas.
+    """
+
+    def __init__(self, segments, offsets):
+        self.segments = list(segments)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.n_rows = int(self.offsets[-1] + len(self.segments[-1])) if self.segments else 0
+        self.dtype = self.segments[0].dtype if self.segments else results_dtype(True, 0)
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def nbytes(self):
+        return self.n_rows * self.dtype.itemsize
+
+    def __getitem__(self, key):
+        if isinstance(key, str):  # coluna inteira (ex.: to_frame): O(total), fora das rotas por página
+            return (np.concatenate([seg[key] for seg in self.segments]) if self.segments
+                    else np.zeros(0, dtype=self.dtype[key]))
+        if isinstance(key, slice):
+            key = np.arange(self.n_rows)[key]
+        if np.ndim(key) == 0:
+            k = int(np.searchsorted(self.offsets, key, side='right')) - 1
+            return self.segments[k][int(key) - self.offsets[k]]
+        rows = np.asarray(key, dtype=np.int64)
+        out = np.empty(len(rows), dtype=self.dtype)
+        which = np.searchsorted(self.offsets, rows, side='right') - 1
+        for k in np.unique(which):
+            mask = which == k
+            out[mask] = self.segments[k][rows[mask] - self.offsets[k]]
+        return out
+
+
+class SegmentIndex:
+    """Índices de IP ordenados de cada segmento (gravados pelo writer): consulta = busca binária em cada um + offset."""
+
+    def __init__(self, parts=()):
+        self.parts = list(parts)  # [(offset, CidrIndex)]
+
+    def _rows(self, query):
+        rows = [offset + query(index) for offset, index in self.parts]
+        return np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+
+    def network_rows(self, network):
+        return self._rows(lambda index: index.network_rows(network))
+
+    def lookup(self, ip):
+        return self._rows(lambda index: index.lookup(ip))
+
+
+class SegmentReader:
+    """
+    Tabela da execução em andamento mantida entre refresh(): cada segmento é mapeado (mmap, somente
+    leitura) e a tabela os indexa por offset, sem cópia; o índice de IPs e os hosts sinalizados são
+    acrescentados segmento a segmento. Cada refresh custa O(linhas novas), não O(total).
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._reset(None)
+
+    def _reset(self, run_id):
+        self.run_id = run_id
+        self.n_segments = 0
+        self.n_rows = 0
+        self._segments, self._offsets = [], []
+        self._index_parts = []
+        self._flagged, self.n_flagged = np.empty(0, dtype=np.int64), 0
+        self.ip_names, self.action_details = {}, {}
+
+    def release(self):
+        """Esquece a execução mapeada (chamado quando uma geração completa mais nova a substitui)."""
+        self._reset(None)
+
+    @staticmethod
+    def exists(root):
+        return (Path(root) / MANIFEST).exists()
+
+    def _append(self, seg):
+        data = np.load(self.root / seg['file'], mmap_mode='r', allow_pickle=False)
+        index_path = self.root / seg['index'] if seg.get('index') else None
+        if index_path is not None and index_path.exists():
+            index = CidrIndex.from_array(np.load(index_path, mmap_mode='r', allow_pickle=False))
+        else:  # segmentos sem índice gravado: ordenado aqui, uma vez por segmento
+            index = ResultsTable(data).index
+        self._segments.append(data)
+        self._offsets.append(self.n_rows)
+        self._index_parts.append((self.n_rows, index))
+        flagged = self.n_rows + np.flatnonzero(data['combined_flag'] == 1)
+        self._flagged = _append_to(self._flagged, self.n_flagged, flagged)
+        self.n_flagged += len(flagged)
+        self.ip_names.update(seg['ip_names'])
+        self.action_details.update(seg['action_details'])
+        self.n_rows += len(data)
+        self.n_segments += 1
+
+    def _read_new(self):
+        with open(self.root / MANIFEST) as f:
+            manifest = json.load(f)
+        if manifest['run_id'] != self.run_id or len(manifest['segments']) < self.n_segments:
+            self._reset(manifest['run_id'])
+        for seg in manifest['segments'][self.n_segments:]:
+            self._append(seg)
+        return manifest
+
+    def refresh(self, retries=3):
+        """Tabela com todos os segmentos publicados; só os novos são lidos."""
+        for attempt in range(retries):
+            try:
+                manifest = self._read_new()
+                break
+            except FileNotFoundError:
+                # uma execução nova trocou o manifesto e apagou os segmentos da anterior entre a leitura
+                # do manifesto e a dos arquivos: recomeça pelo manifesto novo
+                self._reset(None)
+                if attempt == retries - 1:
+                    raise
+        data = SegmentedRows(self._segments, self._offsets)
+        summary = dict(manifest['summary'], complete=manifest['complete'])
+        table = ResultsTable(data, summary, manifest['columns'], manifest['has_auto'], self.ip_names, self.action_details)
+        table._index = SegmentIndex(self._index_parts)  # cópia: tabelas já entregues não veem segmentos novos
+        table._flagged = self._flagged[:self.n_flagged]
+        return table
@@ -0,0 +1,317 @@
+# src/reporting/results_table.py
+"""
+Resultados da inferência em formato colunar (um array estruturado NumPy, sem dict por host)
+- IPs empacotados: uint32 quando todos são IPv4, senão uint128 (ip_hi/ip_lo) + família
+- top-K do autoencoder como índices int16 num dicionário de colunas compartilhado + erros float32
+- ação por host como código uint8; só bloqueios reais (raros) guardam o dict completo
+- records()/iter_json(): os dicts do relatório são montados só para a página pedida;
+  a explicação só é expandida em nomes de colunas quando pedida (expand=True)
+- find()/in_network(): IP exato ou sub-rede CIDR via índice ordenado (construído uma vez, sob demanda)
+- save()/load(): <base>.npy (mmap) + <base>.index.npy (índice de IPs pronto, mmap) + <base>.meta.json
+  (resumo, colunas, exceções); processos que abrem a mesma tabela compartilham as páginas
+"""
+import os
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from features.ip_codec import FAMILY_INVALID, FAMILY_V4, INDEX_DTYPE, CidrIndex, encode_ips, decode_ipv4, decode_ips
+
+FORMAT_VERSION = 1
+BLOCK_CMD = "iptables -A INPUT -s {ip} -j DROP"
+
+ACTION_NONE = 0
+ACTION_DRY_RUN = 1
+ACTION_EXECUTED = 2
+ACTION_FAILED = 3
+ACTION_NOTES = {ACTION_NONE: 'no action', ACTION_DRY_RUN: 'dry-run', ACTION_EXECUTED: '', ACTION_FAILED: ''}
+
+SCORE_FIELDS = [('isof_score', '<f8'), ('auto_mse', '<f8'),
+                ('isof_flag', 'i1'), ('auto_flag', 'i1'), ('combined_flag', 'i1'), ('action', 'u1')]
+
+
+def results_dtype(ipv4_only, topk):
+    ip_fields = [('ip', '<u4')] if ipv4_only else [('ip_hi', '<u8'), ('ip_lo', '<u8'), ('ip_family', 'u1')]
+    top_fields = [('top_idx', '<i2', (topk,)), ('top_err', '<f4', (topk,))] if topk else []
+    return np.dtype(ip_fields + SCORE_FIELDS + top_fields)
+
+
+def _save_npy(data):
+    def write(tmp):
+        with open(tmp, 'wb') as f:
+            np.save(f, data)
+    return write
+
+
+def _atomic_write(path, write):
+    tmp = Path(str(path) + '.tmp')
+    write(tmp)
+    os.replace(tmp, path)
+
+
+class ResultsTable:
+    def __init__(self, data, summary=None, columns=(), has_auto=True, ip_names=None, action_details=None):
+        self.data = data
+        self.summary = dict(summary or {})
+        self.columns = list(columns)
+        self.has_auto = bool(has_auto)
+        self.ip_names = {int(k): v for k, v in (ip_names or {}).items()}  # linha -> texto que não é IP
+        self.action_details = {int(k): v for k, v in (action_details or {}).items()}
+        self.topk = data.dtype['top_idx'].shape[0] if 'top_idx' in data.dtype.names else 0
+        self.ipv4_only = 'ip' in data.dtype.names
+        self._index = None
+        self._flagged = None
+
+    @classmethod
+    def build(cls, src_ips, isof_score, isof_flag, auto_mse, auto_flag, combined_flag,
+              top_idx=None, top_err=None, columns=(), has_auto=True, summary=None, ipv4_only=None):
+        # ipv4_only fixo: lotes de uma mesma execução (report_segments) precisam do mesmo dtype
+        hi, lo, family = encode_ips(src_ips)
+        if ipv4_only is None:
+            ipv4_only = bool(np.all(family == FAMILY_V4))
+        topk = 0 if top_idx is None else top_idx.shape[1]
+        data = np.zeros(len(lo), dtype=results_dtype(ipv4_only, topk))
+        if ipv4_only:
+            data['ip'] = lo
+        else:
+            data['ip_hi'], data['ip_lo'], data['ip_family'] = hi, lo, family
+        data['isof_score'] = isof_score
+        data['auto_mse'] = auto_mse
+        data['isof_flag'] = isof_flag
+        data['auto_flag'] = auto_flag
+        data['combined_flag'] = combined_flag
+        if topk:
+            data['top_idx'] = top_idx
+            data['top_err'] = top_err
+        src_ips = np.asarray(src_ips, dtype=object)
+        ip_names = {int(i): str(src_ips[i]) for i in np.flatnonzero(family == FAMILY_INVALID)}
+        return cls(data, summary, columns, has_auto, ip_names)
+
+    @classmethod
+    def from_records(cls, records, summary=None, columns=None):
+        """
+        infer.json (lista de dicts) -> tabela. Aceita a explicação compacta (auto_top_idx/auto_top_err
+        + explain_columns do relatório) e a antiga, expandida (auto_top_features com nomes).
+        """
+        columns = {name: i for i, name in enumerate(columns or [])}
+        explained = [list(zip(r['auto_top_idx'], r.get('auto_top_err') or [])) if 'auto_top_idx' in r
+                     else [(columns.setdefault(name, len(columns)), err) for name, err in r.get('auto_top_features') or []]
+                     for r in records]
+        topk = max((len(e) for e in explained), default=0)
+        top_idx = np.full((len(records), topk), -1, dtype=np.int16)
+        top_err = np.zeros((len(records), topk), dtype=np.float32)
+        for i, pairs in enumerate(explained):
+            for j, (c, err) in enumerate(pairs):
+                top_idx[i, j] = c
+                top_err[i, j] = err
+
+        def col(key, default):
+            return np.array([default if r.get(key) is None else r[key] for r in records])
+
+        table = cls.build([r['src_ip'] for r in records], col('isof_score', np.nan), col('isof_flag', 0),
+                          col('auto_mse', np.nan), col('auto_flag', -1), col('combined_flag', 0),
+                          top_idx if topk else None, top_err if topk else None, list(columns),
+                          has_auto=any('auto_top_features' in r or 'auto_top_idx' in r for r in records),
+                          summary=summary)
+        for i, r in enumerate(records):
+            action = r.get('action') or {}
+            if action.get('cmd'):
+                if action.get('note') == 'dry-run' and set(action) <= {'cmd', 'executed', 'note'}:
+                    table.data['action'][i] = ACTION_DRY_RUN
+                else:
+                    table.set_action(i, action)
+        return table
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    # --- ações ---------------------------------------------------------------
+    def set_action(self, rows, result=None):
+        """result=None: dry-run; dict de attempt_block: guarda o detalhe (bloqueio real)."""
+        if result is None:
+            self.data['action'][rows] = ACTION_DRY_RUN
+            return
+        self.data['action'][rows] = ACTION_EXECUTED if result.get('executed') else ACTION_FAILED
+        self.action_details[int(rows)] = result
+
+    def _action(self, row, code, ip):
+        if row in self.action_details:
+            return self.action_details[row]
+        if code == ACTION_NONE:
+            return {'cmd': None, 'executed': False, 'note': 'no action'}
+        return {'cmd': BLOCK_CMD.format(ip=ip), 'executed': code == ACTION_EXECUTED, 'note': ACTION_NOTES[code]}
+
+    # --- IPs -----------------------------------------------------------------
+    def ips(self, rows=None):
+        data = self.data if rows is None else self.data[rows]
+        rows = np.arange(len(self.data)) if rows is None else np.asarray(rows)
+        if self.ipv4_only:
+            return decode_ipv4(data['ip'])
+        out = decode_ips(data['ip_hi'], data['ip_lo'], data['ip_family'])
+        for j in np.flatnonzero(data['ip_family'] == FAMILY_INVALID):
+            out[j] = self.ip_names.get(int(rows[j]))
+        return out
+
+    @property
+    def index(self):
+        if self._index is None:
+            d = self.data
+            if self.ipv4_only:
+                self._index = CidrIndex(np.zeros(len(d), dtype=np.uint64), d['ip'], np.full(len(d), FAMILY_V4, dtype=np.uint8))
+            else:
+                self._index = CidrIndex(d['ip_hi'], d['ip_lo'], d['ip_family'])
+        return self._index
+
+    def find(self, ip):
+        """Linhas do host `ip` (busca binária no índice, sem decodificar a coluna)."""
+        rows = self.index.lookup(ip)
+        if len(rows) == 0 and self.ip_names:
+            rows = np.array(sorted(r for r, name in self.ip_names.items() if name == str(ip)), dtype=np.int64)
+        return rows
+
+    def in_network(self, cidr):
+        """Linhas cujos IPs estão na sub-rede `cidr` (ex.: '10.0.0.0/8'); ValueError se inválida."""
+        return self.index.network_rows(cidr)
+
+    def flagged(self):
+        if self._flagged is None:  # uma varredura da coluna por tabela carregada, não por requisição
+            self._flagged = np.flatnonzero(self.data['combined_flag'] == 1)
+        return self._flagged
+
+    # --- renderização --------------------------------------------------------
+    def records(self, rows=None, expand=False):
+        """
+        Dicts do relatório, só para as linhas pedidas.
+        Explicação compacta (auto_top_idx + auto_top_err, índices em self.columns) por padrão;
+        expand=True devolve auto_top_features [(coluna, erro), ...] (consulta de um host na API).
+        """
+        rows = np.arange(len(self.data)) if rows is None else np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return []
+        d = self.data[rows]
+        ips = self.ips(rows)
+        isof_score = d['isof_score'].tolist()
+        auto_mse = d['auto_mse'].tolist()
+        isof_flag = d['isof_flag'].tolist()
+        auto_flag = d['auto_flag'].tolist()
+        combined = d['combined_flag'].tolist()
+        action = d['action'].tolist()
+        if self.has_auto and self.topk:
+            top_idx = d['top_idx'].tolist()
+            top_err = d['top_err'].tolist() if expand else np.round(d['top_err'].astype(np.float64), 6).tolist()
+        out = []
+        for j, row in enumerate(rows.tolist()):
+            rec = {
+                'src_ip': ips[j],
+                'isof_score': isof_score[j],
+                'isof_flag': isof_flag[j],
+                'auto_mse': None if np.isnan(auto_mse[j]) else auto_mse[j],
+                'auto_flag': None if auto_flag[j] < 0 else auto_flag[j],
+                'combined_flag': combined[j],
+            }
+            if self.has_auto:
+                pairs = [(c, e) for c, e in zip(top_idx[j], top_err[j]) if c >= 0] if self.topk else []
+                if expand:
+                    rec['auto_top_features'] = [(self.columns[c], e) for c, e in pairs]
+                else:
+                    rec['auto_top_idx'] = [c for c, _ in pairs]
+                    rec['auto_top_err'] = [e for _, e in pairs]
+            rec['action'] = self._action(row, action[j], ips[j])
+            out.append(rec)
+        return out
+
+    def iter_pages(self, rows=None, page_size=10000):
+        rows = np.arange(len(self.data)) if rows is None else np.asarray(rows, dtype=np.int64)
+        for start in range(0, len(rows), page_size):
+            yield self.records(rows[start:start + page_size])
+
+    def iter_json(self, rows=None, page_size=10000):
+        """Array JSON gerado página a página (para StreamingResponse / escrita em arquivo)."""
+        yield '['
+        first = True
+        for page in self.iter_pages(rows, page_size):
+            chunk = ', '.join(json.dumps(r) for r in page)
+            yield chunk if first else ', ' + chunk
+            first = False
+        yield ']'
+
+    def write_json(self, path, page_size=10000):
+        """infer.json ({'summary', 'explain_columns', 'results'}), sem montar a lista inteira."""
+        def write(tmp):
+            with open(tmp, 'w') as f:
+                f.write('{"summary": ' + json.dumps(self.summary) +
+                        ', "explain_columns": ' + json.dumps(self.columns) + ', "results": ')
+                for chunk in self.iter_json(page_size=page_size):
+                    f.write(chunk)
+                f.write('}\n')
+        _atomic_write(path, write)
+
+    def to_frame(self):
+        """Tabela achatada do infer.csv (colunas de ação incluídas), vetorizada."""
+        d = self.data
+        ips = self.ips()
+        code = d['action']
+        cmd = np.full(len(d), None, dtype=object)
+        has_cmd = code != ACTION_NONE
+        cmd[has_cmd] = [BLOCK_CMD.format(ip=ip) for ip in ips[has_cmd]]
+        note = np.where(code == ACTION_DRY_RUN, 'dry-run', np.where(code == ACTION_NONE, 'no action', '')).astype(object)
+        executed = code == ACTION_EXECUTED
+        for row, detail in self.action_details.items():
+            cmd[row] = detail.get('cmd')
+            executed[row] = detail.get('executed', False)
+            note[row] = detail.get('note', '')
+        auto_flag = pd.array(d['auto_flag'], dtype='Int8')
+        auto_flag[d['auto_flag'] < 0] = pd.NA
+        return pd.DataFrame({
+            'src_ip': ips,
+            'isof_score': d['isof_score'],
+            'isof_flag': d['isof_flag'],
+            'auto_mse': d['auto_mse'],
+            'auto_flag': auto_flag,
+            'combined_flag': d['combined_flag'],
+            'action_cmd': cmd,
+            'action_executed': executed,
+            'action_note': note,
+        })
+
+    # --- persistência --------------------------------------------------------
+    def meta(self):
+        return {
+            'format_version': FORMAT_VERSION,
+            'n_rows': len(self.data),
+            'summary': self.summary,
+            'columns': self.columns,
+            'has_auto': self.has_auto,
+            'ip_names': {str(k): v for k, v in self.ip_names.items()},
+            'action_details': {str(k): v for k, v in self.action_details.items()},
+        }
+
+    def save(self, base):
+        """<base>.npy + <base>.index.npy + <base>.meta.json (o meta é gravado por último: leitores o usam como marcador)."""
+        Path(base).parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(Path(f'{base}.npy'), _save_npy(self.data))
+        _atomic_write(Path(f'{base}.index.npy'), _save_npy(self.index.to_array()))
+        _atomic_write(Path(f'{base}.meta.json'), lambda tmp: tmp.write_text(json.dumps(self.meta())))
+        return Path(f'{base}.npy')
+
+    @classmethod
+    def load(cls, base, mmap_mode='r'):
+        with open(f'{base}.meta.json', 'r') as f:
+            meta = json.load(f)
+        data = np.load(f'{base}.npy', mmap_mode=mmap_mode, allow_pickle=False)
+        if len(data) != meta['n_rows']:
+            raise ValueError(f"{base}: .npy com {len(data)} linhas, meta espera {meta['n_rows']} (escrita em andamento?)")
+        table = cls(data, meta.get('summary'), meta.get('columns', ()), meta.get('has_auto', True),
+                    meta.get('ip_names'), meta.get('action_details'))
+        index_path = Path(f'{base}.index.npy')
+        if index_path.exists():  # tabelas antigas não têm o índice: é construído sob demanda
+            index = np.load(index_path, mmap_mode=mmap_mode, allow_pickle=False)
+            if index.dtype == INDEX_DTYPE and len(index) == len(data):
+                table._index = CidrIndex.from_array(index)
+        return table
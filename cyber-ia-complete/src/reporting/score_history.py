@@ -0,0 +1,294 @@
+# src/reporting/score_history.py
+"""
+Histórico de scores por host (append-only, mapeado em memória)
+- Cada execução do infer_and_act acrescenta (ts, host, isof_score, auto_mse, flags) sem reescrever o passado
+- Segmentos por janela de tempo (--segment_seconds, padrão 1 dia): <dir>/seg-<início>/
+  cada execução vira um bloco part-<ts>-<id>.npy; ao abrir o segmento seguinte, as partes do
+  anterior são compactadas num único block-<id>.npy
+- Blocos ordenados por (host, ts) + <bloco>.hosts.npy: por host, posição das linhas e
+  primeiro/último ponto (ts e scores) — trajetória de um host = searchsorted em cada bloco da janela
+- Top-movers: blocos inteiros dentro da janela respondem pelo resumo por host (sem ler as linhas);
+  só os blocos nas bordas da janela são filtrados por ts. Blocos fora da janela nem são abertos
+- <dir>/history.json (manifesto: blocos, intervalo de ts, nomes de hosts não-IPv4) é gravado por último
+- Leitores com um manifesto antigo (ex.: worker da API) podem pedir uma parte que a compactação ou a
+  retenção acabou de apagar: a leitura relê o manifesto e recomeça em vez de falhar
+"""
+import os
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from features.ip_codec import ip_keys, decode_ipv4
+
+MANIFEST = 'history.json'
+DEFAULT_SEGMENT_SECONDS = 86400
+METRICS = ('isof_score', 'auto_mse')
+
+HISTORY_DTYPE = np.dtype([('host', '<u8'), ('ts', '<i8'), ('isof_score', '<f8'), ('auto_mse', '<f8'),
+                          ('isof_flag', 'i1'), ('auto_flag', 'i1'), ('combined_flag', 'i1')])
+HOSTS_DTYPE = np.dtype([('host', '<u8'), ('start', '<i8'), ('count', '<i8'),
+                        ('first_ts', '<i8'), ('last_ts', '<i8'),
+                        ('first_isof_score', '<f8'), ('last_isof_score', '<f8'),
+                        ('first_auto_mse', '<f8'), ('last_auto_mse', '<f8')])
+
+
+def _atomic_save(path, data):
+    tmp = Path(str(path) + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp, path)
+
+
+def host_summary(rows):
+    """Linhas ordenadas por (host, ts) -> um registro HOSTS_DTYPE por host."""
+    if len(rows) == 0:
+        return np.zeros(0, dtype=HOSTS_DTYPE)
+    starts = np.flatnonzero(np.r_[True, rows['host'][1:] != rows['host'][:-1]])
+    ends = np.r_[starts[1:], len(rows)] - 1
+    out = np.zeros(len(starts), dtype=HOSTS_DTYPE)
+    out['host'] = rows['host'][starts]
+    out['start'] = starts
+    out['count'] = ends - starts + 1
+    out['first_ts'] = rows['ts'][starts]
+    out['last_ts'] = rows['ts'][ends]
+    for m in METRICS:
+        out[f'first_{m}'] = rows[m][starts]
+        out[f'last_{m}'] = rows[m][ends]
+    return out
+
+
+class ScoreHistory:
+    def __init__(self, root, segment_seconds=DEFAULT_SEGMENT_SECONDS):
+        self.root = Path(root)
+        self.meta = {'segment_seconds': int(segment_seconds), 'blocks': [], 'names': {}, 'next_id': 0}
+        self.reload()
+
+    def reload(self):
+        """Relê o manifesto (se existir) e esquece os blocos abertos."""
+        path = self.root / MANIFEST
+        if path.exists():
+            with open(path) as f:
+                self.meta = json.load(f)
+        self.segment_seconds = int(self.meta['segment_seconds'])
+        self._cache = {}
+
+    @staticmethod
+    def exists(root):
+        return (Path(root) / MANIFEST).exists()
+
+    @property
+    def blocks(self):
+        return self.meta['blocks']
+
+    @property
+    def span(self):
+        """(menor ts, maior ts) do histórico, ou (None, None) se vazio."""
+        if not self.blocks:
+            return None, None
+        return min(b['min_ts'] for b in self.blocks), max(b['max_ts'] for b in self.blocks)
+
+    def segment_of(self, ts):
+        return int(ts) // self.segment_seconds * self.segment_seconds
+
+    # --- escrita -------------------------------------------------------------
+    def _next_id(self):
+        self.meta['next_id'] = self.meta.get('next_id', 0) + 1
+        return self.meta['next_id']
+
+    def _write_block(self, rel, rows):
+        path = self.root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_save(path, rows)
+        _atomic_save(Path(str(path)[:-len('.npy')] + '.hosts.npy'), host_summary(rows))
+        return {'path': rel, 'segment': self.segment_of(rows['ts'][0]), 'rows': int(len(rows)),
+                'min_ts': int(rows['ts'].min()), 'max_ts': int(rows['ts'].max()), 'compacted': False}
+
+    def _commit(self):
+        tmp = self.root / (MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.root / MANIFEST)  # o manifesto é o marcador: blocos fora dele são ignorados
+        self._cache.clear()
+
+    def append(self, ts, src_ips, isof_score, auto_mse, isof_flag, auto_flag, combined_flag):
+        """Acrescenta uma execução (um ponto por host). Compacta os segmentos anteriores ainda em partes."""
+        ts = int(ts)
+        src_ips = np.asarray(src_ips, dtype=object)
+        keys = ip_keys(src_ips)
+        rows = np.zeros(len(keys), dtype=HISTORY_DTYPE)
+        rows['host'] = keys
+        rows['ts'] = ts
+        rows['isof_score'] = isof_score
+        rows['auto_mse'] = auto_mse
+        rows['isof_flag'] = isof_flag
+        rows['auto_flag'] = auto_flag
+        rows['combined_flag'] = combined_flag
+        rows = rows[np.argsort(keys, kind='stable')]
+        hashed = keys > np.iinfo(np.uint32).max  # IPv6 / texto: o nome não sai da chave
+        for k, name in zip(keys[hashed].tolist(), src_ips[hashed].tolist()):
+            self.meta['names'].setdefault(str(k), str(name))
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        if len(rows):
+            seg = self.segment_of(ts)
+            rel = f'seg-{seg}/part-{ts}-{self._next_id()}.npy'
+            self.blocks.append(self._write_block(rel, rows))
+            self.meta['segment_seconds'] = self.segment_seconds
+            self._commit()
+        self.compact(before=self.segment_of(ts))
+
+    def compact(self, before=None):
+        """Funde as partes de cada segmento anterior a `before` (todos, se None) num único bloco."""
+        by_seg = {}
+        for b in self.blocks:
+            if not b['compacted'] and (before is None or b['segment'] < before):
+                by_seg.setdefault(b['segment'], []).append(b)
+        for seg, parts in sorted(by_seg.items()):
+            rows = np.concatenate([np.load(self.root / p['path']) for p in parts])
+            rows = rows[np.lexsort((rows['ts'], rows['host']))]
+            # geração nova do bloco: o manifesto antigo continua apontando para as partes até o commit
+            rel = f'seg-{seg}/block-{self._next_id()}.npy'
+            block = self._write_block(rel, rows)
+            block['compacted'] = True
+            old = {p['path'] for p in parts}
+            self.meta['blocks'] = [b for b in self.blocks if b['path'] not in old] + [block]
+            self.meta['blocks'].sort(key=lambda b: (b['min_ts'], b['path']))
+            self._commit()
+            for rel_old in old:
+                for suffix in ('.npy', '.hosts.npy'):
+                    p = self.root / (rel_old[:-len('.npy')] + suffix)
+                    if p.exists():
+                        p.unlink()
+
+    def prune(self, before_ts):
+        """Remove os segmentos que terminam antes de `before_ts` (retenção)."""
+        drop = [b for b in self.blocks if b['segment'] + self.segment_seconds <= before_ts]
+        if not drop:
+            return 0
+        self.meta['blocks'] = [b for b in self.blocks if b not in drop]
+        self._commit()
+        for seg in {b['segment'] for b in drop} - {b['segment'] for b in self.blocks}:
+            shutil.rmtree(self.root / f'seg-{seg}', ignore_errors=True)
+        return len(drop)
+
+    # --- leitura -------------------------------------------------------------
+    def _open(self, block):
+        path = block['path']
+        if path not in self._cache:
+            base = self.root / path[:-len('.npy')]
+            self._cache[path] = (np.load(self.root / path, mmap_mode='r'),
+                                 np.load(str(base) + '.hosts.npy', mmap_mode='r'))
+        return self._cache[path]
+
+    def _window_blocks(self, since, until):
+        return [b for b in self.blocks
+                if (since is None or b['max_ts'] >= since) and (until is None or b['min_ts'] <= until)]
+
+    def _read(self, fn, *args, retries=3):
+        """fn(*args); bloco apagado por compact()/prune() de outro processo -> relê o manifesto e repete."""
+        for attempt in range(retries):
+            try:
+                return fn(*args)
+            except FileNotFoundError:
+                if attempt == retries - 1:
+                    raise
+                self.reload()
+
+    def host_name(self, key):
+        key = int(key)
+        if key <= np.iinfo(np.uint32).max:
+            return decode_ipv4(np.array([key], dtype=np.uint32))[0]
+        return self.meta['names'].get(str(key))
+
+    def trajectory(self, ip, since=None, until=None):
+        """Pontos de um host na janela, em ordem de ts (busca binária por bloco)."""
+        return self._read(self._trajectory, ip_keys([ip])[0], since, until)
+
+    def _trajectory(self, key, since, until):
+        parts = []
+        for block in self._window_blocks(since, until):
+            rows, hosts = self._open(block)
+            i = int(np.searchsorted(hosts['host'], key))
+            if i == len(hosts) or hosts['host'][i] != key:
+                continue
+            r = rows[hosts['start'][i]:hosts['start'][i] + hosts['count'][i]]
+            keep = np.ones(len(r), dtype=bool)
+            if since is not None:
+                keep &= r['ts'] >= since
+            if until is not None:
+                keep &= r['ts'] <= until
+            parts.append(np.asarray(r[keep]))
+        if not parts:
+            return np.zeros(0, dtype=HISTORY_DTYPE)
+        out = np.concatenate(parts)
+        return out[np.argsort(out['ts'], kind='stable')]
+
+    def _window_summary(self, block, since, until):
+        """Resumo por host do bloco, restrito à janela (só relê as linhas se o bloco cruza a borda)."""
+        rows, hosts = self._open(block)
+        inside = (since is None or block['min_ts'] >= since) and (until is None or block['max_ts'] <= until)
+        if inside:
+            return np.asarray(hosts)
+        keep = np.ones(len(rows), dtype=bool)
+        if since is not None:
+            keep &= rows['ts'] >= since
+        if until is not None:
+            keep &= rows['ts'] <= until
+        return host_summary(np.asarray(rows[keep]))
+
+    def top_movers(self, metric='isof_score', since=None, until=None, limit=20, direction='abs'):
+        """
+        Hosts com maior variação de `metric` (último - primeiro ponto na janela).
+        direction: 'up' (piorou), 'down' (melhorou) ou 'abs'. Hosts com um só ponto não entram.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"métrica inválida: {metric} (use {', '.join(METRICS)})")
+        return self._read(self._top_movers, metric, since, until, limit, direction)
+
+    def _top_movers(self, metric, since, until, limit, direction):
+        summaries = [self._window_summary(b, since, until) for b in self._window_blocks(since, until)]
+        summaries = [s for s in summaries if len(s)]
+        if not summaries:
+            return []
+        s = np.concatenate(summaries)
+        # primeiro ponto: menor first_ts por host; último: maior last_ts por host
+        order = np.lexsort((s['first_ts'], s['host']))
+        s_first = s[order]
+        head = np.r_[True, s_first['host'][1:] != s_first['host'][:-1]]
+        first = s_first[head]
+        order = np.lexsort((s['last_ts'], s['host']))
+        s_last = s[order]
+        tail = np.r_[s_last['host'][1:] != s_last['host'][:-1], True]
+        last = s_last[tail]
+        counts = np.add.reduceat(s_first['count'], np.flatnonzero(head))
+
+        with np.errstate(invalid='ignore'):
+            delta = last[f'last_{metric}'] - first[f'first_{metric}']
+        valid = (counts > 1) & ~np.isnan(delta)
+        rank = {'up': -delta, 'down': delta}.get(direction, -np.abs(delta))
+        idx = np.flatnonzero(valid)
+        idx = idx[np.argsort(rank[idx], kind='stable')][:limit]
+        return [{
+            'src_ip': self.host_name(first['host'][i]),
+            'metric': metric,
+            'first_ts': int(first['first_ts'][i]),
+            'last_ts': int(last['last_ts'][i]),
+            'first': float(first[f'first_{metric}'][i]),
+            'last': float(last[f'last_{metric}'][i]),
+            'delta': float(delta[i]),
+            'points': int(counts[i]),
+        } for i in idx]
+
+
+def trajectory_records(points):
+    """Array HISTORY_DTYPE -> dicts da API (NaN / -1 do autoencoder viram None)."""
+    return [{
+        'ts': int(p['ts']),
+        'isof_score': float(p['isof_score']),
+        'auto_mse': None if np.isnan(p['auto_mse']) else float(p['auto_mse']),
+        'isof_flag': int(p['isof_flag']),
+        'auto_flag': None if p['auto_flag'] < 0 else int(p['auto_flag']),
+        'combined_flag': int(p['combined_flag']),
+    } for p in points]